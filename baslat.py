@@ -45,6 +45,22 @@ HOST_PORT=
 # Mum aralığı ve derinlik aralığı için konfigürasyon (eğer sol banka mum ise varsayılan=500, Derinlik=50)
 MAX_CANDLES=
 MAX_DEPTH=
+
+# Aynı aralıktaki tüm piyasaların göstergelerini tek bir toplu geçişte hesaplayın (True/False).
+BATCH_INDICATORS=False
+
+# Tüccar aralığındaki mumları ayrı bir akış yerine tek bir 1m akışından canlı olarak oluşturun (True/False).
+RESAMPLE_CANDLES=False
+
+# 1m akışından canlı olarak oluşturulacak ek zaman aralıkları, birden fazla aralık virgülle ayrılır (ör. 15m,1h).
+RESAMPLE_INTERVALS=
+
+# Mumları ve gösterge serilerini float32/int64 dizilerde tutarak piyasa başına belleği azaltın (True/False).
+# Kapanış fiyatı tam kalır, açılış/yüksek/düşük fiyatları ve göstergeler float32 hassasiyetindedir (27123.43 -> 27123.4296875).
+COMPACT_MODE=False
+
+# En iyi alış/satış fiyatları için tam derinlik yerine bookTicker akışını kullanın (True/False).
+TOP_OF_BOOK=False
 '''
 
 
@@ -52,7 +68,7 @@ def settings_reader():
     # Ayarlar dosyası üzerinde ayrıştırmak ve kv çiftlerini toplamak için okuyucu işlevini ayarlama.
 
     ## Başlangıç ​​varsayılan değişkenleriyle kurulum ayarları dosya nesnesi.
-    settings_file_data = {'public_key':'', 'private_key':'', 'host_ip':'127.0.0.1', 'host_port':5000, 'max_candles':500,'max_depth':50}
+    settings_file_data = {'public_key':'', 'private_key':'', 'host_ip':'127.0.0.1', 'host_port':5000, 'max_candles':500,'max_depth':50, 'batch_indicators':False, 'resample_candles':False, 'resample_intervals':[], 'compact_mode':False, 'top_of_book':False}
 
     ## Ayarlar dosyasını okuyun ve alanları çıkarın.
     with open(SETTINGS_FILE_NAME, 'r') as f:
@@ -93,6 +109,22 @@ def settings_reader():
             elif key == 'MAX_DEPTH':
                 data = int(data)
 
+            elif key == 'BATCH_INDICATORS':
+                data = data.upper() == 'TRUE'
+
+            elif key == 'RESAMPLE_CANDLES':
+                data = data.upper() == 'TRUE'
+
+            elif key == 'RESAMPLE_INTERVALS':
+                #### Boşlukları temizleyin ve boş aralıkları atlayın (ör. 'RESAMPLE_INTERVALS= ' ya da '15m,').
+                data = [interval.strip() for interval in data.split(',') if interval.strip()]
+
+            elif key == 'COMPACT_MODE':
+                data = data.upper() == 'TRUE'
+
+            elif key == 'TOP_OF_BOOK':
+                data = data.upper() == 'TRUE'
+
             settings_file_data.update({key.lower():data})
 
     return(settings_file_data)
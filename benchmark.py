@@ -0,0 +1,350 @@
+#! /usr/bin/env python3
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+from collections.abc import Mapping
+
+import technical_indicators as TI
+import trader_configuration as TC
+from binance_api import order_book
+
+'''
+Offline indicator benchmark.
+
+Synthetic OHLCV candles are generated for every (candles, markets) size and each indicator is timed:
+    full            - batch function over the full history (2-D when markets > 1).
+    incremental     - one kline update on a seeded stream (revise + advance), per market.
+    depth           - one diff depth event applied to the order book of every market (one 100ms tick of
+                      the depth stream), 'candles' holds the book depth for these results.
+
+Results are written as JSON, pass a previous results file with --compare to flag regressions.
+
+    python3 benchmark.py --output bench.json
+    python3 benchmark.py --output new.json --compare bench.json
+'''
+DEFAULT_CANDLES = [500, 5000, 50000, 1000000]
+DEFAULT_MARKETS = [1, 10, 100, 500]
+
+## Sizes with more points than this (candles * markets) are skipped to keep memory in check.
+MAX_POINTS = 50000000
+
+## Slower by more than this ratio against the baseline is reported as a regression.
+REGRESSION_RATIO = 1.25
+
+## Differences smaller than this (seconds) are timer noise and never reported.
+NOISE_FLOOR = 0.0005
+
+INTERVAL_MS = 60000
+
+DEFAULT_DEPTH = 1000
+
+## Levels changed per diff event and how many of those remove a level.
+DIFF_LEVELS = 40
+DIFF_REMOVED = 0.2
+
+## Diff events per second and market at the 100ms depth update speed.
+DEPTH_EVENTS_PER_SECOND = 10
+
+
+def generate_candles(candles, markets, seed=0):
+    ''' Random walk OHLCV candles, newest first, shaped (markets, candles, 9) like the socket candles. '''
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, (markets, candles)), axis=1))
+    opens = np.concatenate((closes[:, :1], closes[:, :-1]), axis=1)
+    spread = np.abs(rng.normal(0, 0.001, (markets, candles))) * closes
+    open_times = np.arange(candles, dtype=float) * INTERVAL_MS
+
+    ohlcv = np.zeros((markets, candles, 9))
+    ohlcv[..., 0] = open_times
+    ohlcv[..., 1] = opens
+    ohlcv[..., 2] = np.maximum(opens, closes) + spread
+    ohlcv[..., 3] = np.minimum(opens, closes) - spread
+    ohlcv[..., 4] = closes
+    ohlcv[..., 5] = rng.uniform(1, 100, (markets, candles))
+    ohlcv[..., 6] = open_times + INTERVAL_MS - 1
+    ohlcv[..., 7] = ohlcv[..., 5] * closes
+    ohlcv[..., 8] = rng.integers(1, 500, (markets, candles))
+
+    return(ohlcv[:, ::-1])
+
+
+def time_call(function, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return(timings)
+
+
+def evaluate_indicators(indicators):
+    ''' Read every output so lazy indicators (trader_configuration.LAZY_INDICATORS) are computed in the timed call. '''
+    if isinstance(indicators, Mapping) and not 'time' in indicators:
+        return([ evaluate_indicators(indicators[name]) for name in indicators ])
+    return(indicators)
+
+
+def full_benchmarks(ohlcv):
+    ## A single market is benchmarked with 1-D series like the traders use.
+    columns = ohlcv if len(ohlcv) > 1 else ohlcv[0]
+    time_values = ohlcv[0, :, 0]
+    opens, highs, lows, closes = columns[..., 1], columns[..., 2], columns[..., 3], columns[..., 4]
+    candles_set = [market.tolist() for market in ohlcv] if ohlcv.shape[1] <= 50000 else None
+
+    benchmarks = {
+        'get_SMA':lambda: TI.get_SMA(closes, 20, result_format='numpy'),
+        'get_EMA':lambda: TI.get_EMA(closes, 100, result_format='numpy'),
+        'get_DEMA':lambda: TI.get_DEMA(closes, 12),
+        'get_zeroLagMACD':lambda: TI.get_zeroLagMACD(closes, time_values=time_values, result_format='columnar'),
+        'get_RMA':lambda: TI.get_RMA(closes, 14, result_format='numpy'),
+        'get_RSI':lambda: TI.get_RSI(closes, result_format='numpy'),
+        'get_ATR':lambda: TI.get_ATR(highs, lows, closes, result_format='numpy'),
+        'get_BB':lambda: TI.get_BB(closes, result_format='columnar'),
+        'get_rolling_std':lambda: TI.get_rolling_std(closes, 20, result_format='numpy')}
+
+    ## The trader configuration works on lists of candles, very long histories are left out.
+    if candles_set:
+        if len(candles_set) == 1:
+            benchmarks.update({'technical_indicators':lambda: evaluate_indicators(TC.technical_indicators(candles_set[0]))})
+        else:
+            benchmarks.update({'technical_indicators_batch':lambda: evaluate_indicators(TC.technical_indicators_batch({str(i):candles for i, candles in enumerate(candles_set)}))})
+
+    return(benchmarks)
+
+
+def incremental_benchmarks(ohlcv, updates):
+    ''' Streams seeded from all but the newest 'updates' candles, each call feeds one kline update per market. '''
+    markets = len(ohlcv)
+    seed_candles = ohlcv[:, updates:]
+    new_candles = ohlcv[:, :updates][:, ::-1]
+
+    ## column is the candle column fed to the stream, a slice feeds several (ATR takes high, low, close).
+    def make_benchmark(build_stream, column):
+        streams = []
+        for market in range(markets):
+            stream = build_stream()
+            stream.update(seed_candles[market, :, column], seed_candles[market, :, 0])
+            streams.append(stream)
+        position = [0]
+
+        def run():
+            candle = new_candles[:, position[0] % updates]
+            for market in range(markets):
+                streams[market].revise(candle[market, column])
+                streams[market].advance(candle[market, column], candle[market, 0])
+            position[0] += 1
+        return(run)
+
+    def make_graph_benchmark():
+        graphs = []
+        for market in range(markets):
+            graph = TC.build_indicator_graph()
+            graph.update(seed_candles[market].tolist())
+            graphs.append(graph)
+        position = [0]
+
+        def run():
+            candle = new_candles[:, position[0] % updates]
+            for market in range(markets):
+                graphs[market].revise(candle[market].tolist())
+                graphs[market].advance(candle[market].tolist())
+                ## Read the indicators the way the traders do (trader_configuration settings).
+                evaluate_indicators(graphs[market].get_indicators(TC.LAZY_INDICATORS, TC.INDICATOR_TAIL, TC.RESULT_FORMAT))
+            position[0] += 1
+        return(run)
+
+    return({
+        'Stream_EMA':make_benchmark(lambda: TI.Stream_EMA(100), 4),
+        'Stream_DEMA':make_benchmark(lambda: TI.Stream_DEMA(12), 4),
+        'Stream_RMA':make_benchmark(lambda: TI.Stream_RMA(14), 4),
+        'Stream_zeroLagMACD':make_benchmark(lambda: TI.Stream_zeroLagMACD(), 4),
+        'Stream_RSI':make_benchmark(lambda: TI.Stream_RSI(), 4),
+        'Stream_ATR':make_benchmark(lambda: TI.Stream_ATR(), slice(2, 5)),
+        'Stream_rolling_std':make_benchmark(lambda: TI.Stream_rolling_std(20), 4),
+        'Stream_BB':make_benchmark(lambda: TI.Stream_BB(), 4),
+        'indicator_graph':make_graph_benchmark()})
+
+
+def generate_depth_diffs(depth, markets, events, seed=0):
+    ''' Order book snapshots and diff events per market in the formatter.format_depth_arrays layout. '''
+    rng = np.random.default_rng(seed)
+    tick = 0.01
+    mid = 100.0
+    ticks = np.arange(1, depth+1)
+
+    snapshots, diffs = [], []
+    for market in range(markets):
+        snapshots.append({
+            'lastUpdateId':0,
+            'a':np.stack((mid + ticks*tick, rng.uniform(0.1, 10, depth)), axis=1),
+            'b':np.stack((mid - ticks*tick, rng.uniform(0.1, 10, depth)), axis=1)})
+
+        market_diffs = []
+        for event in range(events):
+            diff = {'U':event+1, 'u':event+1}
+            for side, sign in (('a', 1), ('b', -1)):
+                ## Most changes are close to the top of the book.
+                levels = np.unique(np.minimum(rng.geometric(0.05, DIFF_LEVELS//2), depth*2))
+                quantities = rng.uniform(0.1, 10, len(levels))
+                quantities[rng.random(len(levels)) < DIFF_REMOVED] = 0.0
+                diff.update({side:np.stack((mid + sign*levels*tick, quantities), axis=1)})
+            market_diffs.append(diff)
+        diffs.append(market_diffs)
+
+    return(snapshots, diffs)
+
+
+def depth_benchmarks(depth, markets, events):
+    snapshots, diffs = generate_depth_diffs(depth, markets, events)
+    books = []
+    for snapshot in snapshots:
+        book = order_book.Order_Book(depth)
+        book.reset(snapshot)
+        books.append(book)
+    position = [0]
+
+    def run():
+        event = position[0] % events
+        for market in range(markets):
+            ## Update ids keep counting up as the generated events are replayed so they pass the sequence checks.
+            diff = dict(diffs[market][event])
+            diff.update({'U':position[0]+1, 'u':position[0]+1})
+            books[market].apply_diff(diff)
+        position[0] += 1
+
+    def read_top():
+        for market in range(markets):
+            books[market].get_levels(20)
+
+    return({
+        'Order_Book.apply_diff':run,
+        'Order_Book.get_levels':read_top})
+
+
+def run(candle_sizes, market_counts, repeat, updates):
+    results = []
+
+    for candles in candle_sizes:
+        for markets in market_counts:
+            if candles * markets > MAX_POINTS:
+                print('Skipping... [{0} candles x {1} markets]'.format(candles, markets))
+                continue
+
+            ohlcv = generate_candles(candles, markets)
+
+            for mode, benchmarks in (('full', full_benchmarks(ohlcv)), ('incremental', incremental_benchmarks(ohlcv, updates))):
+                for name in benchmarks:
+                    ## The first call is a warm up (allocations, caches) and is not timed.
+                    benchmarks[name]()
+                    timings = time_call(benchmarks[name], repeat)
+
+                    result = {
+                        'name':name,
+                        'mode':mode,
+                        'candles':candles,
+                        'markets':markets,
+                        'repeat':repeat,
+                        'best':min(timings),
+                        'mean':sum(timings) / len(timings)}
+                    results.append(result)
+                    print('{0:<28} {1:<12} {2:>8} candles {3:>4} markets  best {4:.6f}s'.format(name, mode, candles, markets, result['best']))
+
+    return(results)
+
+
+def run_depth(depth, market_counts, repeat, events):
+    results = []
+
+    for markets in market_counts:
+        benchmarks = depth_benchmarks(depth, markets, events)
+        for name in benchmarks:
+            benchmarks[name]()
+            timings = time_call(benchmarks[name], repeat)
+
+            result = {
+                'name':name,
+                'mode':'depth',
+                'candles':depth,
+                'markets':markets,
+                'repeat':repeat,
+                'best':min(timings),
+                'mean':sum(timings) / len(timings)}
+            results.append(result)
+
+            ## Share of one second the markets need at the 100ms update speed, above 1.0 the book falls behind.
+            load = result['best'] * DEPTH_EVENTS_PER_SECOND
+            print('{0:<28} {1:<12} {2:>8} levels  {3:>4} markets  best {4:.6f}s  load at 100ms {5:.2%}'.format(name, 'depth', depth, markets, result['best'], load))
+
+    return(results)
+
+
+def compare(results, baseline_results, ratio):
+    ''' Results slower than the baseline by more than ratio (by best time), matched on name/mode/candles/markets. '''
+    baseline = {(r['name'], r['mode'], r['candles'], r['markets']):r for r in baseline_results}
+    regressions = []
+
+    for result in results:
+        key = (result['name'], result['mode'], result['candles'], result['markets'])
+        if key in baseline and baseline[key]['best'] > 0:
+            change = result['best'] / baseline[key]['best']
+            if change > ratio and (result['best'] - baseline[key]['best']) > NOISE_FLOOR:
+                regressions.append({'key':key, 'baseline':baseline[key]['best'], 'best':result['best'], 'ratio':change})
+
+    return(regressions)
+
+
+def get_commit():
+    try:
+        return(subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip())
+    except Exception:
+        return(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline indicator benchmark.')
+    parser.add_argument('--candles', type=int, nargs='+', default=DEFAULT_CANDLES)
+    parser.add_argument('--markets', type=int, nargs='+', default=DEFAULT_MARKETS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--updates', type=int, default=50, help='New candles kept back for the incremental benchmarks.')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='Order book levels per side for the depth benchmarks.')
+    parser.add_argument('--events', type=int, default=100, help='Diff depth events generated per market.')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='Previous results file to check for regressions.')
+    parser.add_argument('--ratio', type=float, default=REGRESSION_RATIO)
+    args = parser.parse_args()
+
+    results = run(args.candles, args.markets, args.repeat, args.updates)
+    results += run_depth(args.depth, args.markets, args.repeat, args.events)
+
+    report = {
+        'commit':get_commit(),
+        'timestamp':int(time.time()),
+        'python':platform.python_version(),
+        'numpy':np.__version__,
+        'machine':platform.machine(),
+        'results':results}
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {0}'.format(args.output))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline['results'], args.ratio)
+        for regression in regressions:
+            print('Regression... [{0}] {1:.6f}s -> {2:.6f}s (x{3:.2f})'.format(
+                ' '.join([str(part) for part in regression['key']]), regression['baseline'], regression['best'], regression['ratio']))
+
+        if regressions:
+            sys.exit(1)
+        print('No regressions against {0} (commit {1}).'.format(args.compare, baseline['commit']))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ from urllib.parse import urlencode
 
 from . import formatter
 from . import api_support_tools
+from . import kline_downloader
 
 ## API Object imports
 from . import blvt_api
@@ -32,12 +33,20 @@ NO_REQUIREMENTS = ['NONE']
 REQUIRE_KEY = ['MARKET_DATA', 'USER_STREAM']
 REQUIRE_SIGNATURE = ['USER_DATA', 'TRADE', 'MARGIN']
 
+## Connections kept open per host, enough for the concurrent kline downloader.
+SESSION_POOL_SIZE = 10
+
 class Binance_REST:
 
     def __init__(self, public_key=None, private_key=None, default_api_type=None):
         self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=SESSION_POOL_SIZE, pool_maxsize=SESSION_POOL_SIZE))
         self.requests_made  = 0
         self.errors         = 0
+        self.used_weight    = None
+
+        ## Request weight budget shared by the calls that are made in bulk (kline downloads, order book resyncs).
+        self.weight_limiter = kline_downloader.Weight_Limiter(kline_downloader.WEIGHT_BUDGET)
 
         self.default_api_type   = default_api_type
         self.public_key         = public_key
@@ -194,6 +203,7 @@ class Binance_REST:
     def get_aggTradeList(self, **kwargs):
         return(self.make_api_call(marketData_api.get_aggTradeList, kwargs))
     def get_custom_candles(self, **kwargs):
+        kwargs.update({'rest_api':self})
         return(api_support_tools.get_custom_candles(kwargs))
     def get_candles(self, **kwargs):
         return(formatter.format_candles(self.make_api_call(marketData_api.get_candles, kwargs), 'REST'))
@@ -487,6 +497,13 @@ class Binance_REST:
         logging.debug('[REST_MASTER] QUERY URL {0}'.format(urlQuery)),
         api_resp = self.session.request(method, urlQuery, headers=headers, data=body)
         data = api_resp.json()
+
+        if 'X-MBX-USED-WEIGHT-1M' in api_resp.headers:
+            ## Reported to the shared limiter (under its lock) from the thread that made the call, the pooled
+            ## download threads each report the weight of their own response.
+            used_weight = int(api_resp.headers['X-MBX-USED-WEIGHT-1M'])
+            self.weight_limiter.report_used(used_weight)
+            self.used_weight = used_weight
         logging.debug('[REST_MASTER] QUERY DATA {0}'.format(data))
 
         if 'code' in data:
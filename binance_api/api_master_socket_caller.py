@@ -1,5 +1,6 @@
 #! /usr/bin/env python3
 
+import os
 import sys
 import copy
 import time
@@ -8,14 +9,40 @@ import hashlib
 import logging
 import websocket
 import threading
+import numpy as np
 
 from . import api_support_tools
+from . import candle_cache
+from . import candle_resampler
+from . import candle_store
+from . import order_book
 from . import formatter
 from . import websocket_api
 
 ## sets up the socket BASE for binances socket API.
 SOCKET_BASE = 'wss://stream.binance.com:9443'
 
+## Sub directory of the candle cache for the chunks of long kline downloads.
+KLINE_DOWNLOAD_DIR = 'kline_chunks'
+
+## Attempts (with a growing wait) to download the starting candles before falling back to the cache.
+INITIAL_CANDLE_RETRIES = 3
+
+## Request weight of a REST depth snapshot by the most levels it asks for ((limit, weight), ...).
+DEPTH_WEIGHTS = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+
+
+def _is_candle_data(candles):
+    ## The REST helpers return error strings/dicts instead of raising.
+    return(isinstance(candles, (list, np.ndarray)) and len(candles) > 0)
+
+
+def _get_depth_weight(limit):
+    for max_limit, weight in DEPTH_WEIGHTS:
+        if limit <= max_limit:
+            return(weight)
+    return(DEPTH_WEIGHTS[-1][1])
+
 
 class Binance_SOCK:
 
@@ -38,12 +65,38 @@ class Binance_SOCK:
         self.BASE_CANDLE_LIMIT      = 200
         self.BASE_DEPTH_LIMIT       = 20
 
-        ## For locally managed data.
+        ## For locally managed data (candles are kept per symbol in a candle_store.Candle_Store, books in an order_book.Order_Book).
         self.live_and_historic_data = False
         self.candle_data            = {}
         self.book_data              = {}
         self.reading_books          = False
 
+        ## Directory for the on disk candle history (warm restarts), None disables it.
+        self.candle_cache_dir       = None
+        self.candle_files           = {}
+
+        ## Used to backfill candles missed while the socket was down, with per symbol gap counters.
+        self.rest_api               = None
+        self.candle_intervals       = {}
+        self.candle_gaps            = {}
+        self.candle_locks           = {}
+        self.candle_backlogs        = {}
+
+        ## Higher timeframes built live from each kline stream ({symbol:{interval:Candle_Resampler}}).
+        self.resample_intervals     = []
+        self.candle_resamplers      = {}
+        self.default_candle_interval = None
+
+        ## Top of book per symbol from the bookTicker streams, replaced whole on every update ({symbol:{'u', 'a', 'b'}}).
+        self.best_prices            = {}
+
+        ## Books resynced from a REST snapshot after a gap in the diff depth stream ({symbol:resyncs}).
+        self.depth_resyncs          = {}
+        self.resyncing_books        = set()
+
+        ## Keep candles as int64/float32 arrays instead of float64 (see candle_store.Candle_Store).
+        self.compact_candles        = False
+
         self.userDataStream_added   = False
         self.listen_key             = None
 
@@ -80,33 +133,108 @@ class Binance_SOCK:
 
     ## ------------------ [DATA_ACCESS_ENDPOINT] ------------------ ##
     def get_live_depths(self, symbol=None):
-        got_books = False
-        return_books = {}
+        '''
+        Read only book snapshots {'version', 'lastUpdateId', 'synced', 'a':((price, quantity), ...), 'b':(...)} with the
+        levels best first, the current one of symbol in O(1) or one per symbol when no symbol is given. 'synced' is False
+        while the book waits for a REST snapshot (at the start and after a gap in the stream).
+        '''
+        if symbol:
+            return(self.book_data[symbol].get_snapshot())
 
-        while not(got_books):
-            got_books = True
-            for key in self.book_data:
-                try:
-                    ask_Price_List = self._orderbook_sorter_algo(copy.deepcopy(self.book_data[key]['a']), 'ask')
-                    bid_Price_List = self._orderbook_sorter_algo(copy.deepcopy(self.book_data[key]['b']), 'bid')
-                    return_books.update({key:{'a':ask_Price_List, 'b':bid_Price_List}})
-                except RuntimeError as error:
-                    if error == 'dictionary changed size during iteration':
-                        print('dodged book error')
-                    got_books = False
-                    break
+        return({key:self.book_data[key].get_snapshot() for key in list(self.book_data.keys())})
 
-        if symbol:
-            if not symbol in return_books:
-                print(return_books)
-            return(return_books[symbol])
+    def get_best_prices(self, symbol):
+        '''
+        {'a':(price, quantity), 'b':(price, quantity)} best ask/bid of symbol in O(1), from the bookTicker stream when
+        subscribed otherwise from the order book. None when nothing was received yet.
+        '''
+        if symbol in self.best_prices:
+            return(self.best_prices[symbol])
+        if symbol in self.book_data:
+            return(self.book_data[symbol].get_best_prices())
+        return(None)
+
+    def get_book_analytics(self, symbol, quote_amount=None, levels=None):
+        '''
+        Liquidity of symbol from its current book snapshot, None without an order book:
+            mid, microprice             - of the best levels.
+            imbalance                   - over the best 'levels' levels (the best level by default).
+            depth                       - {'a', 'b'} quantity over the best 'levels' levels (all by default).
+            fill_prices                 - {'BUY', 'SELL'} average price a market order of quote_amount would fill at.
+        The analytics are kept up to date as the diffs arrive, reading them does not walk the book.
+        '''
+        if not symbol in self.book_data:
+            return(None)
+
+        snapshot = self.book_data[symbol].get_snapshot()
+        analytics = {
+            'mid':snapshot['mid'],
+            'microprice':snapshot['microprice'],
+            'imbalance':snapshot['imbalance'] if levels == None else order_book.get_imbalance(snapshot, levels),
+            'depth':order_book.get_depth(snapshot, levels)}
 
-        return(return_books)
+        if quote_amount != None:
+            analytics.update({'fill_prices':{side:order_book.get_fill_price(snapshot, side, quote_amount) for side in order_book.FILL_SIDES}})
+        return(analytics)
 
-    def get_live_candles(self, symbol=None):
+    def get_live_candles(self, symbol=None, as_list=False, interval=None):
+        '''
+        Newest first candles, read only NumPy views of the candle stores (or plain lists when as_list is set).
+        A resampled interval can be picked with interval (default_candle_interval when not given).
+        '''
+        candle_stores = self._get_candle_stores(interval)
         if symbol:
-            return(self.candle_data[symbol])
-        return(self.candle_data)
+            return(self._read_candles(candle_stores[symbol], as_list))
+        return({key:self._read_candles(candle_stores[key], as_list) for key in candle_stores})
+
+    def get_live_columns(self, symbol, newest_first=True, interval=None):
+        '''
+        Read only NumPy views of each candle column by name (open_time, open, high, low, close, volume, ...).
+        '''
+        return(self._get_candle_stores(interval)[symbol].get_columns(newest_first))
+
+    def _get_candle_stores(self, interval):
+        interval = interval or self.default_candle_interval
+        if interval == None or not interval in self.resample_intervals:
+            return(self.candle_data)
+        return({key:self.candle_resamplers[key][interval].store for key in self.candle_resamplers})
+
+    def _read_candles(self, store, as_list):
+        if as_list:
+            return(store.tolist())
+        return(store.view())
+
+
+    def backfill_candles(self, symbol=None):
+        '''
+        Fetch candles from the last stored one up to now over REST (used after the socket is restarted).
+        '''
+        symbols = [symbol] if symbol else list(self.candle_data.keys())
+        return({key:self._backfill_candles(key) for key in symbols})
+
+    def get_memory_usage(self):
+        '''
+        Bytes held per symbol by the live candles (including the resampled intervals).
+        '''
+        memory_usage = {}
+        for symbol in self.candle_data:
+            candle_bytes = self.candle_data[symbol].get_nbytes()
+            if symbol in self.candle_resamplers:
+                candle_bytes += sum([resampler.store.get_nbytes() for resampler in self.candle_resamplers[symbol].values()])
+            memory_usage.update({symbol:{'candles':candle_bytes}})
+        return(memory_usage)
+
+    def get_depth_sync_stats(self):
+        return({
+            'resyncs':sum(self.depth_resyncs.values()),
+            'resyncing':sorted(self.resyncing_books),
+            'markets':dict(self.depth_resyncs)})
+
+    def get_candle_gap_stats(self):
+        return({
+            'gaps_detected':sum([self.candle_gaps[key]['gaps_detected'] for key in self.candle_gaps]),
+            'candles_filled':sum([self.candle_gaps[key]['candles_filled'] for key in self.candle_gaps]),
+            'markets':copy.deepcopy(self.candle_gaps)})
 
 
     ## ------------------ [MANUAL_CALLS_EXCLUSIVE] ------------------ ##
@@ -163,20 +291,38 @@ class Binance_SOCK:
 
 
     ## ------------------ [FULL_DATA_EXCLUSIVE] ------------------ ##
+    def set_resampled_intervals(self, intervals):
+        '''
+        Higher timeframes (e.g. ['15m', '4h']) to build live from the kline streams instead of subscribing
+        to them, must be set before the historic data is loaded.
+        '''
+        self.resample_intervals = [interval for interval in intervals if candle_resampler.interval_to_ms(interval) != None]
+
+        for interval in intervals:
+            if not interval in self.resample_intervals:
+                logging.warning('[SOCKET_MASTER] Interval {0} can not be resampled.'.format(interval))
+
     def set_live_and_historic_combo(self, rest_api):
         if not(self.live_and_historic_data):
+            self.rest_api = rest_api
             for stream in self.stream_names:
                 symbol = stream.split('@')[0].upper()
+                full_download = False
                 if 'kline' in stream:
-                    self._set_initial_candles(symbol, stream.split('_')[1], rest_api)
+                    full_download = self._set_initial_candles(symbol, stream.split('_')[1], rest_api)
+                    self._set_initial_resamplers(symbol, rest_api)
                 if 'depth' in stream:
-                    self._set_initial_depth(symbol, rest_api)
-                time.sleep(1)
+                    self._set_initial_depth(symbol)
+
+                ## Only full candle downloads are heavy enough to need spacing out.
+                if full_download:
+                    time.sleep(1)
 
             RETURN_MESSAGE = 'STARTED_HISTORIC_DATA'
         else:
             if self.candle_data != {}:
                 self.candle_data = {}
+                self.candle_resamplers = {}
 
             RETURN_MESSAGE = 'STOPPED_HISTORIC_DATA'
 
@@ -369,6 +515,10 @@ class Binance_SOCK:
                     else:
                         self.requested_items[int(data['id'])] = data['result']
 
+            ## bookTicker events are the only market events without an event type.
+            if not 'e' in data and 'u' in data and 'A' in data and 'B' in data:
+                self._update_best_prices(data)
+
             if 'e' in data:
                 if self.live_and_historic_data:
                     if data['e'] == 'kline':
@@ -427,94 +577,319 @@ class Binance_SOCK:
 
 
     def _set_initial_candles(self, symbol, interval, rest_api):
-        try:
-            hist_candles = rest_api.get_custom_candles(symbol=symbol, interval=interval, limit=self.BASE_CANDLE_LIMIT)
-        except Exception as error:
-            logging.critical('[SOCKET_MASTER] _initial_candles error {0}'.format(error))
-            logging.warning('[SOCKET_MASTER] _initial_candles {0}'.format(hist_candles))
-        self.candle_data.update({symbol:hist_candles})
+        '''
+        Load the starting candles, from the candle cache plus the missing tail when possible otherwise over REST.
+        Returns True when the full history had to be downloaded.
+        '''
+        hist_candles = None
+        candle_file = None
+
+        if self.candle_cache_dir != None:
+            candle_file = candle_cache.Candle_File(os.path.join(self.candle_cache_dir, '{0}_{1}.candles'.format(symbol, interval)))
+            self.candle_files.update({symbol:candle_file})
+            try:
+                hist_candles = self._get_cached_candles(symbol, interval, candle_file, rest_api, self._get_candle_capacity(interval))
+            except Exception as error:
+                logging.warning('[SOCKET_MASTER] _set_initial_candles cache error {0}'.format(error))
+
+        full_download = hist_candles is None
+        if full_download:
+            for attempt in range(INITIAL_CANDLE_RETRIES):
+                try:
+                    hist_candles = rest_api.get_custom_candles(symbol=symbol, interval=interval, limit=self._get_candle_capacity(interval), download_dir=self._get_download_dir())
+                except Exception as error:
+                    logging.critical('[SOCKET_MASTER] _initial_candles error {0}'.format(error))
+                    hist_candles = None
 
+                if _is_candle_data(hist_candles):
+                    break
+                logging.warning('[SOCKET_MASTER] _initial_candles {0}'.format(hist_candles))
+                time.sleep(2**attempt)
 
-    def _set_initial_depth(self, symbol, rest_api):
-        try:
-            rest_data = rest_api.get_orderBook(symbol=symbol, limit=self.BASE_DEPTH_LIMIT)
-            hist_books = formatter.format_depth(rest_data, 'REST')
-        except Exception as error:
-            logging.critical('[SOCKET_MASTER] _set_initial_depth error {0}'.format(error))
-            logging.warning('[SOCKET_MASTER] _set_initial_depth {0}'.format(rest_data))
-        self.book_data.update({symbol:hist_books})
+        if not _is_candle_data(hist_candles):
+            ## REST is unavailable, start from the cache even when it is old (the gap is backfilled once candles
+            ## arrive), the file is not replaced. Without a cache the store starts empty.
+            hist_candles = candle_file.read(self._get_candle_capacity(interval))[::-1] if candle_file != None else np.zeros((0, len(candle_store.CANDLE_COLUMNS)))
+            full_download = False
+            logging.critical('[SOCKET_MASTER] No REST candles for {0}, starting from {1} cached candles.'.format(symbol, len(hist_candles)))
+
+        if not symbol in self.candle_locks:
+            self.candle_locks.update({symbol:threading.RLock()})
+
+        store = candle_store.Candle_Store(self._get_candle_capacity(interval), self.compact_candles)
+        store.reset(hist_candles)
+        self.candle_data.update({symbol:store})
+        self.candle_intervals.update({symbol:interval})
+        self.candle_gaps.update({symbol:{'gaps_detected':0, 'candles_filled':0}})
+
+        if candle_file != None:
+            ## The newest candle is still forming, only the closed ones are kept on disk. A full download
+            ## replaces the file so it never holds a gap.
+            if full_download:
+                candle_file.reset(store.view()[1:][::-1])
+            else:
+                candle_file.append(store.view()[1:][::-1])
+
+        return(full_download)
+
+
+    def _get_cached_candles(self, symbol, interval, candle_file, rest_api, limit):
+        '''
+        Newest first cached candles joined with the candles since the last cached close time, None if the
+        cache is empty, too old or does not line up with the downloaded tail.
+        '''
+        cached_candles = candle_file.read(limit)
+        if len(cached_candles) == 0:
+            return(None)
+
+        last_open_time  = cached_candles[-1][0]
+        last_close_time = cached_candles[-1][6]
+        interval_time   = last_close_time - last_open_time + 1
+
+        missing_candles = max(int(((time.time()*1000) - last_close_time) // interval_time), 0) + 2
+        if missing_candles >= limit:
+            return(None)
+
+        tail_candles = np.asarray(rest_api.get_custom_candles(symbol=symbol, interval=interval, limit=missing_candles, download_dir=self._get_download_dir()), dtype=float).reshape(-1, len(candle_store.CANDLE_COLUMNS))
+        new_candles = tail_candles[tail_candles[:, 0] > last_open_time]
+
+        if len(new_candles) > 0 and new_candles[-1][0] > (last_open_time + interval_time):
+            logging.info('[SOCKET_MASTER] Candle cache for {0} has a gap, downloading full history.'.format(symbol))
+            return(None)
+
+        logging.info('[SOCKET_MASTER] Loaded {0} cached candles for {1}, {2} new.'.format(len(cached_candles), symbol, len(new_candles)))
+        return(np.concatenate((new_candles, cached_candles[::-1]))[:limit])
+
+
+    def _get_download_dir(self):
+        ## Long kline downloads keep their finished chunks next to the candle cache so an interrupted download resumes.
+        if self.candle_cache_dir == None:
+            return(None)
+        return(os.path.join(self.candle_cache_dir, KLINE_DOWNLOAD_DIR))
+
+
+    def _get_candle_capacity(self, interval):
+        ## The base candles have to cover a full bucket of the largest resampled interval.
+        capacity = self.BASE_CANDLE_LIMIT
+        interval_time = candle_resampler.interval_to_ms(interval)
+
+        if interval_time != None:
+            for resample_interval in self.resample_intervals:
+                capacity = max(capacity, (candle_resampler.interval_to_ms(resample_interval) // interval_time) + 1)
+
+        return(capacity)
+
+
+    def _set_initial_resamplers(self, symbol, rest_api):
+        resamplers = {}
+
+        for interval in self.resample_intervals:
+            ## Older candles of the interval are loaded once, from then on it is only fed by the kline stream.
+            resampler = candle_resampler.Candle_Resampler(self.candle_data[symbol], candle_resampler.interval_to_ms(interval), self.BASE_CANDLE_LIMIT)
+            try:
+                target_candles = rest_api.get_custom_candles(symbol=symbol, interval=interval, limit=self.BASE_CANDLE_LIMIT, download_dir=self._get_download_dir())
+            except Exception as error:
+                logging.warning('[SOCKET_MASTER] _set_initial_resamplers error {0}'.format(error))
+                target_candles = []
+
+            resampler.seed(target_candles)
+            resamplers.update({interval:resampler})
+
+        self.candle_resamplers.update({symbol:resamplers})
+
+
+    def _set_initial_depth(self, symbol):
+        ## Books start empty and buffer the diff stream, the REST snapshot is only fetched once the first events are
+        ## kept (see _update_depth) so it always overlaps them, as the exchange documents for local books.
+        self.book_data.update({symbol:order_book.Order_Book(self.BASE_DEPTH_LIMIT)})
 
 
     def _update_candles(self, data):
         rC = data['k']
-
+        symbol = rC['s']
+
+        with self.candle_locks[symbol]:
+            ## While a gap is backfilled the live candles are queued for the backfill thread (added in order once it is done).
+            if symbol in self.candle_backlogs:
+                self.candle_backlogs[symbol].append(rC)
+                return
+
+            store = self.candle_data[symbol]
+            last_open_time = store.get_last_open_time()
+            open_time = rC['t']
+
+            if last_open_time != None and open_time > last_open_time and self.rest_api != None and symbol in self.candle_intervals:
+                interval_time = store.view()[0][6] - last_open_time + 1
+                if open_time > last_open_time + interval_time:
+                    ## Candles were missed (socket outage), the REST calls are made off the socket thread.
+                    self.candle_gaps[symbol]['gaps_detected'] += 1
+                    logging.info('[SOCKET_MASTER] Candle gap detected for {0}, backfilling.'.format(symbol))
+                    self.candle_backlogs.update({symbol:[rC]})
+                    threading.Thread(target=self._backfill_candles, args=(symbol, open_time, True)).start()
+                    return
+
+            self._add_live_candle(rC)
+
+
+    def _add_live_candle(self, rC):
+        ## Called under the candle lock of the symbol.
+        symbol = rC['s']
         live_candle_data = formatter.format_candles(rC, 'SOCK')
+        store = self.candle_data[symbol]
+        last_open_time = store.get_last_open_time()
 
-        if live_candle_data[0] == self.candle_data[rC['s']][0][0]:
-            self.candle_data[rC['s']][0] = live_candle_data
+        if live_candle_data[0] == last_open_time:
+            store.set_last(live_candle_data)
 
-        else:
-            if live_candle_data[0] > self.candle_data[rC['s']][0][0]:
-                self.candle_data[rC['s']].insert(0, live_candle_data)
-                self.candle_data[rC['s']] = self.candle_data[rC['s']][:self.BASE_CANDLE_LIMIT]
+        elif last_open_time == None or live_candle_data[0] > last_open_time:
+            ## The previous candle is closed now, keep it on disk unless it already is (its closing update or a backfill wrote it).
+            if symbol in self.candle_files and last_open_time != None:
+                candle_file = self.candle_files[symbol]
+                if candle_file.last_open_time == None or last_open_time > candle_file.last_open_time:
+                    candle_file.append(store.view()[0])
+            store.append(live_candle_data)
 
+        if symbol in self.candle_resamplers:
+            for resampler in self.candle_resamplers[symbol].values():
+                resampler.update()
 
-    def _update_depth(self, data):
-        live_depth_data = formatter.format_depth(data, 'SOCK')
-
-        for lask in live_depth_data['a']:
-            if lask[1] in self.book_data[data['s']]['a']:
-                if lask[2] == 0.0:
-                    del self.book_data[data['s']]['a'][lask[1]]
-                    continue
-
-                if self.book_data[data['s']]['a'][lask[1]][0] >= lask[0]:
-                    continue
-
-            self.book_data[data['s']]['a'].update({lask[1]:[lask[0],lask[2]]})
-
-        for lbid in live_depth_data['b']:
-            if lbid[1] in self.book_data[data['s']]['b']:
-                if lbid[2] == 0.0:
-                    del self.book_data[data['s']]['b'][lbid[1]]
-                    continue
-
-                if self.book_data[data['s']]['b'][lbid[1]][0] >= lbid[0]:
-                    continue
-
-            self.book_data[data['s']]['b'].update({lbid[1]:[lbid[0],lbid[2]]})
-
-        all_ask_prices = list(self.book_data[data['s']]['a'].keys())
-        all_ask_prices.sort()
-        if len(all_ask_prices) > self.BASE_DEPTH_LIMIT+1:
-            all_ask_prices_to_cut = all_ask_prices[self.BASE_DEPTH_LIMIT:]
-            for aPrice in all_ask_prices_to_cut:
-                if aPrice in self.book_data[data['s']]['a']:
-                    del self.book_data[data['s']]['a'][aPrice]
-
-        all_bid_prices = list(self.book_data[data['s']]['b'].keys())
-        all_bid_prices.sort(reverse=True)
-        if len(all_bid_prices) > self.BASE_DEPTH_LIMIT + 1:
-            all_bid_prices_to_cut = all_bid_prices[self.BASE_DEPTH_LIMIT:]
-            for bPrice in all_bid_prices_to_cut:
-                if bPrice in self.book_data[data['s']]['b']:
-                    del self.book_data[data['s']]['b'][bPrice]
+        if rC['x'] and symbol in self.candle_files:
+            self.candle_files[symbol].append(live_candle_data)
 
-        
-    def _orderbook_sorter_algo(self, books_dict_base, side):
-        book_depth_organised = []
 
-        prices_list = list(books_dict_base.keys())
+    def _backfill_candles(self, symbol, end_time=None, claimed=False):
+        '''
+        Refresh the newest stored candle and add the candles after it (up to end_time) from REST.
+
+        The REST calls are made without the candle lock, live candles that arrive meanwhile are queued and added
+        once the backfill is done (claimed is set when the caller already started the queue).
+        '''
+        if self.rest_api == None or not symbol in self.candle_intervals:
+            return(0)
 
-        if side == 'ask':
-            prices_list.sort()
-        elif side == 'bid':
-            prices_list.sort(reverse=True)
+        candle_lock = self.candle_locks[symbol]
+        store = self.candle_data[symbol]
+
+        with candle_lock:
+            if not claimed:
+                if symbol in self.candle_backlogs:
+                    ## Another backfill of the symbol is running.
+                    return(0)
+                self.candle_backlogs.update({symbol:[]})
+            last_open_time = store.get_last_open_time()
+
+        filled_candles = 0
+        try:
+            while last_open_time != None:
+                params = {'symbol':symbol, 'interval':self.candle_intervals[symbol], 'startTime':int(last_open_time), 'limit':1000}
+                if end_time != None:
+                    params.update({'endTime':int(end_time)-1})
+
+                try:
+                    rest_candles = self.rest_api.get_candles(**params)
+                except Exception as error:
+                    logging.warning('[SOCKET_MASTER] _backfill_candles error {0}'.format(error))
+                    break
 
-        prices_list = prices_list
+                ## REST candles are newest first, they are added oldest first.
+                rest_candles = np.asarray(rest_candles, dtype=float).reshape(-1, len(candle_store.CANDLE_COLUMNS))[::-1]
+                new_candles = rest_candles[rest_candles[:, 0] > last_open_time]
 
-        for price in prices_list:
-            if price in books_dict_base:
-                book_depth_organised.append([price, books_dict_base[price][1]])
+                with candle_lock:
+                    if len(rest_candles) > 0 and rest_candles[0][0] == last_open_time:
+                        store.set_last(rest_candles[0])
 
-        return(book_depth_organised)
+                    if len(new_candles) > 0:
+                        if symbol in self.candle_files:
+                            self.candle_files[symbol].append(store.view()[0])
+                            self.candle_files[symbol].append(new_candles[:-1] if end_time == None else new_candles)
+                        store.extend(new_candles)
+                        filled_candles += len(new_candles)
+                    last_open_time = store.get_last_open_time()
+
+                if len(rest_candles) < params['limit']:
+                    break
+
+        finally:
+            with candle_lock:
+                self.candle_gaps[symbol]['candles_filled'] += filled_candles
+
+                if filled_candles > 0 and symbol in self.candle_resamplers:
+                    for resampler in self.candle_resamplers[symbol].values():
+                        resampler.resync()
+
+                for rC in self.candle_backlogs.pop(symbol):
+                    self._add_live_candle(rC)
+
+        return(filled_candles)
+
+
+    def _update_best_prices(self, data):
+        best_prices = formatter.format_book_ticker(data)
+        last_prices = self.best_prices.get(data['s'])
+
+        ## A new dict is put in place on every update so readers never see half of one.
+        if last_prices == None or best_prices['u'] > last_prices['u']:
+            self.best_prices.update({data['s']:best_prices})
+
+
+    def _update_depth(self, data):
+        symbol = data['s']
+        book = self.book_data[symbol]
+
+        if not book.apply_diff(formatter.format_depth_arrays(data, 'SOCK')):
+            self.depth_resyncs.update({symbol:self.depth_resyncs.get(symbol, 0) + 1})
+            logging.warning('[SOCKET_MASTER] Depth stream gap for {0}, resyncing the book.'.format(symbol))
+            self._start_depth_resync(symbol)
+
+        elif book.state == 'RESYNC' and book.pending_snapshot == None:
+            ## The book buffers the events but no snapshot is on its way (a new book, or a resync that gave up when
+            ## the socket stopped), the events are kept now so a snapshot can be fetched.
+            self._start_depth_resync(symbol)
+
+
+    def _start_depth_resync(self, symbol):
+        ## Only the book with the gap is resynced, the others keep streaming while the snapshot is downloaded.
+        if symbol in self.resyncing_books:
+            return
+
+        self.resyncing_books.add(symbol)
+        resync_thread = threading.Thread(target=self._resync_depth, args=(symbol,))
+        resync_thread.start()
+
+
+    def _resync_depth(self, symbol):
+        ## Snapshots are taken from the weight budget shared with the other bulk REST calls, so books that all
+        ## need one at once (start up, reconnects) are spread out instead of hitting the rate limit together.
+        limiter = self.rest_api.weight_limiter
+        depth_weight = _get_depth_weight(self.BASE_DEPTH_LIMIT)
+        attempt = 0
+        depth_data = None
+        while depth_data == None:
+            if attempt > 0 and not self.socketRunning:
+                ## The socket stopped, the next event after a restart starts a new resync.
+                logging.info('[SOCKET_MASTER] Socket stopped, giving up the resync of {0}.'.format(symbol))
+                break
+
+            limiter.acquire(depth_weight)
+            try:
+                rest_data = self.rest_api.get_orderBook(symbol=symbol, limit=self.BASE_DEPTH_LIMIT)
+            except Exception as error:
+                logging.warning('[SOCKET_MASTER] _resync_depth error {0}'.format(error))
+                time.sleep(min(2**attempt, 30))
+                attempt += 1
+                continue
+
+            if 'lastUpdateId' in rest_data:
+                depth_data = formatter.format_depth_arrays(rest_data, 'REST')
+            else:
+                ## Error response (e.g. -1003 too many requests), wait for the next minute before retrying.
+                logging.warning('[SOCKET_MASTER] _resync_depth {0} {1}'.format(symbol, rest_data))
+                limiter.block_minute()
+                attempt += 1
+
+        ## Handed over before the symbol is cleared so no second resync starts in between, a snapshot that turns
+        ## out too old leaves the book waiting and the event after the clear starts a new one.
+        if depth_data != None:
+            self.book_data[symbol].set_snapshot(depth_data)
+        self.resyncing_books.discard(symbol)
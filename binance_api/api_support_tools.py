@@ -4,9 +4,11 @@ import re
 import time
 import json
 import logging
-from datetime import datetime
 
 from . import api_master_rest_caller
+from . import candle_resampler
+from . import candle_store
+from . import kline_downloader
 
 BASE_1m = (60*1000)
 BASE_1h = BASE_1m*60
@@ -158,9 +160,6 @@ def get_custom_candles(kwargs):
 
     total_candles_left = kwargs['limit']
 
-    c_limit = 0
-    c_start_time = 0 if not 'startTime' in kwargs else kwargs['startTime']
-    c_end_time = 0
     best_interval = None
 
     if interval_time_type == 'm':
@@ -178,116 +177,43 @@ def get_custom_candles(kwargs):
     if best_interval == interval_number_multiplier:
         total_candles_left = int(kwargs['limit'])
     else:
-        total_candles_left = int(kwargs['limit']*(interval_number_multiplier/best_interval))
+        ## One extra bucket, the oldest one is usually only partly covered and is dropped.
+        total_candles_left = int((kwargs['limit']+1)*(interval_number_multiplier/best_interval))
 
     best_interval = '{0}{1}'.format(best_interval, interval_time_type)
 
-    total_sets_done = 0
-    total_sets = total_candles_left/1000
+    ## One shared (pooled) session for every request of the download.
+    rest_api = kwargs['rest_api'] if 'rest_api' in kwargs else api_master_rest_caller.Binance_REST()
 
-    print('Total 1k sets: {0}'.format(total_sets))
-
-    while True:
-
-        total_left_Time = (total_sets-total_sets_done)*1.2
-
-        if total_left_Time > 60:
-            time_min, time_sec = str(total_left_Time/60).split('.')
-
-            time_sec = (int(time_sec[:2])/100)*60
-
-            f_total_time = '{0}.{1:.0f}m'.format(int(time_min), time_sec)
-        else:
-            f_total_time = '{0}s'.format(int(total_left_Time))
-
-
-        print('Candle sets: {0}/{1}, ETA: {2}'.format(total_sets_done, total_sets, f_total_time))
-
-        if total_candles_left > 1000:
-            total_candles_left -= 1000
-            c_limit = 1000
-
-        else:
-            if total_candles_left == 0:
-                break
-            else:
-                c_limit = total_candles_left
-                total_candles_left = 0
-
-        total_sets_done += c_limit/1000
-
-        if c_end_time == 0:
-            candles = api_master_rest_caller.Binance_REST().get_candles(
-                symbol=kwargs['symbol'], 
-                interval=best_interval, 
-                limit=c_limit)
-        else:
-            time.sleep(0.75)
-            candles = api_master_rest_caller.Binance_REST().get_candles(
-                symbol=kwargs['symbol'], 
-                interval=best_interval, 
-                limit=c_limit, 
-                endTime=c_end_time)
-
-        c_end_time = candles[-1][0]-1
-        candle_data = candle_data + candles
+    if total_candles_left <= kline_downloader.CHUNK_CANDLES:
+        candle_data = rest_api.get_candles(
+            symbol=kwargs['symbol'], 
+            interval=best_interval, 
+            limit=total_candles_left)
+    else:
+        ## Longer histories are split in time chunks that are downloaded concurrently (and resumed from download_dir if set).
+        interval_time = candle_resampler.interval_to_ms(best_interval)
+        forming_open = (int(time.time()*1000) // interval_time) * interval_time
+        downloader = kline_downloader.Kline_Downloader(rest_api, download_dir=kwargs.get('download_dir'), limiter=rest_api.weight_limiter)
+        candle_data = downloader.download(
+            kwargs['symbol'], 
+            best_interval, 
+            interval_time, 
+            forming_open-((total_candles_left-1)*interval_time), 
+            forming_open+interval_time)
+        ## Kept as a NumPy array, the resampling works on it directly and lists are only built for the result.
+        candle_data = candle_data[:total_candles_left]
 
     ## To be used to build custom timeframes
     if best_interval != kwargs['interval']:
+        ## Candles are bucketed on multiples of the interval (as Binance does) with grouped NumPy reductions,
+        ## the newest bucket is the forming candle.
+        interval_time = candle_resampler.interval_to_ms(kwargs['interval'])
+        built_candles = candle_resampler.resample_candles(candle_data, interval_time)[:kwargs['limit']]
 
-        # Build the most recent candles close time into a valid timestamp.
-        cc_time=round((candle_data[0][6]/1000))
-
-        if interval_time_type == 'm':
-            current_time = time.localtime()[4]
-            split_time = int(str(datetime.fromtimestamp(cc_time))[11:].split(':')[1])
-        elif interval_time_type == 'h':
-            current_time = time.localtime()[3]
-            split_time = int(str(datetime.fromtimestamp(cc_time))[11:].split(':')[0])
-        elif interval_time_type == 'd':
-            current_time = time.localtime()[2]
-            split_time = int(str(datetime.fromtimestamp(cc_time))[:10].split('-')[2])
-
-        # How many candles required for the current candle with the new timeframe.
-        current_range = round((split_time%interval_number_multiplier)/int(best_interval[:-1]))
-
-        # This holds the amount of candles will be part of 1 with the new timeframe.
-        normal_range = round(interval_number_multiplier/int(best_interval[:-1]))
-
-        # max amount of candles for new timeframe.
-        candles_for_new_timeframe = round(len(candle_data)/normal_range)-1
-
-        # New empty list where the newly built candles will be held
-        buit_candles = []
-
-        for i in range(candles_for_new_timeframe):
-            ccstart = i*current_range
-            ccend   = (i*current_range)+current_range
-
-            otime       = candle_data[ccend-1][0]
-            copen       = candle_data[ccend-1][1]
-            chigh       = 0
-            clow        = 9999
-            cclose      = candle_data[ccstart][4]
-            cvolume     = 0
-            closetime   = candle_data[ccstart][6]
-            qavolume    = 0
-            numtrades   = 0
-
-            for x, candle in enumerate(candle_data[ccstart:ccend]):
-                chigh = candle[2] if candle[2] > chigh else chigh
-                clow = candle[3] if candle[3] < clow else clow
-                cvolume += candle[5]
-                qavolume += candle[7]
-                numtrades += candle[8]
-            
-            buit_candles.append([otime, copen, chigh, clow, cclose, cvolume, closetime, qavolume, numtrades])
-
-            current_range = normal_range
-
-        return_candles = buit_candles
+        return_candles = candle_store.candles_to_list(built_candles)
     else:
-        return_candles = candle_data
+        return_candles = candle_store.candles_to_list(candle_data) if not isinstance(candle_data, list) else candle_data
 
     return(return_candles)
 
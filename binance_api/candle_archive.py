@@ -0,0 +1,219 @@
+#! /usr/bin/env python3
+
+import os
+import zlib
+import struct
+import numpy as np
+
+from . import candle_store
+
+'''
+Columnar candle archive.
+
+    file    = FILE_HEADER block*
+    block   = BLOCK_HEADER zlib(open_time deltas | close_time - open_time | trades | price/volume columns)
+
+Open times are stored as the first open time followed by the deltas between candles and close times as their
+offset to the open time (both int64, mostly constant so they compress to almost nothing). Prices and volumes are
+stored as float64 or float32 (set per file). The block headers hold the time range of every block and make up
+the time index, ranges are read by decompressing only the blocks that overlap them.
+'''
+MAGIC = b'CANDLES1'
+
+## magic, price dtype ('d' float64 / 'f' float32)
+FILE_HEADER = struct.Struct('<8sc7x')
+
+## first open time, last open time, candles, compressed size
+BLOCK_HEADER = struct.Struct('<qqII')
+
+## Candles per block, ~3 days of 1m candles.
+BLOCK_CANDLES = 4096
+
+COMPRESS_LEVEL = 6
+
+PRICE_COLUMNS = [1, 2, 3, 4, 5, 7]
+PRICE_DTYPES = {'d':np.float64, 'f':np.float32}
+
+
+def _encode_block(candles, price_dtype):
+    open_times = candles[:, 0].astype(np.int64)
+    time_deltas = np.diff(open_times, prepend=0)
+    close_offsets = candles[:, 6].astype(np.int64) - open_times
+    trades = candles[:, 8].astype(np.int64)
+    prices = candles[:, PRICE_COLUMNS].T.astype(PRICE_DTYPES[price_dtype])
+
+    payload = b''.join([time_deltas.tobytes(), close_offsets.tobytes(), trades.tobytes(), np.ascontiguousarray(prices).tobytes()])
+    return(zlib.compress(payload, COMPRESS_LEVEL))
+
+
+def _decode_block(data, count, price_dtype):
+    payload = zlib.decompress(data)
+    int_columns = np.frombuffer(payload, dtype=np.int64, count=count*3).reshape(3, count)
+    prices = np.frombuffer(payload, dtype=PRICE_DTYPES[price_dtype], offset=count*3*8).reshape(len(PRICE_COLUMNS), count)
+
+    candles = np.zeros((count, len(candle_store.CANDLE_COLUMNS)))
+    candles[:, 0] = np.cumsum(int_columns[0])
+    candles[:, 6] = candles[:, 0] + int_columns[1]
+    candles[:, 8] = int_columns[2]
+    candles[:, PRICE_COLUMNS] = prices.T
+    return(candles)
+
+
+def _read_index(f):
+    ## Block headers of the file [(first_open, last_open, count, size, payload offset)], stops at a partly written block.
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    f.seek(FILE_HEADER.size)
+
+    index = []
+    while f.tell() + BLOCK_HEADER.size <= file_size:
+        first_open, last_open, count, size = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        offset = f.tell()
+        if offset + size > file_size:
+            break
+        index.append((first_open, last_open, count, size, offset))
+        f.seek(offset + size)
+
+    return(index)
+
+
+class Candle_Archive_Writer:
+    '''
+    Appends oldest first closed candles to an archive file, candles that are not newer than the last archived one
+    are skipped. Every block is written as soon as block_candles candles are pending, only the candles since the
+    last full block are held in memory. Call flush (or close) to write those as a (smaller) block, used as a
+    context manager the writer is closed on any exit:
+
+        with Candle_Archive_Writer(path) as writer:
+            writer.append(candles)
+    '''
+    def __init__(self, path, price_dtype='d', block_candles=BLOCK_CANDLES):
+        self.path           = path
+        self.block_candles  = block_candles
+        self.pending        = []
+        self.last_open_time = None
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= FILE_HEADER.size:
+            with open(self.path, 'r+b') as f:
+                magic, price_dtype = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+                if magic != MAGIC:
+                    raise ValueError('{0} is not a candle archive.'.format(self.path))
+                index = _read_index(f)
+
+                ## Drop a partly written block (the writer was stopped mid write).
+                end = (index[-1][4] + index[-1][3]) if index else FILE_HEADER.size
+                f.truncate(end)
+
+            self.price_dtype = price_dtype.decode()
+            if index:
+                self.last_open_time = index[-1][1]
+        else:
+            self.price_dtype = price_dtype
+            with open(self.path, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, self.price_dtype.encode()))
+
+
+    def append(self, candles):
+        '''
+        Add oldest first closed candles, returns how many were added.
+        '''
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, len(candle_store.CANDLE_COLUMNS))
+        if self.last_open_time != None:
+            candles = candles[candles[:, 0] > self.last_open_time]
+
+        if len(candles) == 0:
+            return(0)
+
+        self.pending.append(candles)
+        self.last_open_time = candles[-1][0]
+
+        if sum([len(part) for part in self.pending]) >= self.block_candles:
+            self._write_blocks(False)
+        return(len(candles))
+
+
+    def flush(self):
+        self._write_blocks(True)
+
+
+    def close(self):
+        self.flush()
+
+
+    def __enter__(self):
+        return(self)
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def _write_blocks(self, write_partial):
+        if not self.pending:
+            return
+
+        candles = np.concatenate(self.pending)
+        full_blocks = len(candles) // self.block_candles
+        written = len(candles) if write_partial else full_blocks*self.block_candles
+
+        with open(self.path, 'ab') as f:
+            for start in range(0, written, self.block_candles):
+                block = candles[start:min(start+self.block_candles, written)]
+                data = _encode_block(block, self.price_dtype)
+                f.write(BLOCK_HEADER.pack(int(block[0][0]), int(block[-1][0]), len(block), len(data)))
+                f.write(data)
+
+        self.pending = [candles[written:]] if written < len(candles) else []
+
+
+class Candle_Archive_Reader:
+    '''
+    Reads candle ranges from an archive, only the blocks that overlap the range are read and decompressed.
+    '''
+    def __init__(self, path):
+        self.path = path
+
+        with open(self.path, 'rb') as f:
+            magic, price_dtype = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError('{0} is not a candle archive.'.format(self.path))
+            self.index = _read_index(f)
+
+        self.price_dtype = price_dtype.decode()
+        self.first_opens = np.array([block[0] for block in self.index], dtype=np.int64)
+        self.last_opens = np.array([block[1] for block in self.index], dtype=np.int64)
+
+
+    def get_time_range(self):
+        ''' (first open time, last open time) of the archive, None when it is empty. '''
+        if not self.index:
+            return(None)
+        return(int(self.first_opens[0]), int(self.last_opens[-1]))
+
+
+    def read(self, start_time=None, end_time=None):
+        '''
+        Oldest first candles with open times in [start_time, end_time), the whole archive by default.
+        '''
+        start_time = -2**62 if start_time == None else int(start_time)
+        end_time = 2**62 if end_time == None else int(end_time)
+
+        ## Blocks are in time order so the overlapping ones are one contiguous run.
+        first_block = np.searchsorted(self.last_opens, start_time, side='left')
+        last_block = np.searchsorted(self.first_opens, end_time, side='left')
+
+        blocks = []
+        with open(self.path, 'rb') as f:
+            for first_open, last_open, count, size, offset in self.index[first_block:last_block]:
+                f.seek(offset)
+                blocks.append(_decode_block(f.read(size), count, self.price_dtype))
+
+        if not blocks:
+            return(np.zeros((0, len(candle_store.CANDLE_COLUMNS))))
+
+        candles = np.concatenate(blocks)
+        return(candles[(candles[:, 0] >= start_time) & (candles[:, 0] < end_time)])
+
+
+    def __len__(self):
+        return(sum([block[2] for block in self.index]))
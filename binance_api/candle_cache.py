@@ -0,0 +1,76 @@
+#! /usr/bin/env python3
+
+import os
+import numpy as np
+
+from . import candle_store
+
+## Each record is one candle in the candle_store column layout stored as float64.
+RECORD_COLUMNS  = len(candle_store.CANDLE_COLUMNS)
+RECORD_SIZE     = RECORD_COLUMNS * np.dtype(np.float64).itemsize
+
+
+class Candle_File:
+    '''
+    Append only file of closed candles for one symbol/interval, records are kept oldest first and
+    read back through a memory map so only the pages that are used get loaded.
+    '''
+    def __init__(self, path):
+        self.path           = path
+        self.last_open_time = None
+
+        if os.path.exists(self.path):
+            ## Drop a partially written record (the bot was stopped mid write).
+            extra_bytes = os.path.getsize(self.path) % RECORD_SIZE
+            if extra_bytes:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(os.path.getsize(self.path) - extra_bytes)
+
+            last_candle = self.read(1)
+            if len(last_candle) > 0:
+                self.last_open_time = last_candle[-1][0]
+
+
+    def read(self, limit=None):
+        '''
+        Oldest first closed candles, only the newest 'limit' of them if set.
+        '''
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < RECORD_SIZE:
+            return(np.zeros((0, RECORD_COLUMNS)))
+
+        records = np.memmap(self.path, dtype=np.float64, mode='r').reshape(-1, RECORD_COLUMNS)
+        if limit:
+            records = records[-limit:]
+        return(np.array(records))
+
+
+    def reset(self, candles):
+        '''
+        Replace the file with oldest first closed candles.
+        '''
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, RECORD_COLUMNS)
+
+        temp_path = '{0}.tmp'.format(self.path)
+        with open(temp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(candles).tobytes())
+        os.replace(temp_path, self.path)
+
+        self.last_open_time = candles[-1][0] if len(candles) > 0 else None
+
+
+    def append(self, candles):
+        '''
+        Add oldest first closed candles, candles that are not newer than the last stored one are skipped.
+        '''
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, RECORD_COLUMNS)
+        if self.last_open_time != None:
+            candles = candles[candles[:, 0] > self.last_open_time]
+
+        if len(candles) == 0:
+            return(0)
+
+        with open(self.path, 'ab') as f:
+            f.write(np.ascontiguousarray(candles).tobytes())
+
+        self.last_open_time = candles[-1][0]
+        return(len(candles))
@@ -0,0 +1,142 @@
+#! /usr/bin/env python3
+
+import numpy as np
+
+from . import candle_store
+
+## Interval units that line up with epoch time (Binance weeks/months do not).
+INTERVAL_UNITS = {'m':60*1000, 'h':60*60*1000, 'd':24*60*60*1000}
+
+
+def interval_to_ms(interval):
+    ''' '15m' -> 900000, None for intervals that can not be resampled. '''
+    if not interval[-1] in INTERVAL_UNITS or not interval[:-1].isdigit():
+        return(None)
+    return(int(interval[:-1]) * INTERVAL_UNITS[interval[-1]])
+
+
+def resample_candles(candles, interval_time):
+    '''
+    Aggregate newest first candles into newest first candles of interval_time (ms), buckets start on
+    multiples of interval_time. The oldest bucket is dropped when the candles do not cover its start.
+    '''
+    candles = np.asarray(candles, dtype=float).reshape(-1, len(candle_store.CANDLE_COLUMNS))[::-1]
+    if len(candles) == 0:
+        return(np.zeros((0, len(candle_store.CANDLE_COLUMNS))))
+
+    bucket_opens = (candles[:, 0] // interval_time) * interval_time
+    starts = np.flatnonzero(np.r_[True, bucket_opens[1:] != bucket_opens[:-1]])
+    ends = np.r_[starts[1:], len(candles)] - 1
+
+    resampled = np.zeros((len(starts), len(candle_store.CANDLE_COLUMNS)))
+    resampled[:, 0] = bucket_opens[starts]
+    resampled[:, 1] = candles[starts, 1]
+    resampled[:, 2] = np.maximum.reduceat(candles[:, 2], starts)
+    resampled[:, 3] = np.minimum.reduceat(candles[:, 3], starts)
+    resampled[:, 4] = candles[ends, 4]
+    resampled[:, 5] = np.add.reduceat(candles[:, 5], starts)
+    resampled[:, 6] = bucket_opens[starts] + interval_time - 1
+    resampled[:, 7] = np.add.reduceat(candles[:, 7], starts)
+    resampled[:, 8] = np.add.reduceat(candles[:, 8], starts)
+
+    if candles[0, 0] != bucket_opens[0]:
+        resampled = resampled[1:]
+
+    return(resampled[::-1])
+
+
+def _combine_candles(older, newer):
+    ## Candle made of two consecutive parts, times are set by the caller.
+    if older is None:
+        return(np.array(newer, dtype=float))
+    return(np.array([
+        older[0], older[1], max(older[2], newer[2]), min(older[3], newer[3]), newer[4],
+        older[5] + newer[5], newer[6], older[7] + newer[7], older[8] + newer[8]]))
+
+
+class Candle_Resampler:
+    '''
+    Keeps a higher timeframe Candle_Store up to date from a base (e.g. 1m) Candle_Store.
+
+    The base candles that already closed inside the current bucket are kept folded together so each
+    base kline update only combines that with the forming base candle (O(1) per update).
+    '''
+    def __init__(self, base_store, interval_time, capacity):
+        self.base_store     = base_store
+        self.interval_time  = interval_time
+        self.store          = candle_store.Candle_Store(capacity, base_store.compact)
+        self.bucket_open    = None
+        self.base_open      = None
+        self.closed_part    = None
+
+
+    def seed(self, target_candles):
+        '''
+        Start from newest first candles of the target interval (REST), buckets covered by the base candles are rebuilt from them.
+        '''
+        self.resync(target_candles)
+
+
+    def resync(self, target_candles=None):
+        '''
+        Rebuild the candles covered by the base store (after a seed or a backfill of the base candles).
+        '''
+        if target_candles is None:
+            target_candles = self.store.view()
+        target_candles = np.asarray(target_candles, dtype=float).reshape(-1, len(candle_store.CANDLE_COLUMNS))
+
+        resampled = resample_candles(self.base_store.view(), self.interval_time)
+        if len(resampled) > 0:
+            older_candles = target_candles[target_candles[:, 0] < resampled[-1][0]]
+            target_candles = np.concatenate((resampled, older_candles))
+
+        self.store.reset(target_candles)
+        self._set_bucket()
+
+
+    def update(self):
+        '''
+        Apply the newest base candle (call after every base store update).
+        '''
+        base_candles = self.base_store.view()
+        base_candle = base_candles[0]
+        bucket_open = (base_candle[0] // self.interval_time) * self.interval_time
+
+        if base_candle[0] != self.base_open and self.base_open != None and len(base_candles) > 1:
+            ## The previous base candle closed, its final values are folded into the bucket it belongs to.
+            previous_candle = base_candles[1]
+            if previous_candle[0] == self.base_open and self.bucket_open != None:
+                self.store.set_last(self._bucket_candle(self.closed_part, previous_candle))
+                self.closed_part = _combine_candles(self.closed_part, previous_candle)
+
+        if bucket_open != self.bucket_open:
+            self.bucket_open = bucket_open
+            self.closed_part = None
+            self.store.append(self._bucket_candle(None, base_candle))
+        else:
+            self.store.set_last(self._bucket_candle(self.closed_part, base_candle))
+
+        self.base_open = base_candle[0]
+
+
+    def _set_bucket(self):
+        base_candles = self.base_store.view()
+        self.bucket_open = self.store.get_last_open_time()
+        self.base_open = None
+        self.closed_part = None
+
+        if len(base_candles) == 0 or self.bucket_open == None:
+            return
+
+        self.base_open = base_candles[0][0]
+        ## Closed base candles of the current bucket, oldest first.
+        in_bucket = base_candles[1:][base_candles[1:, 0] >= self.bucket_open][::-1]
+        for candle in in_bucket:
+            self.closed_part = _combine_candles(self.closed_part, candle)
+
+
+    def _bucket_candle(self, closed_part, base_candle):
+        candle = _combine_candles(closed_part, base_candle)
+        candle[0] = (base_candle[0] // self.interval_time) * self.interval_time
+        candle[6] = candle[0] + self.interval_time - 1
+        return(candle)
@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+
+import gc
+import numpy as np
+
+## Column layout of a candle (same order as formatter.format_candles).
+CANDLE_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_volume', 'trades']
+
+## Columns that are handed out as ints when candles are converted back to lists.
+INT_COLUMNS = [0, 6, 8]
+
+## Compact mode keeps the close (last price, order prices are taken from it) as float64 and the other prices/volumes as float32.
+EXACT_COLUMNS = [4]
+FLOAT_COLUMNS = [1, 2, 3, 5, 7]
+
+
+def candles_to_list(candles):
+    ''' NumPy candles to lists in the formatter layout (times and trades as ints). '''
+    candles = np.asarray(candles, dtype=float).reshape(-1, len(CANDLE_COLUMNS))
+    columns = [ (candles[:, i].astype(np.int64) if i in INT_COLUMNS else candles[:, i]).tolist() for i in range(len(CANDLE_COLUMNS)) ]
+
+    ## Every new row list counts towards the cyclic GC, on long histories it ran over and over (4x the conversion
+    ## time) finding nothing to free, so it is paused while the rows are built.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return([ list(candle) for candle in zip(*columns) ])
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+class Candle_Store:
+    '''
+    Fixed capacity candle ring for a single symbol.
+
+    Every column is kept in a NumPy array twice side by side (mirrored) so the newest candles are always one
+    contiguous slice, this keeps adding a candle and updating the forming candle O(1) and reads copy free.
+
+    Read views are built once per new candle and reused, updates of the forming candle show through them.
+
+    In compact mode times and trades are kept as int64, the close as float64 and the other prices/volumes as
+    float32 (about 30% less memory). Open, high, low and the volumes are then only float32 accurate (27123.43 reads
+    back as 27123.4296875), the close keeps the price the exchange sent. The column views stay copy free, view()
+    builds a float64 copy of the candles once per new candle, updates of the forming candle are written into it.
+    '''
+    def __init__(self, capacity, compact=False):
+        self.capacity   = max(int(capacity), 1)
+        self.compact    = compact
+        self.head       = 0
+        self.count      = 0
+        self.views      = {}
+        self.candles    = None
+
+        if self.compact:
+            self.column_groups = [
+                (np.zeros((len(INT_COLUMNS), self.capacity*2), dtype=np.int64), INT_COLUMNS),
+                (np.zeros((len(EXACT_COLUMNS), self.capacity*2)), EXACT_COLUMNS),
+                (np.zeros((len(FLOAT_COLUMNS), self.capacity*2), dtype=np.float32), FLOAT_COLUMNS)]
+        else:
+            self.data       = np.zeros((len(CANDLE_COLUMNS), self.capacity*2))
+            self.column_groups = [(self.data, list(range(len(CANDLE_COLUMNS))))]
+
+
+    def reset(self, candles):
+        '''
+        Replace the store with newest first candles (as returned by the REST calls).
+        '''
+        candles = np.asarray(candles, dtype=float).reshape(-1, len(CANDLE_COLUMNS))[:self.capacity]
+
+        self.count = len(candles)
+        self.head = self.count % self.capacity
+        self._write(0, candles[::-1].T)
+        self.views = {}
+        self.candles = None
+
+
+    def append(self, candle):
+        '''
+        Add a new (newest) candle, the oldest one is dropped once the store is full.
+        '''
+        self._write(self.head, np.asarray(candle, dtype=float).reshape(-1, 1))
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.views = {}
+        self.candles = None
+
+
+    def extend(self, candles):
+        '''
+        Add several oldest first candles at once.
+        '''
+        candles = np.asarray(candles, dtype=float).reshape(-1, len(CANDLE_COLUMNS))[-self.capacity:]
+        for candle in candles:
+            self._write(self.head, candle.reshape(-1, 1))
+            self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + len(candles), self.capacity)
+        self.views = {}
+        self.candles = None
+
+
+    def set_last(self, candle):
+        '''
+        Update the newest (forming) candle in place.
+        '''
+        index = (self.head - 1) % self.capacity
+        self._write(index, np.asarray(candle, dtype=float).reshape(-1, 1))
+
+        ## The widened compact copy is kept, only its newest row is refreshed.
+        if self.candles is not None:
+            for data, rows in self.column_groups:
+                self.candles_data[0, rows] = data[:, index]
+
+
+    def get_last_open_time(self):
+        if self.count == 0:
+            return(None)
+        if self.compact:
+            return(float(self.column_groups[0][0][0, (self.head - 1) % self.capacity]))
+        return(self.data[0, (self.head - 1) % self.capacity])
+
+
+    def get_nbytes(self):
+        ''' Bytes held by the candle arrays. '''
+        return(sum([data.nbytes for data, rows in self.column_groups]))
+
+
+    def view(self):
+        '''
+        Newest first read only (candles x columns) view, candles[0] is the forming candle.
+        '''
+        if self.compact:
+            if self.candles is None:
+                columns = self.get_columns()
+                self.candles_data = np.empty((self.count, len(CANDLE_COLUMNS)))
+                for i, name in enumerate(CANDLE_COLUMNS):
+                    self.candles_data[:, i] = columns[name]
+                self.candles = self.candles_data.view()
+                self.candles.flags.writeable = False
+            return(self.candles)
+        return(self._get_views(True)['candles'])
+
+
+    def get_columns(self, newest_first=True):
+        '''
+        Read only views of every column by name ({'open_time':..., 'open':..., 'close':..., ...}).
+        '''
+        return(self._get_views(newest_first)['columns'])
+
+
+    def get_column(self, column, newest_first=True):
+        return(self._get_views(newest_first)['columns'][column])
+
+
+    def _write(self, start, columns):
+        ## columns is (columns x candles), written to both halves of the mirror.
+        end = start + columns.shape[1]
+        if self.compact:
+            for data, rows in self.column_groups:
+                data[:, start:end] = columns[rows]
+                data[:, start+self.capacity:end+self.capacity] = columns[rows]
+        else:
+            self.data[:, start:end] = columns
+            self.data[:, start+self.capacity:end+self.capacity] = columns
+
+
+    def _get_views(self, newest_first):
+        views = self.views
+        if not newest_first in views:
+            end = self.head + self.capacity
+            columns = {}
+            for data, rows in self.column_groups:
+                data_view = data[:, end-self.count:end]
+                if newest_first:
+                    data_view = data_view[:, ::-1]
+                data_view = data_view.view()
+                data_view.flags.writeable = False
+                columns.update({CANDLE_COLUMNS[row]:data_view[i] for i, row in enumerate(rows)})
+
+            views.update({newest_first:{
+                'candles':None if self.compact else data_view.T,
+                'columns':columns}})
+
+        return(views[newest_first])
+
+
+    def tolist(self, limit=None):
+        '''
+        Newest first candles as lists in the formatter layout (times and trades as ints).
+        '''
+        return(candles_to_list(self.view()[:limit]))
+
+
+    def __len__(self):
+        return(self.count)
@@ -1,3 +1,18 @@
+import numpy as np
+
+from . import candle_store
+
+## Columns of a REST kline row that make up a candle (the rest are unused).
+CANDLE_FIELDS = len(candle_store.CANDLE_COLUMNS)
+
+
+def format_candles_array(raw_data):
+    '''
+    REST klines as one newest first float64 NumPy array (candles x 9) in the candle format, converted in bulk.
+    '''
+    candles = np.array([c[:CANDLE_FIELDS] for c in raw_data], dtype=float).reshape(-1, CANDLE_FIELDS)
+    return(candles[::-1])
+
 
 def format_candles(raw_data, candleType):
     '''
@@ -5,19 +20,7 @@ def format_candles(raw_data, candleType):
         [Open_Time, Open, High, Low, Close, Volume, Close_Time, Quote_Asset_Volume, Num_trades]
     '''
     if candleType == 'REST':
-        format_data = [
-            [int(c[0]), 
-            float(c[1]), 
-            float(c[2]), 
-            float(c[3]), 
-            float(c[4]), 
-            float(c[5]), 
-            int(c[6]), 
-            float(c[7]), 
-            int(c[8])]
-            for c in raw_data]
-
-        format_data.reverse()
+        format_data = candle_store.candles_to_list(format_candles_array(raw_data))
 
     elif candleType == 'SOCK':
         c = raw_data
@@ -43,34 +46,61 @@ def format_trades(raw_data):
     return(format_data)
 
 
-def format_depth(raw_data, candleType):
+def _depth_levels(rows):
+    ## [[price, quantity], ...] strings to a float64 (levels x 2) array.
+    return(np.array(rows, dtype=float).reshape(-1, 2))
+
+
+def format_depth_arrays(raw_data, candleType):
     '''
-    Candle format =
-        [upID, price, quantity]
+    Depth as NumPy arrays converted in bulk, asks/bids are float64 (levels x 2) arrays of [price, quantity].
+        REST = {'lastUpdateId', 'a', 'b'}
+        SOCK = {'U' (first update id), 'u' (last update id), 'a', 'b'}
     '''
     if candleType == 'REST':
-        lastUpdateId = int(raw_data['lastUpdateId'])
+        format_data = {
+            'lastUpdateId':int(raw_data['lastUpdateId']),
+            'a':_depth_levels(raw_data['asks']),
+            'b':_depth_levels(raw_data['bids'])
+        }
 
-        a = {}
-        b = {}
+    elif candleType == 'SOCK':
+        format_data = {
+            'U':int(raw_data['U']),
+            'u':int(raw_data['u']),
+            'a':_depth_levels(raw_data['a']),
+            'b':_depth_levels(raw_data['b'])
+        }
 
-        for row in raw_data['asks']:
-            a.update({float(row[0]):[lastUpdateId, float(row[1])]})
+    return(format_data)
 
-        for row in raw_data['bids']:
-            b.update({float(row[0]):[lastUpdateId, float(row[1])]})
 
-        format_data ={
-            'a':a,
-            'b':b
-        }
+def format_book_ticker(raw_data):
+    '''
+    Top of book (bookTicker stream) = {'u', 'a':(price, quantity), 'b':(price, quantity)}
+    '''
+    return({
+        'u':int(raw_data['u']),
+        'a':(float(raw_data['a']), float(raw_data['A'])),
+        'b':(float(raw_data['b']), float(raw_data['B']))
+    })
+
+
+def format_depth(raw_data, candleType):
+    '''
+    Candle format =
+        [upID, price, quantity]
+    '''
+    depth_data = format_depth_arrays(raw_data, candleType)
+
+    if candleType == 'REST':
+        lastUpdateId = depth_data['lastUpdateId']
+
+        format_data = {side:{price:[lastUpdateId, quantity] for price, quantity in zip(depth_data[side][:, 0].tolist(), depth_data[side][:, 1].tolist())} for side in ['a', 'b']}
 
     elif candleType == 'SOCK':
-        lastUpdateId = int(raw_data['u'])
+        lastUpdateId = depth_data['u']
 
-        format_data = {
-            'a':[[lastUpdateId, float(row[0]), float(row[1])] for row in raw_data['a']],
-            'b':[[lastUpdateId, float(row[0]), float(row[1])] for row in raw_data['b']]
-        }
+        format_data = {side:[[lastUpdateId, price, quantity] for price, quantity in zip(depth_data[side][:, 0].tolist(), depth_data[side][:, 1].tolist())] for side in ['a', 'b']}
 
     return(format_data)
@@ -0,0 +1,189 @@
+#! /usr/bin/env python3
+
+import os
+import time
+import logging
+import threading
+import requests
+import numpy as np
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import formatter
+from . import marketData_api
+from . import candle_cache
+from . import candle_store
+
+## Most candles a single klines request returns, the range is split into chunks of this many candles.
+CHUNK_CANDLES = 1000
+
+## Request weight of one klines call and the weight per minute the downloader keeps to (the exchange allows 6000 per IP).
+KLINE_WEIGHT    = 2
+WEIGHT_BUDGET   = 1200
+
+DOWNLOAD_WORKERS    = 4
+MAX_RETRIES         = 5
+
+
+class Weight_Limiter:
+    '''
+    Thread safe request weight budget per minute, the exchange resets its weight count every minute so
+    the budget is kept per epoch minute as well.
+    '''
+    def __init__(self, budget):
+        self.budget = budget
+        self.lock   = threading.Lock()
+        self.minute = None
+        self.used   = 0
+
+
+    def acquire(self, weight):
+        '''
+        Wait until 'weight' fits in the budget of the current minute and take it.
+        '''
+        while True:
+            with self.lock:
+                now = time.time()
+                self._roll_minute(now)
+                if self.used + weight <= self.budget:
+                    self.used += weight
+                    return
+                wait_time = 60 - (now % 60)
+            time.sleep(wait_time)
+
+
+    def report_used(self, used_weight):
+        '''
+        Weight reported by the exchange, it also counts calls made outside of the downloader. Binance_REST reports
+        the weight of every response of its own limiter here (from the thread that made the call).
+        '''
+        with self.lock:
+            self._roll_minute(time.time())
+            self.used = max(self.used, used_weight)
+
+
+    def block_minute(self):
+        ''' Use up the rest of the current minute (after the exchange reported a rate limit). '''
+        with self.lock:
+            self._roll_minute(time.time())
+            self.used = self.budget
+
+
+    def _roll_minute(self, now):
+        minute = int(now // 60)
+        if minute != self.minute:
+            self.minute = minute
+            self.used = 0
+
+
+class Kline_Downloader:
+    '''
+    Downloads long kline histories by splitting the time range into chunks of CHUNK_CANDLES candles that are
+    fetched concurrently over the session of one Binance_REST object within the request weight budget (a
+    limiter shared with the other bulk calls of that object when one is given).
+
+    With a download_dir every whole chunk that only holds closed candles is stored once fetched, an interrupted
+    (or later) download of the same symbol/interval reuses the stored chunks that cover its range and only
+    fetches the gaps between them.
+    '''
+    def __init__(self, rest_api, workers=DOWNLOAD_WORKERS, weight_budget=WEIGHT_BUDGET, download_dir=None, limiter=None):
+        self.rest_api       = rest_api
+        self.workers        = max(int(workers), 1)
+        self.limiter        = limiter if limiter != None else Weight_Limiter(weight_budget)
+        self.download_dir   = download_dir
+
+
+    def download(self, symbol, interval, interval_time, start_time, end_time):
+        '''
+        Newest first NumPy candles with open times in [start_time, end_time), interval_time is the interval in ms.
+        '''
+        chunk_time = interval_time * CHUNK_CANDLES
+        start_time = (int(start_time) // interval_time) * interval_time
+        end_time = int(end_time)
+
+        ## Chunks whose last candle already closed do not change anymore and are stored/reused.
+        forming_open = (int(time.time()*1000) // interval_time) * interval_time
+        chunk_dir = None
+        stored_starts = []
+        if self.download_dir:
+            chunk_dir = os.path.join(self.download_dir, '{0}_{1}'.format(symbol, interval))
+            os.makedirs(chunk_dir, exist_ok=True)
+            stored_starts = self._get_stored_starts(chunk_dir, start_time-chunk_time, end_time)
+
+        ## Chunks start at the requested start time (a request of N candles takes ceil(N/1000) calls), stored chunks
+        ## of earlier downloads are used where they cover the range and new chunks end where a stored one starts.
+        chunk_ranges = []
+        position = start_time
+        while position < end_time:
+            index = bisect_right(stored_starts, position) - 1
+            if index >= 0 and position < stored_starts[index] + chunk_time:
+                chunk_ranges.append((stored_starts[index], stored_starts[index] + chunk_time, True))
+            else:
+                next_stored = stored_starts[index+1] if index+1 < len(stored_starts) else position + chunk_time
+                chunk_ranges.append((position, min(position + chunk_time, next_stored), False))
+            position = chunk_ranges[-1][1]
+
+        chunks = {}
+        missing_chunks = []
+        for chunk_start, chunk_end, stored in chunk_ranges:
+            if stored:
+                chunks.update({chunk_start:self._get_chunk_file(chunk_dir, chunk_start).read()})
+            else:
+                missing_chunks.append((chunk_start, chunk_end))
+
+        logging.info('[KLINE_DOWNLOADER] {0} {1}: {2} chunks, {3} to download.'.format(symbol, interval, len(chunk_ranges), len(missing_chunks)))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            jobs = {executor.submit(self._get_chunk, symbol, interval, chunk_start, chunk_end):(chunk_start, chunk_end) for chunk_start, chunk_end in missing_chunks}
+            for done, job in enumerate(as_completed(jobs)):
+                chunk_start, chunk_end = jobs[job]
+                candles = job.result()
+                ## Only whole closed chunks are stored, so a stored chunk always covers chunk_time.
+                if chunk_dir and chunk_end - chunk_start == chunk_time and chunk_end <= forming_open:
+                    self._get_chunk_file(chunk_dir, chunk_start).reset(candles)
+                chunks.update({chunk_start:candles})
+                logging.debug('[KLINE_DOWNLOADER] {0} {1}: chunk {2}/{3}'.format(symbol, interval, done+1, len(missing_chunks)))
+
+        if not chunks:
+            return(np.zeros((0, len(candle_store.CANDLE_COLUMNS))))
+
+        candles = np.concatenate([ chunks[chunk_start] for chunk_start, chunk_end, stored in chunk_ranges ])
+        candles = candles[(candles[:, 0] >= start_time) & (candles[:, 0] < end_time)]
+        return(candles[::-1])
+
+
+    def _get_stored_starts(self, chunk_dir, start_time, end_time):
+        ## Sorted starts of the chunk files ('<chunk_start>.bin') that can overlap [start_time, end_time).
+        stored_starts = []
+        for file_name in os.listdir(chunk_dir):
+            name, extension = os.path.splitext(file_name)
+            if extension == '.bin' and name.isdigit() and start_time < int(name) < end_time:
+                stored_starts.append(int(name))
+        return(sorted(stored_starts))
+
+
+    def _get_chunk_file(self, chunk_dir, chunk_start):
+        return(candle_cache.Candle_File(os.path.join(chunk_dir, '{0}.bin'.format(chunk_start))))
+
+
+    def _get_chunk(self, symbol, interval, chunk_start, chunk_end):
+        ## Oldest first candles of one chunk, rate limits and connection errors are retried.
+        parameters = {'symbol':symbol, 'interval':interval, 'startTime':chunk_start, 'endTime':chunk_end-1, 'limit':CHUNK_CANDLES}
+
+        for attempt in range(MAX_RETRIES):
+            self.limiter.acquire(KLINE_WEIGHT)
+            try:
+                data = self.rest_api.make_api_call(marketData_api.get_candles, dict(parameters))
+            except (requests.RequestException, ValueError) as error:
+                logging.warning('[KLINE_DOWNLOADER] {0} {1} chunk {2} failed: {3}'.format(symbol, interval, chunk_start, error))
+                time.sleep(2**attempt)
+                continue
+
+            if isinstance(data, dict):
+                ## Error response (e.g. -1003 too many requests), wait for the next minute before retrying.
+                self.limiter.block_minute()
+                continue
+
+            return(formatter.format_candles_array(data)[::-1])
+
+        raise RuntimeError('Unable to download {0} {1} candles from {2}.'.format(symbol, interval, chunk_start))
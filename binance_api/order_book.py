@@ -0,0 +1,349 @@
+#! /usr/bin/env python3
+
+import threading
+from bisect import bisect_left
+from operator import mul
+from itertools import accumulate
+from collections.abc import Mapping
+from types import MappingProxyType
+
+## Diff events kept while a book waits for a new snapshot (the oldest are dropped past this).
+MAX_BUFFERED_EVENTS = 1000
+
+## Book side a market order of each side fills against.
+FILL_SIDES = {'BUY':'a', 'SELL':'b'}
+
+## Best first running totals of a snapshot side, summed from its levels when first read (price, quantity -> amount).
+RUNNING_TOTALS = {'depth':lambda price, quantity: quantity, 'depth_quote':mul}
+
+
+def get_depth(snapshot, levels=None):
+    '''
+    {'a':quantity, 'b':quantity} summed over the best 'levels' levels of a snapshot (the whole book by default,
+    taken from the side totals that are kept up to date with the diffs).
+    '''
+    depth = {}
+    for side in ('a', 'b'):
+        if levels == None or levels >= len(snapshot[side]):
+            depth.update({side:snapshot['total'][side]})
+        else:
+            depth.update({side:snapshot['depth'][side][levels-1] if levels > 0 else 0.0})
+    return(depth)
+
+
+def get_imbalance(snapshot, levels=1):
+    '''
+    (bid quantity - ask quantity) / (bid quantity + ask quantity) over the best 'levels' levels, from -1 (only asks)
+    to 1 (only bids), None for an empty book.
+    '''
+    depth = get_depth(snapshot, levels)
+    total = depth['b'] + depth['a']
+    if total == 0.0:
+        return(None)
+    return((depth['b'] - depth['a']) / total)
+
+
+def get_fill_price(snapshot, side, quote_amount):
+    '''
+    Volume weighted average price a market order of 'side' (BUY/SELL) spending quote_amount would fill at,
+    found with a binary search over the running quote totals. None when the book is too thin to fill it.
+    '''
+    book_side = FILL_SIDES[side]
+    if quote_amount <= 0 or quote_amount > snapshot['total_quote'][book_side]:
+        return(None)
+
+    quote_totals = snapshot['depth_quote'][book_side]
+    index = bisect_left(quote_totals, quote_amount)
+    if quote_amount <= 0 or index >= len(quote_totals):
+        return(None)
+
+    ## Whole levels up to index, the rest is taken from the level at index.
+    filled_quantity = snapshot['depth'][book_side][index-1] if index > 0 else 0.0
+    filled_quote = quote_totals[index-1] if index > 0 else 0.0
+    filled_quantity += (quote_amount - filled_quote) / snapshot[book_side][index][0]
+    return(quote_amount / filled_quantity)
+
+
+class Book_Side:
+    '''
+    One side of an order book with its price levels kept sorted best first in parallel lists.
+
+    Levels are found with a binary search over the sort keys (the price for asks, the negated price for bids
+    so both sides sort ascending best first), the best level is always index 0 and the top k levels are the
+    first k entries. The total quantity and quote amount of the side are kept up to date by every level change.
+    '''
+    def __init__(self, is_bid):
+        self.sign           = -1.0 if is_bid else 1.0
+        self.keys           = []
+        self.quantities     = []
+        self.update_ids     = []
+        self.total          = 0.0
+        self.total_quote    = 0.0
+
+
+    def reset(self, levels, update_id):
+        '''
+        Replace the side with [[price, quantity], ...] levels (any order), empty levels are left out.
+        '''
+        levels = sorted([ (self.sign*price, quantity) for price, quantity in levels if quantity != 0.0 ])
+        self.keys       = [ level[0] for level in levels ]
+        self.quantities = [ level[1] for level in levels ]
+        self.update_ids = [ update_id ] * len(levels)
+        self.total          = sum(self.quantities)
+        self.total_quote    = sum(map(mul, self.get_prices(), self.quantities))
+
+
+    def update(self, price, quantity, update_id):
+        '''
+        Set the quantity at a price, a quantity of 0 removes the level. Updates older than the level are ignored.
+        '''
+        key = self.sign*price
+        index = bisect_left(self.keys, key)
+
+        if index < len(self.keys) and self.keys[index] == key:
+            if self.update_ids[index] >= update_id:
+                return
+            self._add_to_totals(price, quantity - self.quantities[index])
+            if quantity == 0.0:
+                del self.keys[index]
+                del self.quantities[index]
+                del self.update_ids[index]
+                if len(self.keys) == 0:
+                    ## An emptied side starts again from exact zeros (no rounding left over from the running sums).
+                    self.total = self.total_quote = 0.0
+            else:
+                self.quantities[index] = quantity
+                self.update_ids[index] = update_id
+
+        elif quantity != 0.0:
+            self._add_to_totals(price, quantity)
+            self.keys.insert(index, key)
+            self.quantities.insert(index, quantity)
+            self.update_ids.insert(index, update_id)
+
+
+    def trim(self, depth_limit):
+        ''' Drop the levels past depth_limit. '''
+        if len(self.keys) > depth_limit:
+            for price, quantity in zip(self.get_prices()[depth_limit:], self.quantities[depth_limit:]):
+                self._add_to_totals(price, -quantity)
+            del self.keys[depth_limit:]
+            del self.quantities[depth_limit:]
+            del self.update_ids[depth_limit:]
+
+
+    def get_levels(self, limit=None):
+        ''' Best first ((price, quantity), ...) of the top 'limit' levels (all by default). '''
+        return(tuple(zip(self.get_prices(limit), self.quantities[:limit])))
+
+
+    def get_prices(self, limit=None):
+        return(self.keys[:limit] if self.sign > 0 else [ -key for key in self.keys[:limit] ])
+
+
+    def _add_to_totals(self, price, quantity):
+        self.total += quantity
+        self.total_quote += price*quantity
+
+
+    def __len__(self):
+        return(len(self.keys))
+
+
+class Order_Book:
+    '''
+    Locally managed order book of one symbol, fed by a REST snapshot and the diff depth stream
+    (formatter.format_depth_arrays layout) and trimmed to depth_limit levels per side.
+
+    Diff events are sequence checked against the snapshot and each other:
+        SNAPSHOT    - events up to the snapshot lastUpdateId are dropped, the first one applied has to cover lastUpdateId+1.
+        LIVE        - every event has to start right after the last one (U == last u + 1).
+        RESYNC      - a gap was seen, events are buffered until a new snapshot is handed over with set_snapshot
+                      (from any thread), it is loaded and the buffered events replayed with the next event.
+
+    Only the socket thread changes the book, a diff only touches the levels it changes (a binary search per
+    level) under the book lock. Readers get a read only snapshot {'version', 'lastUpdateId', 'synced', 'a', 'b'}
+    (levels as best first (price, quantity) tuples), it is built under the lock the first time a version of the
+    book is read and shared by every reader of that version, the snapshot a reader holds never changes under it.
+    Books that change faster than they are read only pay for the snapshots that are used.
+
+    The snapshot also carries the book analytics:
+        mid, microprice, imbalance  - of the best levels (None while a side is empty).
+        total, total_quote          - {'a', 'b'} quantity and quote amount of each side, kept up to date by the
+                                      level changes of every diff (whole book depth in O(1)).
+        depth                       - {'a', 'b'} best first running quantity totals (depth to N levels in O(1)).
+        depth_quote                 - {'a', 'b'} best first running quote totals (fill prices in O(log n)).
+    The running totals per level are summed when a snapshot is first asked for them.
+    '''
+    def __init__(self, depth_limit):
+        self.depth_limit        = depth_limit
+        self.sides              = {'a':Book_Side(False), 'b':Book_Side(True)}
+        self.last_update_id     = None
+        self.state              = 'RESYNC'
+        self.buffer             = []
+        self.pending_snapshot   = None
+        self.version            = 0
+        self.snapshot           = None
+        self.lock               = threading.Lock()
+        self._publish()
+
+
+    def reset(self, depth_data):
+        '''
+        Load a REST snapshot {'lastUpdateId', 'a', 'b'} (from the thread that applies the diffs).
+        '''
+        with self.lock:
+            self._load_snapshot(depth_data)
+            self._publish()
+
+
+    def set_snapshot(self, depth_data):
+        '''
+        Hand over a REST snapshot from another thread, it is loaded with the next diff event.
+        '''
+        self.pending_snapshot = depth_data
+
+
+    def apply_diff(self, depth_data):
+        '''
+        Apply a diff depth event {'U', 'u', 'a', 'b'}, returns False when a gap was found and a new snapshot is needed.
+        '''
+        events = [depth_data]
+        with self.lock:
+            if self.pending_snapshot != None:
+                snapshot, self.pending_snapshot = self.pending_snapshot, None
+                self._load_snapshot(snapshot)
+                events = self.buffer + events
+                self.buffer = []
+
+            in_sync = True
+            for event in events:
+                in_sync = self._apply_event(event) and in_sync
+
+            self._publish()
+        return(in_sync)
+
+
+    def get_snapshot(self):
+        ''' The current read only snapshot {'version', 'lastUpdateId', 'synced', 'a', 'b'} with the analytics. '''
+        snapshot = self.snapshot
+        if snapshot == None:
+            with self.lock:
+                if self.snapshot == None:
+                    self.snapshot = self._build_snapshot()
+                snapshot = self.snapshot
+        return(snapshot)
+
+
+    def get_best_prices(self):
+        ''' {'a':(price, quantity), 'b':(price, quantity)} of the best levels (None for an empty side). '''
+        snapshot = self.get_snapshot()
+        return({side:(snapshot[side][0] if snapshot[side] else None) for side in ('a', 'b')})
+
+
+    def get_levels(self, limit=None):
+        ''' {'a':((price, quantity), ...), 'b':((price, quantity), ...)} best first. '''
+        snapshot = self.get_snapshot()
+        return({side:snapshot[side][:limit] for side in ('a', 'b')})
+
+
+    def get_depth(self, levels=None):
+        return(get_depth(self.get_snapshot(), levels))
+
+
+    def get_imbalance(self, levels=1):
+        return(get_imbalance(self.get_snapshot(), levels))
+
+
+    def get_fill_price(self, side, quote_amount):
+        return(get_fill_price(self.get_snapshot(), side, quote_amount))
+
+
+    def _load_snapshot(self, depth_data):
+        for side in self.sides:
+            self.sides[side].reset(depth_data[side].tolist(), depth_data['lastUpdateId'])
+            self.sides[side].trim(self.depth_limit)
+        self.last_update_id = depth_data['lastUpdateId']
+        self.state = 'SNAPSHOT'
+
+
+    def _apply_event(self, event):
+        ## False when the event does not follow on from the book (the book waits for a new snapshot).
+        if self.state == 'RESYNC':
+            self.buffer.append(event)
+            if len(self.buffer) > MAX_BUFFERED_EVENTS:
+                del self.buffer[0]
+            return(True)
+
+        ## Events the book already holds are dropped.
+        if event['u'] <= self.last_update_id:
+            return(True)
+
+        if (self.state == 'SNAPSHOT' and event['U'] > self.last_update_id + 1) or (self.state == 'LIVE' and event['U'] != self.last_update_id + 1):
+            self.state = 'RESYNC'
+            self.buffer = [event]
+            return(False)
+
+        self.state = 'LIVE'
+        for side in self.sides:
+            book_side = self.sides[side]
+            for price, quantity in event[side].tolist():
+                book_side.update(price, quantity, event['u'])
+            book_side.trim(self.depth_limit)
+        self.last_update_id = event['u']
+        return(True)
+
+
+    def _publish(self):
+        ## Called under the lock after every change, the snapshot of the new version is built when it is first read.
+        self.version += 1
+        self.snapshot = None
+
+
+    def _build_snapshot(self):
+        ## Called under the lock, the snapshot is built in full before it is handed out.
+        levels = {side:self.sides[side].get_levels() for side in self.sides}
+
+        mid = microprice = imbalance = None
+        if levels['a'] and levels['b']:
+            (ask_price, ask_quantity), (bid_price, bid_quantity) = levels['a'][0], levels['b'][0]
+            mid = (ask_price + bid_price) / 2
+            ## The microprice leans towards the side with less quantity (the price more likely to trade next).
+            microprice = (ask_price*bid_quantity + bid_price*ask_quantity) / (ask_quantity + bid_quantity)
+            imbalance = (bid_quantity - ask_quantity) / (bid_quantity + ask_quantity)
+
+        return(Book_Snapshot({
+            'version':self.version,
+            'lastUpdateId':self.last_update_id,
+            'synced':self.state == 'LIVE',
+            'a':levels['a'],
+            'b':levels['b'],
+            'mid':mid,
+            'microprice':microprice,
+            'imbalance':imbalance,
+            'total':MappingProxyType({side:self.sides[side].total for side in self.sides}),
+            'total_quote':MappingProxyType({side:self.sides[side].total_quote for side in self.sides})}))
+
+
+class Book_Snapshot(Mapping):
+    '''
+    Read only snapshot of an Order_Book. The best first running totals of each side ('depth' quantities and
+    'depth_quote' quote amounts, see RUNNING_TOTALS) are only summed from its levels the first time they are read.
+    '''
+    def __init__(self, fields):
+        self.fields         = fields
+        self.running_totals = {}
+
+    def __getitem__(self, key):
+        if key in RUNNING_TOTALS:
+            if not key in self.running_totals:
+                amount = RUNNING_TOTALS[key]
+                self.running_totals.update({key:MappingProxyType({side:tuple(accumulate([amount(price, quantity) for price, quantity in self.fields[side]])) for side in ('a', 'b')})})
+            return(self.running_totals[key])
+        return(self.fields[key])
+
+    def __iter__(self):
+        return(iter(list(self.fields) + list(RUNNING_TOTALS)))
+
+    def __len__(self):
+        return(len(self.fields) + len(RUNNING_TOTALS))
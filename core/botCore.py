@@ -7,17 +7,29 @@ import os.path
 import hashlib
 import logging
 import threading
+import numpy as np
 from decimal import Decimal
+from collections.abc import Mapping
 from flask_socketio import SocketIO
 from flask import Flask, render_template, url_for, request
 
 from binance_api import api_master_rest_caller
 from binance_api import api_master_socket_caller
 
+import technical_indicators as TI
+import indicator_graph as IG
+import trader_configuration as TC
+
 from . import trader
 
 MULTI_DEPTH_INDICATORS = ['ema', 'sma', 'rma', 'order']
 
+## Yeniden örnekleme açıkken abone olunan tek mum akışının aralığı.
+RESAMPLE_BASE_INTERVAL = '1m'
+
+## Web arayüzü için göstergeler okunurken tüccar yeni bir muma geçerse yapılacak okuma denemesi.
+INDICATOR_READ_ATTEMPTS = 3
+
 # Globalleri başlat.
 ## Şişe uygulamasını/soketini kurun
 APP         = Flask(__name__)
@@ -117,7 +129,7 @@ def get_trader_charting():
     indicator_data = core_object.get_trader_indicators(current_trader.print_pair)
     short_indicator_data = shorten_indicators(indicator_data, candle_data[-1][0])
 
-    return(json.dumps({'call':True, 'data':{'market':market, 'indicators':short_indicator_data, 'candles':candle_data}}))
+    return(json.dumps({'call':True, 'data':{'market':market, 'indicators':indicators_to_json(short_indicator_data), 'candles':candle_data}}))
 
 
 @APP.route('/rest-api/v1/get_trader_indicators', methods=['GET'])
@@ -136,7 +148,7 @@ def get_trader_indicators():
 
     indicator_data = core_object.get_trader_indicators(current_trader.print_pair)
 
-    return(json.dumps({'call':True, 'data':{'market':market, 'indicators':indicator_data}}))
+    return(json.dumps({'call':True, 'data':{'market':market, 'indicators':indicators_to_json(indicator_data)}}))
 
 
 @APP.route('/rest-api/v1/get_trader_candles', methods=['GET'])
@@ -158,6 +170,12 @@ def get_trader_candles():
     return(json.dumps({'call':True, 'data':{'market':market, 'candles':candle_data}}))
 
 
+@APP.route('/rest-api/v1/get_memory_usage', methods=['GET'])
+def get_memory_usage():
+    # Piyasa başına bellek kullanımını geçmek için uç nokta.
+    return(json.dumps({'call':True, 'data':core_object.get_memory_usage()}))
+
+
 @APP.route('/rest-api/v1/test', methods=['GET'])
 def test_rest_call():
     # API uç nokta testi
@@ -171,13 +189,50 @@ def shorten_indicators(indicators, end_time):
         if ind in MULTI_DEPTH_INDICATORS:
             base_indicators.update({ind:{}})
             for sub_ind in indicators[ind]:
-                base_indicators[ind].update({sub_ind:[ [val[0] if ind != 'order' else val[0]*1000,val[1]] for val in indicators[ind][sub_ind] if (val[0] if ind != 'order' else val[0]*1000) > end_time ]})
+                base_indicators[ind].update({sub_ind:_shorten_indicator(indicators[ind][sub_ind], end_time, 1000 if ind == 'order' else 1)})
         else:
-            base_indicators.update({ind:[ [val[0],val[1]] for val in indicators[ind] if val[0] > end_time]})
+            base_indicators.update({ind:_shorten_indicator(indicators[ind], end_time)})
 
     return(base_indicators)
 
 
+def _shorten_indicator(values, end_time, time_scale=1):
+    if isinstance(values, dict):
+        ## Sütunlu göstergeler yeniden eskiye sıralıdır, bitiş zamanından yeni olanlar baştaki bir dilimdir.
+        keep = len(values['time']) - np.searchsorted(values['time'][::-1], end_time, side='right')
+        return({key:values[key][:keep] for key in values})
+
+    return([ [val[0]*time_scale, val[1]] for val in values if (val[0]*time_scale) > end_time ])
+
+
+def _read_indicators(indicators):
+    ## (Tembel) gösterge eşlemelerinin tüm çıktıları düz sözlüklere okunur.
+    if isinstance(indicators, Mapping) and not 'time' in indicators:
+        return({key:_read_indicators(indicators[key]) for key in indicators})
+    return(indicators)
+
+
+def indicators_to_json(indicators):
+    # Sütunlu göstergeler yalnızca JSON sınırında grafiklerin beklediği [zaman, değer] listelerine çevrilir.
+    json_indicators = {}
+
+    for ind in indicators:
+        if ind in MULTI_DEPTH_INDICATORS:
+            json_indicators.update({ind:{}})
+            for sub_ind in indicators[ind]:
+                json_indicators[ind].update({sub_ind:_indicator_to_json(indicators[ind][sub_ind])})
+        else:
+            json_indicators.update({ind:_indicator_to_json(indicators[ind])})
+
+    return(json_indicators)
+
+
+def _indicator_to_json(values):
+    if not isinstance(values, dict):
+        return(values)
+    return(IG.to_rows(values))
+
+
 def api_error_check(data):
     ## Belirtilen bot olup olmadığını kontrol edin.
     current_trader = None
@@ -241,6 +296,20 @@ class BotCore():
         self.max_candles        = settings['max_candles']
         self.max_depth          = settings['max_depth']
 
+        ## Göstergelerin tüm piyasalar için toplu hesaplanıp hesaplanmayacağı.
+        self.batch_indicators   = settings['batch_indicators']
+
+        ## Mumların tek bir 1m akışından canlı olarak yeniden örneklenmesi.
+        self.resample_candles   = settings['resample_candles']
+        self.resample_intervals = settings['resample_intervals']
+
+        ## Mumların ve gösterge serilerinin float32/int64 dizilerde tutulması.
+        self.compact_mode       = settings['compact_mode']
+        TI.set_compact_storage(self.compact_mode)
+
+        ## En iyi fiyatlar bookTicker akışından alınır, tam derinlik yalnızca strateji gerektirirse tutulur.
+        self.top_of_book        = settings['top_of_book']
+
         ## Temel teklif çiftini al (Bu, birden çok farklı çiftin çakışmasını önler.)
         pair_one = settings['trading_markets'][0]
 
@@ -320,22 +389,38 @@ class BotCore():
 
         valid_tading_markets = [market for market in found_markets if market not in not_supported]
 
+        ## Yeniden örneklemede tüccar aralığı (ve ek aralıklar) tek bir 1m akışından oluşturulur.
+        stream_interval = self.candle_Interval
+        resample_intervals = list(self.resample_intervals)
+        if self.resample_candles and self.candle_Interval != RESAMPLE_BASE_INTERVAL:
+            stream_interval = RESAMPLE_BASE_INTERVAL
+            resample_intervals.append(self.candle_Interval)
+            self.socket_api.default_candle_interval = self.candle_Interval
+        self.socket_api.set_resampled_intervals(resample_intervals)
+
         ## setup the binance socket.
         for market in valid_tading_markets:
-            self.socket_api.set_candle_stream(symbol=market, interval=self.candle_Interval)
-            self.socket_api.set_manual_depth_stream(symbol=market, update_speed='1000ms')
+            self.socket_api.set_candle_stream(symbol=market, interval=stream_interval)
+            if self.top_of_book:
+                self.socket_api.set_bookTicker_stream(symbol=market)
+            if not self.top_of_book or TC.DEPTH_REQUIRED:
+                self.socket_api.set_manual_depth_stream(symbol=market, update_speed='1000ms')
 
         if self.run_type == 'REAL':
             self.socket_api.set_userDataStream(self.rest_api, self.market_type)
 
         self.socket_api.BASE_CANDLE_LIMIT = self.max_candles
         self.socket_api.BASE_DEPTH_LIMIT = self.max_depth
+        self.socket_api.candle_cache_dir = self.cache_dir
+        self.socket_api.compact_candles = self.compact_mode
 
         self.socket_api.build_query()
         self.socket_api.set_live_and_historic_combo(self.rest_api)
 
         self.socket_api.start()
 
+        logging.info('[BotCore] Piyasa başına bellek kullanımı (bayt): {0}'.format(self.get_memory_usage()))
+
         # Cüzdanları yükleyin.
         if self.run_type == 'REAL':
             user_info = self.rest_api.get_account(self.market_type)
@@ -393,6 +478,15 @@ class BotCore():
 
             trader_.start(self.base_currency, wallet_pair)
 
+        ## Gösterge grafiğinde birden fazla gösterge tarafından paylaşılan alt serileri raporla.
+        indicator_graph = TC.build_indicator_graph()
+        logging.info('[BotCore] Gösterge grafiği: {0} seri, paylaşılan: {1}'.format(len(indicator_graph.nodes), indicator_graph.get_dedup_report()))
+
+        if self.batch_indicators:
+            logging.debug('[BotCore] Toplu gösterge yöneticisi başlatılıyor.')
+            IM_thread = threading.Thread(target=self._indicator_manager)
+            IM_thread.start()
+
         logging.debug('[BotCore] Tüccar yöneticisini başlatılıyor')
         TM_thread = threading.Thread(target=self._trader_manager)
         TM_thread.start()
@@ -420,6 +514,31 @@ class BotCore():
             pass
 
 
+    def _indicator_manager(self):
+        ''' Toplu modda aynı aralığı paylaşan piyasaların göstergeleri tek bir 2 boyutlu geçişte hesaplanır ve her tüccara kendi dilimi verilir. '''
+        while self.coreState != 'STOP':
+            try:
+                ## Mumları henüz yüklenmemiş piyasalar atlanır, bu tüccarlar göstergelerini kendileri hesaplar.
+                live_candles = self.socket_api.get_live_candles()
+                candles_by_symbol = {}
+                for trader_ in self.trader_objects:
+                    sock_symbol = str(trader_.base_asset)+str(trader_.quote_asset)
+                    if sock_symbol in live_candles:
+                        candles_by_symbol.update({sock_symbol:live_candles[sock_symbol]})
+
+                batch_indicators = TC.technical_indicators_batch(candles_by_symbol)
+
+                for trader_ in self.trader_objects:
+                    sock_symbol = str(trader_.base_asset)+str(trader_.quote_asset)
+                    if sock_symbol in batch_indicators:
+                        trader_.shared_indicators = batch_indicators[sock_symbol]
+            except Exception as error:
+                ## Bir hata toplu iş parçacığını durdurmaz, bir sonraki geçişte yeniden denenir.
+                logging.warning('[BotCore] Toplu gösterge hesaplama hatası: {0}.'.format(error))
+
+            time.sleep(trader.TRADER_SLEEP)
+
+
     def _bnb_manager(self):
         ''' Bu, BNB bakiyesini yönetecek ve hesapta düşük BNB varsa güncellenecektir. '''
         last_wallet_update_time = 0
@@ -478,6 +597,11 @@ class BotCore():
                         logging.info('[BotCore] Soket yeniden başlatılmaya çalışılıyor.')
                         self.socket_api.start()
 
+                        ## Kesinti sırasında kaçırılan mumlar REST üzerinden tamamlanır.
+                        self.socket_api.backfill_candles()
+                        logging.info('[BotCore] Mum boşluğu sayaçları: {0}'.format(self.socket_api.get_candle_gap_stats()))
+                        logging.info('[BotCore] Derinlik yeniden eşitleme sayaçları: {0}'.format(self.socket_api.get_depth_sync_stats()))
+
 
     def get_trader_data(self):
         ''' Bu, aktif tüccarların her biri için veri döndürmek için çağrılabilir. '''
@@ -489,7 +613,16 @@ class BotCore():
         ''' Bu, tüccarlar tarafından kullanılan göstergeleri döndürmek için çağrılabilir (Web kullanıcı arayüzü etkinliğini görüntülemek için kullanılacaktır.) '''
         for _trader in self.trader_objects:
             if _trader.print_pair == market:
-                indicator_data = _trader.indicators
+                ## Tüccarın (tembel olabilecek) göstergeleri değiştirilmez, emirler bir kopyaya eklenir.
+                ## Tembel göstergeler burada değerlendirilir, grafik okuma sırasında yeni bir muma geçerse (eski göstergeler
+                ## RuntimeError verir) tüccarın yeni göstergeleri okunur.
+                for attempt in range(INDICATOR_READ_ATTEMPTS):
+                    try:
+                        indicator_data = _read_indicators(_trader.indicators)
+                        break
+                    except RuntimeError:
+                        if attempt == INDICATOR_READ_ATTEMPTS-1:
+                            raise
                 indicator_data.update({'order':{'buy':[], 'sell':[]}})
                 indicator_data['order']['buy'] = [ [order[0],order[1]] for order in _trader.trade_recorder if order[4] == 'BUY']
                 indicator_data['order']['sell'] = [ [order[0],order[1]] for order in _trader.trade_recorder if order[4] == 'SELL']
@@ -501,7 +634,19 @@ class BotCore():
         for _trader in self.trader_objects:
             if _trader.print_pair == market:
                 sock_symbol = str(_trader.base_asset)+str(_trader.quote_asset)
-                return(self.socket_api.get_live_candles(sock_symbol))
+                return(self.socket_api.get_live_candles(sock_symbol, as_list=True))
+
+
+    def get_memory_usage(self):
+        ''' Bu, piyasa başına mumların ve göstergelerin kullandığı belleği (bayt) döndürmek için çağrılabilir (sunucu boyutlandırması için). '''
+        memory_usage = self.socket_api.get_memory_usage()
+        for symbol, indicator_bytes in TC.indicator_cache.get_memory_usage().items():
+            memory_usage.setdefault(symbol, {'candles':0}).update({'indicators':indicator_bytes})
+
+        for symbol in memory_usage:
+            memory_usage[symbol].setdefault('indicators', 0)
+            memory_usage[symbol].update({'total':memory_usage[symbol]['candles'] + memory_usage[symbol]['indicators']})
+        return(memory_usage)
 
 
 def start(settings, logs_dir, cache_dir):
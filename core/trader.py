@@ -6,6 +6,8 @@ import time
 import logging
 import datetime
 import threading
+import numpy as np
+import indicator_graph as IG
 import trader_configuration as TC
 
 MULTI_DEPTH_INDICATORS = ['ema', 'sma', 'rma']
@@ -18,9 +20,17 @@ COMMISION_FEE = 0.00075
 BASE_TRADE_PRICE_LAYOUT = {
     'lastPrice':0,           # Piyasa için görülen son fiyat.
     'askPrice':0,            # Piyasa için görülen son satış fiyatı.
-    'bidPrice':0             # Piyasa için görülen son teklif fiyatı.
+    'bidPrice':0,            # Piyasa için görülen son teklif fiyatı.
+    'midPrice':None,         # En iyi satış ve teklif fiyatlarının ortası.
+    'microPrice':None,       # En iyi seviyelerin miktarlarıyla ağırlıklandırılmış orta fiyat.
+    'bookImbalance':None,    # En iyi seviyelerin teklif/satış miktar dengesizliği (-1 ile 1 arası).
+    'buyFillPrice':None,     # İşlem para birimi kadar bir piyasa alışının ortalama dolum fiyatı (kayma için).
+    'sellFillPrice':None     # İşlem para birimi kadar bir piyasa satışının ortalama dolum fiyatı (kayma için).
 }
 
+## Emir defteri analizlerinden gelen piyasa fiyatı anahtarları.
+BOOK_ANALYTICS_KEYS = ['midPrice', 'microPrice', 'bookImbalance', 'buyFillPrice', 'sellFillPrice']
+
 # Base layout for trader state.
 BASE_STATE_LAYOUT = {
     'base_currency':0.0,     # Referans olarak kullanılan temel mac değeri.
@@ -80,12 +90,14 @@ class BaseTrader(object):
             ### Canlı piyasa verileri ticareti için kurulum soketi.
             self.candle_enpoint = socket_api.get_live_candles
             self.depth_endpoint = socket_api.get_live_depths
+            self.prices_endpoint = socket_api.get_best_prices
             self.socket_api = socket_api
         else:
             ### Geçmiş ticaret için kurulum veri arayüzü.
             self.data_if = data_if
             self.candle_enpoint = data_if.get_candle_data
             self.depth_endpoint = data_if.get_depth_data
+            self.prices_endpoint = self._get_depth_best_prices
 
         ## İşlem gören piyasa tarafından tüccar için varsayılan yolu ayarlayın.
         self.orders_log_path = 'logs/order_{0}_log.txt'.format(symbol)
@@ -94,6 +106,7 @@ class BaseTrader(object):
         self.wallet_pair = None
         self.custom_conditional_data = {}
         self.indicators = {}
+        self.shared_indicators = None
         self.market_activity = {}
         self.trade_recorder = []
         self.state_data = {}
@@ -142,7 +155,8 @@ class BaseTrader(object):
 
         if self.socket_api != None:
             while True:
-                if self.socket_api.get_live_candles()[sock_symbol] and ('a' in self.socket_api.get_live_depths()[sock_symbol]):
+                best_prices = self.socket_api.get_best_prices(sock_symbol)
+                if len(self.socket_api.get_live_candles(sock_symbol)) > 0 and best_prices != None and best_prices['a'] and best_prices['b']:
                     break
 
         self.state_data['runtime_state'] = 'SETUP'
@@ -190,8 +204,13 @@ class BaseTrader(object):
         while self.state_data['runtime_state'] != 'STOP':
             # Tüccar için gerekli verileri çekin.
             candles = self.candle_enpoint(sock_symbol)
-            books_data = self.depth_endpoint(sock_symbol)
-            self.indicators = TC.technical_indicators(candles)
+            best_prices = self.prices_endpoint(sock_symbol)
+            book_synced = self._is_book_synced(sock_symbol)
+            if self.shared_indicators != None:
+                ## Toplu modda göstergeler çekirdek tarafından tüm piyasalar için birlikte hesaplanır.
+                self.indicators = self.shared_indicators
+            else:
+                self.indicators = TC.technical_indicators(candles, symbol=sock_symbol)
             indicators = self.strip_timestamps(self.indicators)
 
             logging.debug('[BaseTrader] Tüccar verileri toplandı. [{0}]'.format(self.print_pair))
@@ -208,12 +227,13 @@ class BaseTrader(object):
                     if last_wallet_update_time != socket_buffer_global['outboundAccountPosition']['E']:
                         self.wallet_pair, last_wallet_update_time = self.update_wallets(socket_buffer_global)
             
-            # Market fiyatlarını güncel verilerle güncelleyin
-            if books_data != None:
+            # Market fiyatlarını güncel verilerle güncelleyin (emir defteri yeniden eşitlenirken son fiyatlar korunur).
+            if best_prices != None and book_synced:
                 self.market_prices = {
                     'lastPrice':candles[0][4],
-                    'askPrice':books_data['a'][0][0],
-                    'bidPrice':books_data['b'][0][0]}
+                    'askPrice':best_prices['a'][0],
+                    'bidPrice':best_prices['b'][0]}
+                self.market_prices.update(self._get_book_analytics(sock_symbol))
 
             # Sipariş vermek için yeterli kripto olup olmadığını kontrol edin.
             if self.state_data['runtime_state'] == 'PAUSE_INSUFBALANCE':
@@ -243,8 +263,8 @@ class BaseTrader(object):
                         indicators, 
                         self.configuration['symbol'])
 
-                    ## Siparişlerin yerleşimini/koşul kontrolünü yönetmek için.
-                    if cp['can_order'] and self.state_data['runtime_state'] == 'RUN' and cp['market_status'] == 'TRADING':
+                    ## Siparişlerin yerleşimini/koşul kontrolünü yönetmek için (derinliğe dayalı kontroller eşitlenmiş bir emir defteri bekler).
+                    if book_synced and cp['can_order'] and self.state_data['runtime_state'] == 'RUN' and cp['market_status'] == 'TRADING':
                         if cp['order_type'] == 'COMPLETE':
                             cp['order_type'] = 'WAIT'
 
@@ -451,9 +471,9 @@ class BaseTrader(object):
                 #### Kullanılacak fiyatları biçimlendirin.
                 if 'price' in new_order:
                     if 'price' in new_order:
-                        new_order['price'] = '{0:.{1}f}'.format(float(new_order['price']), self.rules['TICK_SIZE'])
+                        new_order['price'] = format_order_price(new_order['price'], self.rules['TICK_SIZE'])
                     if 'stopPrice' in new_order:
-                        new_order['stopPrice'] = '{0:.{1}f}'.format(float(new_order['stopPrice']), self.rules['TICK_SIZE'])
+                        new_order['stopPrice'] = format_order_price(new_order['stopPrice'], self.rules['TICK_SIZE'])
 
                     if float(new_order['price']) != cp['price']:
                         order = new_order
@@ -642,19 +662,67 @@ class BaseTrader(object):
 
     def strip_timestamps(self, indicators):
 
+        if isinstance(indicators, IG.Lazy_Indicators):
+            ## Tembel göstergeler tembel kalır, zaman sütunu yalnızca okunan göstergelerden çıkarılır.
+            return(indicators.map_values(self._strip_timestamp))
+
         base_indicators = {}
 
         for ind in indicators:
             if ind in MULTI_DEPTH_INDICATORS:
                 base_indicators.update({ind:{}})
                 for sub_ind in indicators[ind]:
-                    base_indicators[ind].update({sub_ind:[ val[1] for val in indicators[ind][sub_ind] ]})
+                    base_indicators[ind].update({sub_ind:self._strip_timestamp(indicators[ind][sub_ind])})
             else:
-                base_indicators.update({ind:[ val[1] for val in indicators[ind] ]})
+                base_indicators.update({ind:self._strip_timestamp(indicators[ind])})
 
         return(base_indicators)
 
 
+    def _strip_timestamp(self, values):
+        ## Sütunlu göstergelerde zaman kendi sütunudur, yalnızca o sütun bırakılır (kopyalama yok).
+        if isinstance(values, dict):
+            if 'value' in values:
+                return(values['value'])
+            return({key:values[key] for key in values if key != 'time'})
+
+        return([ val[1] for val in values ])
+
+
+    def _get_depth_best_prices(self, symbol):
+        ## Geçmiş veri arayüzünde en iyi fiyatlar derinlik verisinin ilk seviyelerinden alınır.
+        books_data = self.depth_endpoint(symbol)
+        if books_data == None:
+            return(None)
+        return({'a':books_data['a'][0], 'b':books_data['b'][0]})
+
+
+    def _is_book_synced(self, symbol):
+        ## Yalnızca soketin yerel emir defteri eşitliğini yitirebilir, diğer fiyat kaynakları her zaman eşitlenmiş sayılır.
+        if self.socket_api == None or not symbol in self.socket_api.book_data:
+            return(True)
+        return(self.socket_api.get_live_depths(symbol)['synced'])
+
+
+    def _get_book_analytics(self, symbol):
+        ## Analizler soket tarafından derinlik güncellemeleriyle birlikte tutulur, emir defteri olmadan boş kalırlar.
+        book_analytics = {key:None for key in BOOK_ANALYTICS_KEYS}
+        if self.socket_api == None:
+            return(book_analytics)
+
+        analytics = self.socket_api.get_book_analytics(symbol, quote_amount=float(self.state_data['base_currency']))
+        if analytics == None:
+            return(book_analytics)
+
+        book_analytics.update({
+            'midPrice':analytics['mid'],
+            'microPrice':analytics['microprice'],
+            'bookImbalance':analytics['imbalance'],
+            'buyFillPrice':analytics['fill_prices']['BUY'],
+            'sellFillPrice':analytics['fill_prices']['SELL']})
+        return(book_analytics)
+
+
     def update_wallets(self, socket_buffer_global):
         ''' M-cüzdan verilerini soket aracılığıyla toplanan verilerle güncelleyin '''
         last_wallet_update_time = socket_buffer_global['outboundAccountPosition']['E']
@@ -679,4 +747,19 @@ class BaseTrader(object):
             wallet_pair.update({self.quote_asset:[0.0, 0.0]})
 
         logging.info('[BaseTrader] Yeni hesap verileri çekildi, cüzdanlar güncellendi. [{0}]'.format(self.print_pair))
-        return(wallet_pair, last_wallet_update_time)
\ No newline at end of file
+        return(wallet_pair, last_wallet_update_time)
+
+
+def format_order_price(price, tick_size):
+    '''
+    Fiyatı önceki float biçimlendirmesiyle TICK_SIZE basamağa biçimlendirin, yuvarlama davranışı aynı kalır.
+    Kompakt modda float32 değerler (ya da float64'e genişletilmiş halleri) önce float32'nin en kısa ondalığına çevrilir,
+    böylece fiyat borsanın gönderdiği ondalıkla aynı şekilde yuvarlanır.
+    '''
+    price = float(price)
+    compact_price = np.float32(price)
+
+    if np.isfinite(compact_price) and float(compact_price) == price:
+        price = float(str(compact_price))
+
+    return('{0:.{1}f}'.format(price, tick_size))
\ No newline at end of file
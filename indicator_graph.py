@@ -0,0 +1,540 @@
+import threading
+import numpy as np
+from collections.abc import Mapping
+import technical_indicators as TI
+
+'''
+Declarative indicator graph.
+
+Strategies declare the indicators they need as (type, source, parameters), for example:
+    {'ema':{'ema12':('EMA', 'close', {'maPeriod':12})}, 'macd':('zeroLagMACD', 'close', {})}
+
+Every declaration is broken down into named series (EMA(close,12), EMA(EMA(close,12),12), ...),
+a series that is declared more than once is only built once and shared between its consumers.
+
+# compute / compute_batch
+Full history evaluation (a 2-D batch of markets is computed in one pass).
+
+# update / revise
+Streaming evaluation, the graph is seeded once and then moved per candle like the Stream_* objects.
+
+# result_format
+Outputs are rows by default like the technical_indicators functions with map_time, [[time, value], ...] or
+[[time, {'macd', 'signal', 'hist'}], ...] newest first. With 'columnar' they are parallel (zero copy) arrays
+{'time', 'value'} or {'time', 'macd', 'signal', 'hist'}.
+
+# lazy / tail
+With lazy outputs a series (and only the series it depends on) is evaluated the first time a
+strategy reads it, evaluation and the streaming calls hold the graph lock so outputs can be read from
+any thread. A lazy mapping of streaming outputs belongs to the candle it was made for, reading an output
+from it once the graph moved on to a newer candle raises a RuntimeError (get_indicators gives the new ones). With tail only the newest 'tail' points are returned, full history evaluation
+then only uses the newest candles needed to warm the series up (an approximation of the full
+history values, streaming evaluation is exact either way).
+'''
+CANDLE_COLUMNS = {'open':1, 'high':2, 'low':3, 'close':4, 'volume':5}
+
+## Warm up used in tail mode, as a multiple of the lookback of the longest series.
+TAIL_WARMUP = 4
+
+
+class Source_Node:
+
+    def __init__(self, name, column):
+        self.name       = name
+        self.column     = column
+        self.inputs     = []
+        self.lookback   = 0
+        self.values     = None
+
+    def compute(self, candle_columns, results):
+        return(candle_columns[self.column])
+
+    def seed(self, candle_columns, time_values):
+        self.values = TI.Series_Buffer(len(time_values))
+        self.values.reset(candle_columns[self.column][::-1])
+
+    def revise(self, candle):
+        self.values.set_last(candle[self.column])
+
+    def advance(self, candle):
+        self.values.append(candle[self.column])
+
+    def view(self):
+        return(self.values.view())
+
+
+class EMA_Node:
+
+    def __init__(self, name, source, maPeriod, prec=8):
+        self.name       = name
+        self.source     = source
+        self.maPeriod   = maPeriod
+        self.prec       = prec
+        self.inputs     = [source]
+        self.lookback   = source.lookback + maPeriod
+        self.stream     = TI.Stream_EMA(maPeriod, prec)
+
+    def compute(self, candle_columns, results):
+        return(TI.get_EMA(results[self.source.name], self.maPeriod, prec=self.prec, result_format='numpy'))
+
+    def seed(self, candle_columns, time_values):
+        self.stream.seed(self.source.view(), time_values)
+
+    def revise(self, candle):
+        self.stream.revise(self.source.view()[0])
+
+    def advance(self, candle):
+        self.stream.advance(self.source.view()[0], candle[0])
+
+    def view(self):
+        return(self.stream.values.view())
+
+
+class Stream_Node:
+    ''' Series backed by a technical_indicators batch function and its Stream_* object (RMA, RSI, ATR, STD, BB). '''
+
+    def __init__(self, name, sources, lookback, get_batch, stream):
+        self.name       = name
+        self.sources    = sources
+        self.get_batch  = get_batch
+        self.stream     = stream
+        self.inputs     = sources
+        self.lookback   = max([node.lookback for node in sources]) + lookback
+
+    def compute(self, candle_columns, results):
+        return(self.get_batch(*[results[node.name] for node in self.sources]))
+
+    def seed(self, candle_columns, time_values):
+        views = [node.view() for node in self.sources]
+        if len(views) == 1:
+            self.stream.seed(views[0], time_values)
+        else:
+            length = min([len(values) for values in views])
+            self.stream.seed(np.stack([values[:length] for values in views], axis=-1), time_values)
+
+    def revise(self, candle):
+        self.stream.revise(self._newest_price())
+
+    def advance(self, candle):
+        self.stream.advance(self._newest_price(), candle[0])
+
+    def view(self):
+        return(self.stream.values.view())
+
+    def _newest_price(self):
+        if len(self.sources) == 1:
+            return(self.sources[0].view()[0])
+        return(tuple([node.view()[0] for node in self.sources]))
+
+
+class Column_Node:
+    ''' One line of a multi line Stream_Node (the bands of BB), kept up to date by its parent. '''
+
+    def __init__(self, name, parent, key, buffer_name):
+        self.name           = name
+        self.parent         = parent
+        self.key            = key
+        self.buffer_name    = buffer_name
+        self.inputs         = [parent]
+        self.lookback       = parent.lookback
+
+    def compute(self, candle_columns, results):
+        return(results[self.parent.name][self.key])
+
+    def seed(self, candle_columns, time_values):
+        pass
+
+    def revise(self, candle):
+        pass
+
+    def advance(self, candle):
+        pass
+
+    def view(self):
+        return(getattr(self.parent.stream, self.buffer_name).view())
+
+
+class Linear_Node:
+    ''' Weighted sum of other series (DEMA, MACD line, histogram), trimmed to the shortest input. '''
+
+    def __init__(self, name, terms, prec=None):
+        self.name       = name
+        self.terms      = terms
+        self.prec       = prec
+        self.inputs     = [node for weight, node in terms]
+        self.lookback   = max([node.lookback for node in self.inputs])
+        self.values     = None
+
+    def compute(self, candle_columns, results):
+        length = min([results[node.name].shape[-1] for weight, node in self.terms])
+        values = sum([weight*results[node.name][..., :length] for weight, node in self.terms])
+        return(values if self.prec == None else values.round(self.prec))
+
+    def seed(self, candle_columns, time_values):
+        length = min([len(node.view()) for weight, node in self.terms])
+        values = sum([weight*node.view()[:length] for weight, node in self.terms])
+        if self.prec != None:
+            values = values.round(self.prec)
+
+        self.values = TI.Series_Buffer(length)
+        self.values.reset(values[::-1])
+
+    def revise(self, candle):
+        self.values.set_last(self._newest_value())
+
+    def advance(self, candle):
+        self.values.append(self._newest_value())
+
+    def view(self):
+        return(self.values.view())
+
+    def _newest_value(self):
+        value = sum([weight*node.view()[0] for weight, node in self.terms])
+        return(value if self.prec == None else round(value, self.prec))
+
+
+class Indicator_Graph:
+
+    def __init__(self, indicators=None, prec=8):
+        self.prec       = prec
+        self.nodes      = {}
+        self.requests   = {}
+        self.outputs    = {}
+        self.times      = None
+        self.last_time  = None
+        self.pending    = None
+        self.revised    = set()
+        self.lock       = threading.RLock()
+
+        ## Moved on by seed/advance, lazy outputs check it so series values never end up under older times.
+        self.version    = 0
+
+        if indicators:
+            self.outputs = self.declare(indicators)
+
+    ## ------------------ [DECLARATION] ------------------ ##
+    def declare(self, indicators):
+        ''' Turn a (nested) declaration into output nodes, {name:(type, source, params)}. '''
+        outputs = {}
+
+        for name in indicators:
+            if isinstance(indicators[name], dict):
+                outputs.update({name:self.declare(indicators[name])})
+            else:
+                ind_type, source, params = indicators[name]
+                ind_nodes = getattr(self, ind_type)(source, **params)
+                outputs.update({name:{'value':ind_nodes} if not isinstance(ind_nodes, dict) else ind_nodes})
+
+        return(outputs)
+
+    def source(self, column):
+        ## Other series can be used as a source directly, only candle columns are looked up by name.
+        if not isinstance(column, str):
+            return(column)
+        return(self._add_node(column, lambda: Source_Node(column, CANDLE_COLUMNS[column])))
+
+    def EMA(self, source, maPeriod):
+        source = self.source(source)
+        name = 'EMA({0},{1})'.format(source.name, maPeriod)
+        return(self._add_node(name, lambda: EMA_Node(name, source, maPeriod, self.prec)))
+
+    def DEMA(self, source, maPeriod):
+        source = self.source(source)
+        EMA1 = self.EMA(source, maPeriod)
+        EMA2 = self.EMA(EMA1, maPeriod)
+        name = 'DEMA({0},{1})'.format(source.name, maPeriod)
+        return(self._add_node(name, lambda: Linear_Node(name, [(2, EMA1), (-1, EMA2)], self.prec)))
+
+    def zeroLagMACD(self, source, Efast=12, Eslow=26, signal=9):
+        source = self.source(source)
+        z1 = self.DEMA(source, Efast)
+        z2 = self.DEMA(source, Eslow)
+        name = 'MACD({0},{1},{2})'.format(source.name, Efast, Eslow)
+        lineMACD = self._add_node(name, lambda: Linear_Node(name, [(1, z1), (-1, z2)]))
+        lineSIGNAL = self.DEMA(lineMACD, signal)
+        name = 'HIST({0},{1})'.format(lineMACD.name, signal)
+        histogram = self._add_node(name, lambda: Linear_Node(name, [(1, lineMACD), (-1, lineSIGNAL)]))
+        return({'macd':lineMACD, 'signal':lineSIGNAL, 'hist':histogram})
+
+    def RMA(self, source, maPeriod):
+        source = self.source(source)
+        name = 'RMA({0},{1})'.format(source.name, maPeriod)
+        return(self._add_node(name, lambda: Stream_Node(name, [source], maPeriod,
+            lambda prices: TI.get_RMA(prices, maPeriod, prec=self.prec, result_format='numpy'),
+            TI.Stream_RMA(maPeriod, self.prec))))
+
+    def RSI(self, source, rsiPeriod=14):
+        source = self.source(source)
+        name = 'RSI({0},{1})'.format(source.name, rsiPeriod)
+        return(self._add_node(name, lambda: Stream_Node(name, [source], rsiPeriod+1,
+            lambda prices: TI.get_RSI(prices, rsiPeriod, prec=self.prec, result_format='numpy'),
+            TI.Stream_RSI(rsiPeriod, self.prec))))
+
+    def ATR(self, source=('high', 'low', 'close'), atrPeriod=14):
+        ## Source is the (high, low, close) columns.
+        sources = [self.source(column) for column in source]
+        name = 'ATR({0},{1})'.format(','.join([node.name for node in sources]), atrPeriod)
+        return(self._add_node(name, lambda: Stream_Node(name, sources, atrPeriod+1,
+            lambda high, low, close: TI.get_ATR(high, low, close, atrPeriod, prec=self.prec, result_format='numpy'),
+            TI.Stream_ATR(atrPeriod, self.prec))))
+
+    def STD(self, source, maPeriod):
+        source = self.source(source)
+        name = 'STD({0},{1})'.format(source.name, maPeriod)
+        return(self._add_node(name, lambda: Stream_Node(name, [source], maPeriod-1,
+            lambda prices: TI.get_rolling_std(prices, maPeriod, prec=self.prec, result_format='numpy'),
+            TI.Stream_rolling_std(maPeriod, self.prec))))
+
+    def BB(self, source, maPeriod=20, stdDev=2):
+        source = self.source(source)
+        name = 'BB({0},{1},{2})'.format(source.name, maPeriod, stdDev)
+        bands = self._add_node(name, lambda: Stream_Node(name, [source], maPeriod-1,
+            lambda prices: TI.get_BB(prices, maPeriod, stdDev, prec=self.prec, result_format='columnar'),
+            TI.Stream_BB(maPeriod, stdDev, self.prec)))
+
+        band_nodes = {}
+        for key, buffer_name in (('upper', 'uppers'), ('middle', 'values'), ('lower', 'lowers')):
+            band_name = '{0}.{1}'.format(name, key)
+            band_nodes.update({key:self._add_node(band_name, lambda: Column_Node(band_name, bands, key, buffer_name))})
+        return(band_nodes)
+
+    def get_dedup_report(self):
+        ''' Series that were declared more than once and are shared, {name:times_requested}. '''
+        return({name:self.requests[name] for name in self.requests if self.requests[name] > 1})
+
+    def _add_node(self, name, build_node):
+        ## Nodes are kept in declaration order, inputs are always declared first so this is also the evaluation order.
+        self.requests.update({name:self.requests.get(name, 0) + 1})
+        if not name in self.nodes:
+            self.nodes.update({name:build_node()})
+        return(self.nodes[name])
+
+    ## ------------------ [FULL_HISTORY] ------------------ ##
+    def compute(self, candles, lazy=False, tail=None, result_format='normal'):
+        ## A single market is given a leading axis as a view, NumPy candles (Candle_Store views) are not copied.
+        return(self.compute_batch(np.asarray(candles, dtype=float)[np.newaxis], lazy, tail, result_format)[0])
+
+    def compute_batch(self, candles_set, lazy=False, tail=None, result_format='normal'):
+        ''' Compute every unique series once for a set of markets with lined up candles (one row per market). '''
+        candles_array = np.asarray(candles_set, dtype=float)
+        if tail:
+            ## Candles are newest first so the warm up window is the head of the history.
+            candles_array = candles_array[:, :tail + TAIL_WARMUP*self.get_lookback()]
+
+        candle_columns = np.moveaxis(candles_array, -1, 0)
+        time_values = candles_array[0, :, 0].astype(np.int64)
+
+        results = {}
+        if not lazy:
+            for node in self.nodes.values():
+                self._compute_node(node, candle_columns, results)
+
+        row_outputs = []
+        for row in range(len(candles_set)):
+            get_values = (lambda node, row=row: self._compute_node(node, candle_columns, results)[row])
+            row_outputs.append(self._get_outputs(get_values, time_values, lazy, tail, result_format))
+
+        return(row_outputs)
+
+    def get_lookback(self):
+        ''' Candles needed before the longest series produces its first value. '''
+        return(max([node.lookback for node in self.nodes.values()]))
+
+    def _compute_node(self, node, candle_columns, results):
+        ## Inputs are computed first, results are shared so a series is only computed once.
+        if not node.name in results:
+            for input_node in node.inputs:
+                self._compute_node(input_node, candle_columns, results)
+            results.update({node.name:node.compute(candle_columns, results)})
+        return(results[node.name])
+
+    ## ------------------ [STREAMING] ------------------ ##
+    def update(self, candles):
+        ''' Feed the newest first candles, only candles newer than the last seen one are used. '''
+        with self.lock:
+            if self.last_time == None:
+                return(self.seed(candles))
+
+            new_candles = 0
+            while new_candles < len(candles) and candles[new_candles][0] > self.last_time:
+                new_candles += 1
+
+            if new_candles == len(candles) or candles[new_candles][0] != self.last_time:
+                return(self.seed(candles))
+
+            self.revise(candles[new_candles])
+            for i in range(new_candles-1, -1, -1):
+                self.advance(candles[i])
+
+    def seed(self, candles):
+        with self.lock:
+            candles_array = np.asarray(candles, dtype=float)
+            candle_columns = candles_array.T
+            time_values = candles_array[:, 0].astype(np.int64)
+
+            self.times = TI.Series_Buffer(len(time_values), dtype=np.int64)
+            self.times.reset(time_values[::-1])
+
+            for node in self.nodes.values():
+                node.seed(candle_columns, time_values)
+
+            self.pending = None
+            self.last_time = candles[0][0]
+            self.version += 1
+
+    def revise(self, candle):
+        ''' The forming candle changed, series are only revised when they are next read. '''
+        with self.lock:
+            self.pending = candle
+            self.revised = set()
+
+    def advance(self, candle):
+        with self.lock:
+            self._revise_pending()
+            self.times.append(candle[0])
+            for node in self.nodes.values():
+                node.advance(candle)
+            self.last_time = candle[0]
+            self.version += 1
+
+    def closed_points(self):
+        return(sum([len(node.view()) - 1 for node in self.nodes.values()]))
+
+    def get_nbytes(self):
+        ''' Bytes held by the series of the (seeded) graph. '''
+        holders = [self.times] + [getattr(node, name, None) for node in self.nodes.values() for name in ('values', 'stream')]
+        return(sum([holder.get_nbytes() for holder in holders if holder != None]))
+
+    def get_indicators(self, lazy=False, tail=None, result_format='normal'):
+        ''' The declared outputs as rows, or columnar (zero copy) views. '''
+        with self.lock:
+            if not lazy:
+                self._revise_pending()
+            version = self.version
+            return(self._get_outputs(lambda node: self._get_current_view(node, version), self.times.view(), lazy, tail, result_format))
+
+    def _get_current_view(self, node, version):
+        ## Called under the lock, the times were taken at 'version' so the values have to be of that state too.
+        if version != self.version:
+            raise RuntimeError('Indicators read after the graph moved on to a newer candle, get them again.')
+        return(self._get_revised_view(node))
+
+    def _get_revised_view(self, node):
+        if self.pending is not None and not node.name in self.revised:
+            for input_node in node.inputs:
+                self._get_revised_view(input_node)
+            node.revise(self.pending)
+            self.revised.add(node.name)
+        return(node.view())
+
+    def _revise_pending(self):
+        if self.pending is not None:
+            for node in self.nodes.values():
+                self._get_revised_view(node)
+            self.pending = None
+
+    def _get_outputs(self, get_values, time_values, lazy, tail, result_format):
+        if lazy:
+            return(Lazy_Indicators(self.outputs, lambda output: self._build_output(output, get_values, time_values, tail, result_format)))
+        return(self._build_outputs(self.outputs, get_values, time_values, tail, result_format))
+
+    def _build_outputs(self, outputs, get_values, time_values, tail, result_format):
+        indicators = {}
+
+        for name in outputs:
+            if _is_output(outputs[name]):
+                indicators.update({name:self._build_output(outputs[name], get_values, time_values, tail, result_format)})
+            else:
+                indicators.update({name:self._build_outputs(outputs[name], get_values, time_values, tail, result_format)})
+
+        return(indicators)
+
+    def _build_output(self, output, get_values, time_values, tail, result_format):
+        ## Lazy outputs can be read from other threads (the web API) while the trader moves the graph.
+        with self.lock:
+            columns = {key:get_values(output[key]) for key in output}
+            length = min([values.shape[-1] for values in columns.values()])
+            if tail:
+                length = min(length, tail)
+
+            indicator = {'time':time_values[:length]}
+            indicator.update({key:columns[key][..., :length] for key in columns})
+            if result_format == 'columnar':
+                return(indicator)
+            return(to_rows(indicator))
+
+
+class Lazy_Indicators(Mapping):
+    '''
+    Read only mapping of the declared outputs, an output is evaluated the first time it is read
+    and kept from then on. Groups (like 'ema') are lazy mappings themselves.
+    '''
+    def __init__(self, outputs, evaluate):
+        self.outputs    = outputs
+        self.evaluate   = evaluate
+        self.values     = {}
+
+    def __getitem__(self, name):
+        if not name in self.values:
+            if _is_output(self.outputs[name]):
+                self.values.update({name:self.evaluate(self.outputs[name])})
+            else:
+                self.values.update({name:Lazy_Indicators(self.outputs[name], self.evaluate)})
+        return(self.values[name])
+
+    def __iter__(self):
+        return(iter(self.outputs))
+
+    def __len__(self):
+        return(len(self.outputs))
+
+    def map_values(self, transform):
+        ''' Lazy mapping of transform(output) that reads through this mapping, an output is still evaluated once. '''
+        return(Mapped_Indicators(self, transform))
+
+    def get_evaluated(self):
+        return([name for name in self.values])
+
+
+class Mapped_Indicators(Mapping):
+    ''' transform() of the outputs of a Lazy_Indicators mapping, taken from (and so evaluated by) that mapping. '''
+
+    def __init__(self, source, transform):
+        self.source     = source
+        self.transform  = transform
+        self.values     = {}
+
+    def __getitem__(self, name):
+        if not name in self.values:
+            value = self.source[name]
+            if isinstance(value, Lazy_Indicators):
+                self.values.update({name:Mapped_Indicators(value, self.transform)})
+            else:
+                self.values.update({name:self.transform(value)})
+        return(self.values[name])
+
+    def __iter__(self):
+        return(iter(self.source))
+
+    def __len__(self):
+        return(len(self.source))
+
+
+def to_rows(indicator):
+    '''
+    Columnar output to the [time, value] (or [time, {column:value}]) rows of the map_time format, O(history) so
+    it is meant for the edges (JSON) rather than per candle reads.
+    '''
+    time_values = indicator['time'].tolist()
+    if 'value' in indicator:
+        values = indicator['value'].tolist()
+    else:
+        columns = {key:indicator[key].tolist() for key in indicator if key != 'time'}
+        values = [ {key:columns[key][i] for key in columns} for i in range(len(time_values)) ]
+
+    return([ [time_values[i], values[i]] for i in range(len(time_values)) ])
+
+
+def _is_output(output):
+    ## Outputs are {column:node}, groups are {name:output}.
+    return(not any(isinstance(node, dict) for node in output.values()))
@@ -1,63 +1,684 @@
 import numpy as np
 
+## Prices are newest first along the last axis, a 2-D array (one row per market) is computed in one pass.
+
+## Type the stream/graph series are stored as, set_compact_storage(True) halves their memory with float32.
+SERIES_DTYPE = np.float64
+
+
+def set_compact_storage(compact):
+    ''' Store series created from now on as float32 (compact) or float64, calculations stay float64. '''
+    global SERIES_DTYPE
+    SERIES_DTYPE = np.float32 if compact else np.float64
+
+
 def get_SMA(prices, maPeriod, time_values=None, prec=8, map_time=False, result_format='normal'):
 
-    span = len(prices) - maPeriod + 1
-    ma_list = np.array([np.mean(prices[i:(maPeriod+i)]) for i in range(span)])
+    ma_list = _window_sums(prices, maPeriod) / maPeriod
 
     return_vals = ma_list.round(prec)
 
-    if result_format == 'normal':
-        return_vals = [ val for val in return_vals ]
+    return _format_result(return_vals, time_values, map_time, result_format)
 
-    if map_time:
-       return_vals = [ [ time_values[i], return_vals[i] ] for i in range(len(return_vals)) ]
+def get_EMA(prices, maPeriod, time_values=None, prec=8, map_time=False, result_format='normal'):
 
-    return return_vals
+    return_vals = _smooth_kernel(prices, maPeriod, (2 / (maPeriod +1))).round(prec)
 
-def get_EMA(prices, maPeriod, time_values=None, prec=8, map_time=False, result_format='normal'):
-    
-    span = len(prices) - maPeriod
-    EMA = np.zeros_like(prices[:span])
-    weight = (2 / (maPeriod +1))
-    SMA = get_SMA(prices[span:], maPeriod, result_format='numpy')
-    seed = SMA + weight * (prices[span-1] - SMA)
-    EMA[0] = seed
+    return _format_result(return_vals, time_values, map_time, result_format)
+
+def get_DEMA(prices, maPeriod, prec=8):
+    EMA1 = get_EMA(prices, maPeriod, result_format='numpy')
+    EMA2 = get_EMA(EMA1, maPeriod, result_format='numpy')
+    DEMA = np.subtract((np.dot(2,EMA1[..., :EMA2.shape[-1]])), EMA2)
+
+    return DEMA.round(prec)
+
+def get_zeroLagMACD(prices, time_values=None, Efast=12, Eslow=26, signal=9, map_time=False, result_format='normal'):
+
+    z1 = get_DEMA(prices, Efast)
+    z2 = get_DEMA(prices, Eslow)
+    lineMACD = np.subtract (z1[..., :z2.shape[-1]], z2)
+    lineSIGNAL = get_DEMA (lineMACD, signal)
+    histogram = np.subtract(lineMACD[..., :lineSIGNAL.shape[-1]], lineSIGNAL)
+
+    return _format_MACD(lineMACD[..., :lineSIGNAL.shape[-1]], lineSIGNAL, histogram, time_values, map_time, result_format)
+
+def get_RMA(prices, maPeriod, time_values=None, prec=8, map_time=False, result_format='normal'):
+    ''' Wilder's moving average (an EMA weighted 1/maPeriod). '''
+    return_vals = _smooth_kernel(prices, maPeriod, (1 / maPeriod)).round(prec)
+
+    return _format_result(return_vals, time_values, map_time, result_format)
+
+def get_RSI(prices, rsiPeriod=14, time_values=None, prec=8, map_time=False, result_format='normal'):
+
+    gains, losses = _price_changes(prices)
+    avg_gain = _smooth_kernel(gains, rsiPeriod, (1 / rsiPeriod))
+    avg_loss = _smooth_kernel(losses, rsiPeriod, (1 / rsiPeriod))
+    return_vals = _RSI(avg_gain, avg_loss).round(prec)
+
+    return _format_result(return_vals, time_values, map_time, result_format)
+
+def get_ATR(high_prices, low_prices, close_prices, atrPeriod=14, time_values=None, prec=8, map_time=False, result_format='normal'):
+
+    true_range = _true_range(high_prices, low_prices, close_prices)
+    return_vals = _smooth_kernel(true_range, atrPeriod, (1 / atrPeriod)).round(prec)
+
+    return _format_result(return_vals, time_values, map_time, result_format)
+
+def get_rolling_std(prices, maPeriod, time_values=None, prec=8, map_time=False, result_format='normal'):
+    ''' Population standard deviation over each window of maPeriod prices. '''
+    mean, std = _window_mean_std(prices, maPeriod)
+    return_vals = std.round(prec)
+
+    return _format_result(return_vals, time_values, map_time, result_format)
+
+def get_BB(prices, maPeriod=20, stdDev=2, time_values=None, prec=8, map_time=False, result_format='normal'):
+
+    mean, std = _window_mean_std(prices, maPeriod)
+    upper = (mean + stdDev*std).round(prec)
+    lower = (mean - stdDev*std).round(prec)
+
+    return _format_columns({'upper':upper, 'middle':mean.round(prec), 'lower':lower}, time_values, map_time, result_format)
+
+def get_batch_row(result, row):
+    ''' Take one market out of a columnar batch result, the shared time column is kept as is. '''
+    return({key:(result[key] if key == 'time' else result[key][row]) for key in result})
+
+
+## Block size for _smooth_kernel, the decay within a block never underflows for the periods used.
+SMOOTH_BLOCK = 64
 
-    for i in range(1, span):
-        EMA[i] = (EMA[i-1] + weight * (prices[span-i-1] - EMA[i-1]))
+def _smooth_kernel(prices, maPeriod, weight):
+    '''
+    Unrounded newest first exponential smoothing seeded with the mean of the oldest maPeriod prices (one value per
+    newer price) without a per element loop.
+    Each block of SMOOTH_BLOCK values is one matrix product, y[j] = d^(j+1)*y[-1] + sum(weight*d^(j-k)*x[k]).
+    '''
+    prices = np.asarray(prices, dtype=float)
+    span = prices.shape[-1] - maPeriod
+    smoothed = np.zeros(prices.shape[:-1]+(max(span, 0),))
 
-    return_vals = np.flipud(EMA.round(prec))
+    if span < 1:
+        return(smoothed)
+
+    oldest_first = np.flip(prices, axis=-1)
+    state = oldest_first[..., :maPeriod].mean(axis=-1)
+    values = oldest_first[..., maPeriod:]
+
+    decay = 1 - weight
+    steps = np.arange(SMOOTH_BLOCK)
+    lags = steps[:, None] - steps[None, :]
+    transfer = np.where(lags >= 0, weight * decay ** np.maximum(lags, 0), 0.0)
+    carry = decay ** (steps + 1)
+
+    for start in range(0, span, SMOOTH_BLOCK):
+        block = values[..., start:start+SMOOTH_BLOCK]
+        size = block.shape[-1]
+        smoothed[..., start:start+size] = (block @ transfer[:size, :size].T) + (np.expand_dims(state, -1) * carry[:size])
+        state = smoothed[..., start+size-1]
+
+    return(np.flip(smoothed, axis=-1))
+
+
+def _window_sums(prices, maPeriod):
+    ''' Unrounded sum of each window of maPeriod prices along the last axis. '''
+    prices = np.asarray(prices, dtype=float)
+    rows = prices.shape[:-1]
+    span = prices.shape[-1] - maPeriod + 1
+
+    if span < 1:
+        return(np.zeros(rows+(0,)))
+
+    ## Window sums are built from per block prefix/suffix sums (blocks of maPeriod) so each
+    ## window is one suffix plus one prefix, this keeps it O(n) without a running total drifting.
+    pad = (-prices.shape[-1]) % maPeriod
+    blocks = np.concatenate((prices, np.zeros(rows+(pad,))), axis=-1).reshape(rows+(-1, maPeriod))
+    prefix_sums = np.cumsum(blocks, axis=-1).reshape(rows+(-1,))
+    suffix_sums = np.cumsum(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(rows+(-1,))
+
+    starts = np.arange(span)
+    return(suffix_sums[..., :span] + np.where(starts % maPeriod == 0, 0.0, prefix_sums[..., starts+maPeriod-1]))
+
+
+def _window_mean_std(prices, maPeriod):
+    prices = np.asarray(prices, dtype=float)
+    if prices.shape[-1] < maPeriod:
+        empty = np.zeros(prices.shape[:-1]+(0,))
+        return(empty, empty)
+
+    ## Prices are centred first so the squared sums do not cancel out for high priced markets.
+    centre = prices.mean(axis=-1, keepdims=True)
+    centred = prices - centre
+    mean = _window_sums(centred, maPeriod) / maPeriod
+    variance = (_window_sums(centred*centred, maPeriod) / maPeriod) - (mean*mean)
+
+    return(mean + centre, np.sqrt(np.maximum(variance, 0.0)))
+
+
+def _price_changes(prices):
+    ''' Newest first gains and losses between each price and the one before it. '''
+    prices = np.asarray(prices, dtype=float)
+    changes = prices[..., :-1] - prices[..., 1:]
+    return(np.maximum(changes, 0.0), np.maximum(-changes, 0.0))
+
+
+def _true_range(high_prices, low_prices, close_prices):
+    high_prices = np.asarray(high_prices, dtype=float)
+    low_prices = np.asarray(low_prices, dtype=float)
+    prev_close = np.asarray(close_prices, dtype=float)[..., 1:]
+    high_prices, low_prices = high_prices[..., :-1], low_prices[..., :-1]
+
+    return(np.maximum(high_prices - low_prices, np.maximum(np.abs(high_prices - prev_close), np.abs(low_prices - prev_close))))
+
+
+def _RSI(avg_gain, avg_loss):
+    ## No losses over the period gives an RSI of 100.
+    avg_gain = np.asarray(avg_gain, dtype=float)
+    avg_loss = np.asarray(avg_loss, dtype=float)
+    RS = np.divide(avg_gain, avg_loss, out=np.full(avg_gain.shape, np.inf), where=(avg_loss != 0))
+    return(100 - (100 / (1 + RS)))
+
+
+def _format_result(return_vals, time_values, map_time, result_format):
+
+    if result_format == 'columnar':
+        ## Parallel arrays, time is kept as its own column instead of [time, value] pairs.
+        if time_values is not None:
+            time_values = np.asarray(time_values)[:return_vals.shape[-1]]
+        return({'time':time_values, 'value':return_vals})
 
     if result_format == 'normal':
         return_vals = [ val for val in return_vals ]
+        if isinstance(time_values, np.ndarray):
+            time_values = time_values.tolist()
 
     if map_time:
        return_vals = [ [ time_values[i], return_vals[i] ] for i in range(len(return_vals)) ]
 
     return return_vals
 
-def get_DEMA(prices, maPeriod, prec=8):
-    EMA1 = get_EMA(prices, maPeriod)
-    EMA2 = get_EMA(EMA1, maPeriod)
-    DEMA = np.subtract((np.dot(2,EMA1[:len(EMA2)])), EMA2)
 
-    return DEMA.round(prec)
+def _format_MACD(lineMACD, lineSIGNAL, histogram, time_values, map_time, result_format):
+    return _format_columns({'macd':lineMACD, 'signal':lineSIGNAL, 'hist':histogram}, time_values, map_time, result_format)
 
-def get_zeroLagMACD(prices, time_values=None, Efast=12, Eslow=26, signal=9, map_time=False):
 
-    z1 = get_DEMA(prices, Efast)
-    z2 = get_DEMA(prices, Eslow)
-    lineMACD = np.subtract (z1[:len(z2)], z2)
-    lineSIGNAL = get_DEMA (lineMACD, signal)
-    histogram = np.subtract(lineMACD[:len(lineSIGNAL)], lineSIGNAL)
+def _format_columns(columns, time_values, map_time, result_format):
+    ''' Indicators with several lines per point (MACD, Bollinger bands), a dict per point or one array per line. '''
+    length = min([values.shape[-1] for values in columns.values()])
 
-    z_lag_macd = [({
-        "macd":float("{0}".format(lineMACD[i])), 
-        "signal":float("{0}".format(lineSIGNAL[i])), 
-        "hist":float("{0}".format(histogram[i]))}) for i in range(len(lineSIGNAL))]
+    if result_format == 'columnar':
+        if time_values is not None:
+            time_values = np.asarray(time_values)[:length]
+        result = {'time':time_values}
+        result.update({key:columns[key][..., :length] for key in columns})
+        return(result)
+
+    columns = {key:columns[key][:length].tolist() for key in columns}
+
+    return_vals = [{key:columns[key][i] for key in columns} for i in range(length)]
 
     if map_time:
-       z_lag_macd = [ [ time_values[i], z_lag_macd[i] ] for i in range(len(z_lag_macd)) ]
+        if isinstance(time_values, np.ndarray):
+            time_values = time_values.tolist()
+        return_vals = [ [ time_values[i], return_vals[i] ] for i in range(length) ]
+
+    return(return_vals)
+
+
+class Series_Buffer:
+    '''
+    Fixed size series held twice side by side (mirrored ring) so the latest values are always one
+    contiguous slice, appending and revising the newest value are O(1) and reads never copy.
+    '''
+    def __init__(self, size, dtype=None):
+        self.size   = max(int(size), 1)
+        self.data   = np.zeros(self.size*2, dtype=dtype or SERIES_DTYPE)
+        self.head   = 0
+        self.count  = 0
+
+    def reset(self, values):
+        ## Values are given oldest first, only the newest 'size' of them are kept.
+        values = np.asarray(values, dtype=self.data.dtype)[-self.size:]
+        self.count = len(values)
+        self.head = self.count % self.size
+        self.data[:self.count] = values
+        self.data[self.size:self.size+self.count] = values
+
+    def append(self, value):
+        self.data[self.head] = value
+        self.data[self.head+self.size] = value
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def set_last(self, value):
+        last = (self.head - 1) % self.size
+        self.data[last] = value
+        self.data[last+self.size] = value
+
+    def view(self, newest_first=True):
+        end = self.head + self.size
+        values = self.data[end-self.count:end]
+        if newest_first:
+            values = values[::-1]
+        values.flags.writeable = False
+        return(values)
+
+    def get_nbytes(self):
+        return(self.data.nbytes)
+
+    def __len__(self):
+        return(self.count)
+
+
+class Stream_Indicator:
+    '''
+    Base for indicators that are seeded once from a newest first history and then moved per candle.
+    -> revise(value)
+        The forming candle changed, recalculate the newest point from the last closed state.
+    -> advance(value, open_time)
+        A new candle opened, the forming point becomes closed and a new one is started.
+    '''
+    def __init__(self, prec=8):
+        self.prec       = prec
+        self.last_time  = None
+        self.values     = None
+        self.times      = None
+
+    def update(self, prices, time_values):
+        ''' Feed the full newest first history, only candles newer than the last seen one are used. '''
+        if self.last_time == None:
+            self.seed(prices, time_values)
+            return(self.get_last())
+
+        new_candles = 0
+        while new_candles < len(time_values) and time_values[new_candles] > self.last_time:
+            new_candles += 1
+
+        ## Reseed when the history no longer lines up with the state (gap, reset or too many new candles).
+        if new_candles == len(time_values) or time_values[new_candles] != self.last_time:
+            self.seed(prices, time_values)
+            return(self.get_last())
+
+        ## Finish the previous forming candle with its final price before opening the new ones.
+        self.revise(prices[new_candles])
+        for i in range(new_candles-1, -1, -1):
+            self.advance(prices[i], time_values[i])
+
+        return(self.get_last())
+
+    def get_last(self):
+        return(self.values.view()[0])
+
+    def get_nbytes(self):
+        ''' Bytes held by the series of the indicator (and of the indicators it is built from). '''
+        return(sum([value.get_nbytes() for value in vars(self).values() if isinstance(value, (Series_Buffer, Stream_Indicator))]))
+
+    def get_values(self, map_time=False, result_format='normal'):
+        return_vals = self.values.view()
+        time_values = self.times.view()
+        return _format_result(return_vals, time_values, map_time, result_format)
+
+    def _set_history(self, values, time_values):
+        self.values = Series_Buffer(len(values))
+        self.times  = Series_Buffer(len(values), dtype=np.int64)
+        self.values.reset(values[::-1])
+        self.times.reset(np.asarray(time_values[:len(values)])[::-1])
+        self.last_time = time_values[0]
+
+
+class Stream_EMA(Stream_Indicator):
+
+    def __init__(self, maPeriod, prec=8):
+        super().__init__(prec)
+        self.maPeriod       = maPeriod
+        self.weight         = (2 / (maPeriod +1))
+        self.closed_value   = None
+        self.value          = None
+
+    def seed(self, prices, time_values):
+        EMA = self._kernel(prices)
+        self.closed_value   = EMA[1]
+        self.value          = EMA[0]
+        self._set_history(EMA.round(self.prec), time_values)
+
+    def revise(self, price):
+        self.value = self.closed_value + self.weight * (price - self.closed_value)
+        self.values.set_last(round(self.value, self.prec))
+        return(self.values.view()[0])
+
+    def advance(self, price, open_time):
+        self.closed_value = self.value
+        self.value = self.closed_value + self.weight * (price - self.closed_value)
+        self.values.append(round(self.value, self.prec))
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.values.view()[0])
+
+    def _kernel(self, prices):
+        return(_smooth_kernel(prices, self.maPeriod, self.weight))
+
+
+class Stream_RMA(Stream_EMA):
+
+    def __init__(self, maPeriod, prec=8):
+        super().__init__(maPeriod, prec)
+        self.weight         = (1 / maPeriod)
+
+
+class Stream_DEMA(Stream_Indicator):
+
+    def __init__(self, maPeriod, prec=8):
+        super().__init__(prec)
+        self.maPeriod   = maPeriod
+        self.EMA1       = Stream_EMA(maPeriod, prec)
+        self.EMA2       = Stream_EMA(maPeriod, prec)
+
+    def seed(self, prices, time_values):
+        self.EMA1.seed(prices, time_values)
+        EMA1 = self.EMA1.values.view()
+        self.EMA2.seed(EMA1, time_values)
+        EMA2 = self.EMA2.values.view()
+        DEMA = np.subtract(np.dot(2, EMA1[:len(EMA2)]), EMA2)
+        self._set_history(DEMA.round(self.prec), time_values)
+
+    def revise(self, price):
+        EMA1 = self.EMA1.revise(price)
+        EMA2 = self.EMA2.revise(EMA1)
+        self.values.set_last(round((2*EMA1) - EMA2, self.prec))
+        return(self.values.view()[0])
+
+    def advance(self, price, open_time):
+        EMA1 = self.EMA1.advance(price, open_time)
+        EMA2 = self.EMA2.advance(EMA1, open_time)
+        self.values.append(round((2*EMA1) - EMA2, self.prec))
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.values.view()[0])
+
+
+class Stream_zeroLagMACD(Stream_Indicator):
+    '''
+    Incremental zero lag MACD, the fast/slow/signal DEMAs keep their own EMA states so a kline
+    update only produces the newest macd/signal/hist point.
+    '''
+    def __init__(self, Efast=12, Eslow=26, signal=9, prec=8):
+        super().__init__(prec)
+        self.DEMA_fast      = Stream_DEMA(Efast, prec)
+        self.DEMA_slow      = Stream_DEMA(Eslow, prec)
+        self.DEMA_signal    = Stream_DEMA(signal, prec)
+        self.signals        = None
+        self.hists          = None
+
+    def seed(self, prices, time_values):
+        self.DEMA_fast.seed(prices, time_values)
+        self.DEMA_slow.seed(prices, time_values)
+        z1 = self.DEMA_fast.values.view()
+        z2 = self.DEMA_slow.values.view()
+        lineMACD = np.subtract(z1[:len(z2)], z2)
+
+        self.DEMA_signal.seed(lineMACD, time_values)
+        lineSIGNAL = self.DEMA_signal.values.view()
+        histogram = np.subtract(lineMACD[:len(lineSIGNAL)], lineSIGNAL)
+
+        self._set_history(lineMACD[:len(lineSIGNAL)], time_values)
+        self.signals    = Series_Buffer(len(lineSIGNAL))
+        self.hists      = Series_Buffer(len(lineSIGNAL))
+        self.signals.reset(lineSIGNAL[::-1])
+        self.hists.reset(histogram[::-1])
+
+    def revise(self, price):
+        lineMACD = self.DEMA_fast.revise(price) - self.DEMA_slow.revise(price)
+        lineSIGNAL = self.DEMA_signal.revise(lineMACD)
+        self.values.set_last(lineMACD)
+        self.signals.set_last(lineSIGNAL)
+        self.hists.set_last(lineMACD - lineSIGNAL)
+        return(self.get_last())
+
+    def advance(self, price, open_time):
+        lineMACD = self.DEMA_fast.advance(price, open_time) - self.DEMA_slow.advance(price, open_time)
+        lineSIGNAL = self.DEMA_signal.advance(lineMACD, open_time)
+        self.values.append(lineMACD)
+        self.signals.append(lineSIGNAL)
+        self.hists.append(lineMACD - lineSIGNAL)
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.get_last())
+
+    def get_last(self):
+        return({
+            'macd':float(self.values.view()[0]),
+            'signal':float(self.signals.view()[0]),
+            'hist':float(self.hists.view()[0])})
+
+    def get_values(self, map_time=False, result_format='normal'):
+        return _format_MACD(self.values.view(), self.signals.view(), self.hists.view(), self.times.view(), map_time, result_format)
+
+
+class Stream_RSI(Stream_Indicator):
+    '''
+    Incremental RSI, the average gain/loss of the last closed candle are kept so a kline update
+    only smooths the change between the forming price and the last closed price.
+    '''
+    def __init__(self, rsiPeriod=14, prec=8):
+        super().__init__(prec)
+        self.rsiPeriod      = rsiPeriod
+        self.weight         = (1 / rsiPeriod)
+        self.closed_price   = None
+        self.price          = None
+        self.closed_avg     = None
+        self.avg            = None
+
+    def seed(self, prices, time_values):
+        prices = np.asarray(prices, dtype=float)
+        gains, losses = _price_changes(prices)
+        avg_gain = _smooth_kernel(gains, self.rsiPeriod, self.weight)
+        avg_loss = _smooth_kernel(losses, self.rsiPeriod, self.weight)
+
+        self.closed_price   = prices[1]
+        self.price          = prices[0]
+        self.closed_avg     = (avg_gain[1], avg_loss[1])
+        self.avg            = (avg_gain[0], avg_loss[0])
+        self._set_history(_RSI(avg_gain, avg_loss).round(self.prec), time_values)
+
+    def revise(self, price):
+        self.price = price
+        self.avg = self._smooth(price)
+        self.values.set_last(round(float(_RSI(*self.avg)), self.prec))
+        return(self.values.view()[0])
+
+    def advance(self, price, open_time):
+        self.closed_price   = self.price
+        self.closed_avg     = self.avg
+        self.price          = price
+        self.avg            = self._smooth(price)
+        self.values.append(round(float(_RSI(*self.avg)), self.prec))
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.values.view()[0])
+
+    def _smooth(self, price):
+        change = price - self.closed_price
+        avg_gain, avg_loss = self.closed_avg
+        return((avg_gain + self.weight * (max(change, 0.0) - avg_gain),
+                avg_loss + self.weight * (max(-change, 0.0) - avg_loss)))
+
+
+class Stream_ATR(Stream_Indicator):
+    '''
+    Incremental ATR, prices are given per candle as (high, low, close).
+    '''
+    def __init__(self, atrPeriod=14, prec=8):
+        super().__init__(prec)
+        self.atrPeriod      = atrPeriod
+        self.weight         = (1 / atrPeriod)
+        self.closed_close   = None
+        self.close          = None
+        self.closed_value   = None
+        self.value          = None
+
+    def seed(self, prices, time_values):
+        prices = np.asarray(prices, dtype=float)
+        ATR = _smooth_kernel(_true_range(prices[:, 0], prices[:, 1], prices[:, 2]), self.atrPeriod, self.weight)
+
+        self.closed_close   = prices[1, 2]
+        self.close          = prices[0, 2]
+        self.closed_value   = ATR[1]
+        self.value          = ATR[0]
+        self._set_history(ATR.round(self.prec), time_values)
+
+    def revise(self, price):
+        self.close = price[2]
+        self.value = self._smooth(price)
+        self.values.set_last(round(self.value, self.prec))
+        return(self.values.view()[0])
+
+    def advance(self, price, open_time):
+        self.closed_close   = self.close
+        self.closed_value   = self.value
+        self.close          = price[2]
+        self.value          = self._smooth(price)
+        self.values.append(round(self.value, self.prec))
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.values.view()[0])
+
+    def _smooth(self, price):
+        high, low, close = price
+        true_range = max(high - low, abs(high - self.closed_close), abs(low - self.closed_close))
+        return(self.closed_value + self.weight * (true_range - self.closed_value))
+
+
+class Stream_rolling_std(Stream_Indicator):
+    '''
+    Incremental rolling standard deviation, the last maPeriod prices are kept in a ring so a
+    kline update only recalculates the newest window.
+    '''
+    def __init__(self, maPeriod, prec=8):
+        super().__init__(prec)
+        self.maPeriod   = maPeriod
+        self.window     = Series_Buffer(maPeriod, dtype=np.float64)
+
+    def seed(self, prices, time_values):
+        prices = np.asarray(prices, dtype=float)
+        self.window.reset(prices[:self.maPeriod][::-1])
+        self._set_history(get_rolling_std(prices, self.maPeriod, prec=self.prec, result_format='numpy'), time_values)
+
+    def revise(self, price):
+        self.window.set_last(price)
+        self.values.set_last(round(float(self.window.view().std()), self.prec))
+        return(self.values.view()[0])
+
+    def advance(self, price, open_time):
+        self.window.append(price)
+        self.values.append(round(float(self.window.view().std()), self.prec))
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.values.view()[0])
+
+
+class Stream_BB(Stream_Indicator):
+
+    def __init__(self, maPeriod=20, stdDev=2, prec=8):
+        super().__init__(prec)
+        self.maPeriod   = maPeriod
+        self.stdDev     = stdDev
+        self.window     = Series_Buffer(maPeriod, dtype=np.float64)
+        self.uppers     = None
+        self.lowers     = None
+
+    def seed(self, prices, time_values):
+        prices = np.asarray(prices, dtype=float)
+        self.window.reset(prices[:self.maPeriod][::-1])
+        bands = get_BB(prices, self.maPeriod, self.stdDev, prec=self.prec, result_format='columnar')
+
+        self._set_history(bands['middle'], time_values)
+        self.uppers     = Series_Buffer(len(bands['middle']))
+        self.lowers     = Series_Buffer(len(bands['middle']))
+        self.uppers.reset(bands['upper'][::-1])
+        self.lowers.reset(bands['lower'][::-1])
+
+    def revise(self, price):
+        self.window.set_last(price)
+        middle, upper, lower = self._bands()
+        self.values.set_last(middle)
+        self.uppers.set_last(upper)
+        self.lowers.set_last(lower)
+        return(self.get_last())
+
+    def advance(self, price, open_time):
+        self.window.append(price)
+        middle, upper, lower = self._bands()
+        self.values.append(middle)
+        self.uppers.append(upper)
+        self.lowers.append(lower)
+        self.times.append(open_time)
+        self.last_time = open_time
+        return(self.get_last())
+
+    def get_last(self):
+        return({
+            'upper':float(self.uppers.view()[0]),
+            'middle':float(self.values.view()[0]),
+            'lower':float(self.lowers.view()[0])})
+
+    def get_values(self, map_time=False, result_format='normal'):
+        return _format_columns({'upper':self.uppers.view(), 'middle':self.values.view(), 'lower':self.lowers.view()}, self.times.view(), map_time, result_format)
+
+    def _bands(self):
+        window = self.window.view()
+        mean, std = window.mean(), window.std()
+        return(round(float(mean), self.prec), round(float(mean + self.stdDev*std), self.prec), round(float(mean - self.stdDev*std), self.prec))
+
+
+class Indicator_Cache:
+    '''
+    Per symbol cache of indicator graphs keyed by interval and the open time of the latest closed candle.
+    -> Hit
+        The closed history is the same as last call, the cached values are reused and only the
+        forming candle is revised (no per candle work over the history).
+    -> Miss
+        A candle closed or nothing is cached yet, the graph is advanced (or seeded) from the history.
+    '''
+    def __init__(self, build_graph):
+        ## build_graph returns a new object with update(candles), revise(candle) and closed_points() for a symbol/interval.
+        self.build_graph    = build_graph
+        self.entries        = {}
+        self.hits           = 0
+        self.misses         = 0
+        self.reused_points  = 0
+
+    def update(self, symbol, candles):
+        interval = candles[0][6] - candles[0][0] + 1
+        key = (symbol, interval)
+        closed_time = candles[1][0]
+
+        if key in self.entries and self.entries[key]['closed_time'] == closed_time:
+            self.hits += 1
+            graph = self.entries[key]['graph']
+            graph.revise(candles[0])
+            self.reused_points += graph.closed_points()
+        else:
+            self.misses += 1
+            if not key in self.entries:
+                self.entries.update({key:{'graph':self.build_graph(), 'closed_time':None}})
+
+            graph = self.entries[key]['graph']
+            graph.update(candles)
+            self.entries[key]['closed_time'] = closed_time
+
+        return(graph)
+
+    def get_memory_usage(self):
+        ''' Bytes held per symbol by the cached graphs (all intervals). '''
+        memory_usage = {}
+        for (symbol, interval), entry in self.entries.items():
+            memory_usage.update({symbol:memory_usage.get(symbol, 0) + entry['graph'].get_nbytes()})
+        return(memory_usage)
 
-    return(z_lag_macd)
\ No newline at end of file
+    def get_stats(self):
+        total = self.hits + self.misses
+        return({
+            'hits':self.hits,
+            'misses':self.misses,
+            'hit_rate':(self.hits / total) if total else 0.0,
+            'reused_points':self.reused_points})
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from binance_api import candle_archive
+
+INTERVAL = 60000
+
+
+def make_candles(count, first_open=0):
+    ## Oldest first candles in the candle_store layout.
+    rng = np.random.default_rng(count)
+    candles = np.zeros((count, 9))
+    candles[:, 0] = first_open + np.arange(count) * INTERVAL
+    candles[:, 1:6] = rng.uniform(1, 100, (count, 5))
+    candles[:, 6] = candles[:, 0] + INTERVAL - 1
+    candles[:, 7] = rng.uniform(1, 1000, count)
+    candles[:, 8] = rng.integers(1, 500, count)
+    return(candles)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'candles.archive')
+    candles = make_candles(1000)
+
+    with candle_archive.Candle_Archive_Writer(path, block_candles=128) as writer:
+        writer.append(candles[:700])
+        writer.append(candles[600:])
+
+    reader = candle_archive.Candle_Archive_Reader(path)
+    assert len(reader) == 1000
+    np.testing.assert_array_equal(reader.read(), candles)
+    np.testing.assert_array_equal(reader.read(candles[100][0], candles[300][0]), candles[100:300])
+
+
+def test_full_blocks_are_written_as_they_fill(tmp_path):
+    path = str(tmp_path / 'candles.archive')
+    writer = candle_archive.Candle_Archive_Writer(path, block_candles=100)
+    writer.append(make_candles(250))
+
+    ## Never closed, only the partial block is missing.
+    assert len(candle_archive.Candle_Archive_Reader(path)) == 200
+
+
+def test_context_manager_flushes_on_error(tmp_path):
+    path = str(tmp_path / 'candles.archive')
+    with pytest.raises(RuntimeError):
+        with candle_archive.Candle_Archive_Writer(path, block_candles=100) as writer:
+            writer.append(make_candles(50))
+            raise RuntimeError('stopped')
+
+    assert len(candle_archive.Candle_Archive_Reader(path)) == 50
+
+
+def test_reopen_appends_newer_candles(tmp_path):
+    path = str(tmp_path / 'candles.archive')
+    candles = make_candles(300)
+
+    with candle_archive.Candle_Archive_Writer(path, price_dtype='f') as writer:
+        writer.append(candles[:200])
+    with candle_archive.Candle_Archive_Writer(path) as writer:
+        assert writer.price_dtype == 'f'
+        assert writer.append(candles[150:]) == 100
+
+    np.testing.assert_allclose(candle_archive.Candle_Archive_Reader(path).read(), candles, rtol=1e-6)
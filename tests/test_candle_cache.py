@@ -0,0 +1,94 @@
+import os
+import time
+import numpy as np
+
+from binance_api import api_master_socket_caller as socket_caller
+from binance_api import candle_cache
+from binance_api import candle_store
+
+INTERVAL_MS = 60000
+
+
+def make_candles(count, last_open):
+    ## Oldest first 1m candles, the newest one opens at last_open.
+    open_times = last_open - np.arange(count)[::-1] * INTERVAL_MS
+    candles = np.zeros((count, 9))
+    candles[:, 0] = open_times
+    candles[:, 1:5] = (open_times / INTERVAL_MS % 1000)[:, None] + 100
+    candles[:, 5] = 1.0
+    candles[:, 6] = open_times + INTERVAL_MS - 1
+    return(candles)
+
+
+def test_candle_file_resumes_after_a_partial_write(tmp_path):
+    path = str(tmp_path / 'AAA_1m.candles')
+    candles = make_candles(10, 9 * INTERVAL_MS)
+    candle_file = candle_cache.Candle_File(path)
+    candle_file.reset(candles[:6])
+
+    ## Candles the file already holds are skipped.
+    assert candle_file.append(candles[4:8]) == 2
+    with open(path, 'ab') as f:
+        f.write(candles[8].tobytes()[:30])
+
+    reopened = candle_cache.Candle_File(path)
+    assert reopened.last_open_time == candles[7][0]
+    assert os.path.getsize(path) == 8 * candle_cache.RECORD_SIZE
+    np.testing.assert_array_equal(reopened.read(), candles[:8])
+    np.testing.assert_array_equal(reopened.read(3), candles[5:8])
+
+    assert reopened.append(candles[8:]) == 2
+    np.testing.assert_array_equal(candle_cache.Candle_File(path).read(), candles)
+
+
+class Fake_REST:
+
+    def __init__(self, candles):
+        ## Newest first like the REST helpers return them.
+        self.candles = candles[::-1]
+        self.limits = []
+
+    def get_custom_candles(self, symbol, interval, limit, download_dir=None):
+        self.limits.append(limit)
+        return(candle_store.candles_to_list(self.candles[:limit]))
+
+
+def make_socket(cache_dir):
+    sock = socket_caller.Binance_SOCK()
+    sock.candle_cache_dir = str(cache_dir)
+    return(sock)
+
+
+def test_warm_restart_downloads_only_the_missing_tail(tmp_path):
+    now_open = int(time.time() * 1000) // INTERVAL_MS * INTERVAL_MS
+    history = make_candles(300, now_open)
+
+    ## The cache stopped 5 candles before the forming one.
+    candle_file = candle_cache.Candle_File(os.path.join(str(tmp_path), 'AAA_1m.candles'))
+    candle_file.reset(history[:-5])
+
+    rest_api = Fake_REST(history)
+    sock = make_socket(tmp_path)
+    assert sock._set_initial_candles('AAA', '1m', rest_api) == False
+
+    assert rest_api.limits[0] < 10
+    np.testing.assert_array_equal(sock.candle_data['AAA'].view(), history[-sock.BASE_CANDLE_LIMIT:][::-1])
+
+    ## Only closed candles are added to the file.
+    np.testing.assert_array_equal(candle_cache.Candle_File(candle_file.path).read(), history[:-1])
+
+
+def test_cache_with_a_gap_is_replaced_by_a_full_download(tmp_path):
+    now_open = int(time.time() * 1000) // INTERVAL_MS * INTERVAL_MS
+    history = make_candles(300, now_open)
+    candle_file = candle_cache.Candle_File(os.path.join(str(tmp_path), 'AAA_1m.candles'))
+    candle_file.reset(history[:-5])
+
+    ## The exchange history is missing the candle right after the cached ones.
+    rest_api = Fake_REST(np.delete(history, -5, axis=0))
+    sock = make_socket(tmp_path)
+    assert sock._set_initial_candles('AAA', '1m', rest_api) == True
+
+    assert rest_api.limits[-1] == sock.BASE_CANDLE_LIMIT
+    stored = candle_cache.Candle_File(candle_file.path).read()
+    assert len(stored) == sock.BASE_CANDLE_LIMIT - 1 and stored[-1][0] == history[-2][0]
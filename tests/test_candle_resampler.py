@@ -0,0 +1,142 @@
+import numpy as np
+
+from binance_api import api_support_tools
+from binance_api import candle_resampler
+from binance_api import candle_store
+
+MINUTE = 60000
+
+
+def make_candles(count, first_open, interval=MINUTE, seed=1):
+    ## Newest first candles with prices above 9999 (more digits than the old string formatting kept).
+    rng = np.random.default_rng(seed)
+    open_times = first_open + np.arange(count) * interval
+    closes = 27123.45 + np.round(np.cumsum(rng.normal(0, 3, count)), 2)
+    candles = np.zeros((count, 9))
+    candles[:, 0] = open_times
+    candles[:, 1] = closes - 0.5
+    candles[:, 2] = closes + rng.uniform(0, 2, count).round(2)
+    candles[:, 3] = closes - 0.5 - rng.uniform(0, 2, count).round(2)
+    candles[:, 4] = closes
+    candles[:, 5] = rng.uniform(0, 5, count).round(4)
+    candles[:, 6] = open_times + interval - 1
+    candles[:, 7] = candles[:, 5] * closes
+    candles[:, 8] = rng.integers(1, 50, count)
+    return(candles[::-1])
+
+
+def reference_resample(candles, interval_time):
+    ## One bucket at a time, buckets whose start is not covered are left out.
+    buckets = {}
+    for candle in candles[::-1]:
+        buckets.setdefault(candle[0] // interval_time * interval_time, []).append(candle)
+
+    resampled = []
+    for bucket_open, parts in buckets.items():
+        if parts[0][0] != bucket_open:
+            continue
+        parts = np.array(parts)
+        resampled.append([bucket_open, parts[0, 1], parts[:, 2].max(), parts[:, 3].min(), parts[-1, 4],
+            parts[:, 5].sum(), bucket_open + interval_time - 1, parts[:, 7].sum(), parts[:, 8].sum()])
+    return(np.array(resampled)[::-1])
+
+
+def test_live_resampler_matches_resampling_the_base_candles():
+    interval_time = 5 * MINUTE
+    ## Starts 2 minutes into a bucket, the base store holds 40 candles.
+    history = make_candles(120, 1000 * interval_time + 2 * MINUTE)
+    base_store = candle_store.Candle_Store(40)
+    base_store.reset(history[60:])
+
+    resampler = candle_resampler.Candle_Resampler(base_store, interval_time, 30)
+    resampler.seed(candle_resampler.resample_candles(history[60:], interval_time))
+
+    for i in range(59, -1, -1):
+        ## The forming candle first comes in with half of its move, then with its final values.
+        forming = history[i].copy()
+        forming[2:5] = history[i+1][4]
+        forming[5], forming[7], forming[8] = 0.0, 0.0, 1
+        base_store.append(forming)
+        resampler.update()
+        base_store.set_last(history[i])
+        resampler.update()
+
+    expected = reference_resample(history, interval_time)
+    result = resampler.store.view()
+    np.testing.assert_allclose(result, expected[:len(result)], rtol=1e-12)
+    assert result[0][0] == history[0][0] // interval_time * interval_time
+
+
+def test_resampler_resync_after_a_base_backfill():
+    interval_time = 15 * MINUTE
+    history = make_candles(100, 400 * interval_time)
+    base_store = candle_store.Candle_Store(100)
+    base_store.reset(history[10:])
+    resampler = candle_resampler.Candle_Resampler(base_store, interval_time, 10)
+    resampler.seed(candle_resampler.resample_candles(history[10:], interval_time))
+
+    ## Candles added without updates (a backfill) are picked up by a resync, later updates continue from it.
+    base_store.extend(history[1:10][::-1])
+    resampler.resync()
+    base_store.append(history[0])
+    resampler.update()
+
+    expected = reference_resample(history, interval_time)
+    np.testing.assert_allclose(resampler.store.view(), expected[:len(resampler.store)], rtol=1e-12)
+
+
+def test_interval_to_ms():
+    assert candle_resampler.interval_to_ms('15m') == 15 * MINUTE
+    assert candle_resampler.interval_to_ms('4h') == 240 * MINUTE
+    assert candle_resampler.interval_to_ms('1w') == None and candle_resampler.interval_to_ms('1M') == None
+
+
+def test_bucket_edges():
+    interval_time = 15 * MINUTE
+    ## 5m candles from 10 minutes into a bucket up to 5 minutes into the forming one.
+    candles = make_candles(9, 200 * interval_time + 10 * MINUTE, 5 * MINUTE)
+    resampled = candle_resampler.resample_candles(candles, interval_time)
+
+    ## The partly covered oldest bucket is dropped, the forming bucket is kept with the newest close.
+    assert len(resampled) == 3
+    assert resampled[-1][0] == 201 * interval_time and resampled[0][0] == 203 * interval_time
+    assert resampled[0][1] == candles[1][1] and resampled[0][4] == candles[0][4]
+    assert resampled[0][6] == 204 * interval_time - 1
+    np.testing.assert_allclose(resampled, reference_resample(candles, interval_time), rtol=1e-12)
+
+    ## A history that starts on a bucket keeps its oldest bucket, prices keep all their digits.
+    aligned = candles[:-1]
+    assert len(candle_resampler.resample_candles(aligned, interval_time)) == 3
+    assert candle_resampler.resample_candles(candles[1:2], interval_time)[0][4] == candles[1][4]
+    assert len(candle_resampler.resample_candles(candles[:1], interval_time)) == 0
+    assert len(candle_resampler.resample_candles(candles[:0], interval_time)) == 0
+
+
+class Fake_REST:
+
+    def __init__(self, candles):
+        self.candles = candles
+        self.weight_limiter = None
+        self.requests = []
+
+    def get_candles(self, symbol, interval, limit):
+        self.requests.append((interval, limit))
+        return(candle_store.candles_to_list(self.candles[:limit]))
+
+
+def test_custom_candles_are_built_from_the_best_interval():
+    ## 3h candles are built from 1h candles, the forming 3h candle holds two of them.
+    candles = make_candles(50, 3000 * 60 * MINUTE, 60 * MINUTE)
+    rest_api = Fake_REST(candles)
+    result = api_support_tools.get_custom_candles({'symbol':'AAA', 'interval':'3h', 'limit':10, 'rest_api':rest_api})
+
+    ## One extra bucket is requested, its oldest part is not covered and it is dropped.
+    assert rest_api.requests == [('1h', 33)]
+    expected = reference_resample(candles[:33], 180 * MINUTE)
+    assert len(expected) == 11 and expected[0][6] == candles[0][6] + 60 * MINUTE
+    expected = expected[:10]
+    np.testing.assert_allclose(np.array(result), expected, rtol=1e-12)
+    ## Times and the prices taken from a single candle come through unchanged.
+    assert [[candle[i] for i in (0, 1, 4, 6)] for candle in result] == [[candle[i] for i in (0, 1, 4, 6)] for candle in candle_store.candles_to_list(expected)]
+    assert [type(value) for value in result[0]] == [int, float, float, float, float, float, int, float, int]
+    assert result[0][0] == candles[1][0] and result[0][4] == candles[0][4] > 9999
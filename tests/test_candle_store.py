@@ -0,0 +1,103 @@
+import numpy as np
+
+from binance_api import candle_store
+
+
+def make_candles(count, first_open=0):
+    ## Oldest first 9 column candles of 1m intervals with prices that need more than float32 precision.
+    open_times = first_open + np.arange(count) * 60000
+    prices = 27123.43 + np.arange(count)
+    candles = np.zeros((count, 9))
+    candles[:, 0] = open_times
+    candles[:, 1] = prices - 1
+    candles[:, 2] = prices + 2
+    candles[:, 3] = prices - 2
+    candles[:, 4] = prices
+    candles[:, 5] = 1.5
+    candles[:, 6] = open_times + 59999
+    candles[:, 7] = prices * 1.5
+    candles[:, 8] = 10 + np.arange(count)
+    return(candles)
+
+
+def test_ring_wraps_and_keeps_the_newest_candles():
+    candles = make_candles(23)
+    store = candle_store.Candle_Store(10)
+    store.reset(candles[:8][::-1])
+
+    for candle in candles[8:15]:
+        store.append(candle)
+    store.extend(candles[15:])
+    assert len(store) == 10 and store.head == 3
+
+    np.testing.assert_array_equal(store.view(), candles[-10:][::-1])
+    assert store.get_last_open_time() == candles[-1][0]
+
+    forming = candles[-1].copy()
+    forming[4] += 5
+    store.set_last(forming)
+    np.testing.assert_array_equal(store.view(), np.concatenate(([forming], candles[-10:-1][::-1])))
+    assert store.tolist(2) == candle_store.candles_to_list(np.stack((forming, candles[-2])))
+
+
+def test_extend_with_more_candles_than_fit():
+    candles = make_candles(25)
+    store = candle_store.Candle_Store(10)
+    store.reset(candles[:3][::-1])
+    store.extend(candles[3:])
+    np.testing.assert_array_equal(store.view(), candles[-10:][::-1])
+
+
+def test_candles_to_list_gives_int_times_and_trades():
+    rows = candle_store.candles_to_list(make_candles(2))
+    assert rows[0][:2] == [0, 27122.43] and rows[1][0] == 60000
+    assert [type(value) for value in rows[0]] == [int, float, float, float, float, float, int, float, int]
+
+
+def test_column_views_are_read_only_and_follow_the_forming_candle():
+    candles = make_candles(15)
+    store = candle_store.Candle_Store(10)
+    store.reset(candles[::-1])
+
+    columns = store.get_columns()
+    close = store.get_column('close')
+    oldest_first = store.get_column('close', newest_first=False)
+    assert np.shares_memory(close, store.data) and np.shares_memory(store.view(), store.data)
+    assert not close.flags.writeable and not store.view().flags.writeable
+    np.testing.assert_array_equal(oldest_first, close[::-1])
+    np.testing.assert_array_equal(columns['open_time'], candles[-10:, 0][::-1])
+
+    forming = candles[-1].copy()
+    forming[4] += 5
+    store.set_last(forming)
+    assert close[0] == oldest_first[-1] == forming[4]
+    assert store.get_columns() is columns
+
+    ## A new candle hands out new views.
+    store.append(make_candles(1, candles[-1][0] + 60000)[0])
+    assert store.get_column('close')[1] == forming[4]
+
+
+def test_compact_store_keeps_the_close_exact():
+    candles = make_candles(15)
+    store = candle_store.Candle_Store(10, compact=True)
+    full_store = candle_store.Candle_Store(10)
+    for target in (store, full_store):
+        target.reset(candles[:12][::-1])
+        target.extend(candles[12:])
+
+    assert store.get_nbytes() < full_store.get_nbytes()
+    assert store.get_column('close').dtype == np.float64 and store.get_column('open').dtype == np.float32
+    assert store.get_column('open_time').dtype == np.int64
+    np.testing.assert_array_equal(store.get_column('close'), candles[-10:, 4][::-1])
+    np.testing.assert_array_equal(store.get_column('trades'), candles[-10:, 8][::-1])
+    np.testing.assert_allclose(store.view(), full_store.view(), rtol=1e-7)
+    assert store.view()[0, 1] == np.float32(candles[-1, 1]) != candles[-1, 1]
+
+    ## The widened copy is refreshed by an update of the forming candle.
+    view = store.view()
+    forming = candles[-1].copy()
+    forming[4] += 0.01
+    store.set_last(forming)
+    assert store.view() is view and view[0, 4] == forming[4]
+    assert store.tolist(1)[0][4] == forming[4] and store.get_last_open_time() == candles[-1, 0]
@@ -0,0 +1,53 @@
+import numpy as np
+
+from binance_api import formatter
+
+## REST klines are oldest first strings/ints with 12 fields (the last 3 are not used).
+RAW_KLINES = [
+    [1700000000000, '27123.43000000', '27130.01000000', '27100.00000000', '27125.99000000', '12.34567000', 1700000059999, '334911.12345678', 417, '6.1', '165000.1', '0'],
+    [1700000060000, '27125.99000000', '27126.00000000', '27119.50000000', '27120.10000000', '0.00100000', 1700000119999, '27.12010000', 1, '0', '0', '0']]
+
+RAW_DEPTH = {
+    'lastUpdateId':1027024,
+    'bids':[['4.00000000', '431.00000000'], ['3.99000000', '9.00000000']],
+    'asks':[['4.00000200', '12.00000000']]}
+
+RAW_DEPTH_EVENT = {'e':'depthUpdate', 'E':123456789, 's':'BNBBTC', 'U':157, 'u':160,
+    'b':[['0.0024', '10']], 'a':[['0.0026', '100'], ['0.0027', '0.0']]}
+
+
+def test_kline_rows_match_the_per_field_conversion():
+    candles = formatter.format_candles(RAW_KLINES, 'REST')
+
+    expected = [[int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5]), int(c[6]), float(c[7]), int(c[8])] for c in RAW_KLINES][::-1]
+    assert candles == expected
+    assert [type(value) for value in candles[0]] == [int, float, float, float, float, float, int, float, int]
+
+    candles_array = formatter.format_candles_array(RAW_KLINES)
+    assert candles_array.shape == (2, 9) and candles_array.dtype == np.float64
+    np.testing.assert_array_equal(candles_array, np.array(expected))
+    assert formatter.format_candles_array([]).shape == (0, 9)
+
+
+def test_depth_arrays():
+    depth = formatter.format_depth_arrays(RAW_DEPTH, 'REST')
+    assert depth['lastUpdateId'] == 1027024
+    np.testing.assert_array_equal(depth['b'], [[4.0, 431.0], [3.99, 9.0]])
+    np.testing.assert_array_equal(depth['a'], [[4.000002, 12.0]])
+
+    event = formatter.format_depth_arrays(RAW_DEPTH_EVENT, 'SOCK')
+    assert (event['U'], event['u']) == (157, 160)
+    np.testing.assert_array_equal(event['a'], [[0.0026, 100.0], [0.0027, 0.0]])
+
+    ## Sides without levels are still (0 x 2) arrays.
+    empty = formatter.format_depth_arrays({'U':1, 'u':1, 'a':[], 'b':[]}, 'SOCK')
+    assert empty['a'].shape == (0, 2) and empty['b'].shape == (0, 2)
+
+
+def test_depth_keeps_the_dict_and_list_formats():
+    assert formatter.format_depth(RAW_DEPTH, 'REST') == {
+        'a':{4.000002:[1027024, 12.0]},
+        'b':{4.0:[1027024, 431.0], 3.99:[1027024, 9.0]}}
+    assert formatter.format_depth(RAW_DEPTH_EVENT, 'SOCK') == {
+        'a':[[160, 0.0026, 100.0], [160, 0.0027, 0.0]],
+        'b':[[160, 0.0024, 10.0]]}
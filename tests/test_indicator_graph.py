@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+
+import indicator_graph as IG
+
+INDICATORS = {
+    'macd':('zeroLagMACD', 'close', {}),
+    'ema':{
+        'ema20':('EMA', 'close', {'maPeriod':20})}}
+
+
+def make_candles(length, seed=1):
+    ## Newest first 9 column candles of 1m intervals.
+    rng = np.random.default_rng(seed)
+    prices = 27000 + np.cumsum(rng.normal(0, 15, length))[::-1]
+    open_times = np.arange(length)[::-1] * 60000.0
+    candles = np.zeros((length, 9))
+    candles[:, 0] = open_times
+    candles[:, 1] = prices
+    candles[:, 2] = prices + 5
+    candles[:, 3] = prices - 5
+    candles[:, 4] = prices
+    candles[:, 5] = 1.0
+    candles[:, 6] = open_times + 59999
+    return(candles)
+
+
+def count_builds(graph):
+    ## Counts the outputs the graph builds (every evaluation of a lazy output goes through _build_output).
+    calls = []
+    build_output = graph._build_output
+    graph._build_output = lambda *args: calls.append(1) or build_output(*args)
+    return(calls)
+
+
+def test_mapped_lazy_outputs_share_evaluation():
+    graph = IG.Indicator_Graph(INDICATORS)
+    graph.seed(make_candles(300))
+    builds = count_builds(graph)
+
+    indicators = graph.get_indicators(lazy=True, result_format='columnar')
+    stripped = indicators.map_values(lambda values: {key:values[key] for key in values if key != 'time'})
+
+    np.testing.assert_array_equal(stripped['macd']['macd'], indicators['macd']['macd'])
+    stripped['ema']['ema20']
+    indicators['ema']['ema20']
+    assert len(builds) == 2
+    assert sorted(stripped) == ['ema', 'macd']
+
+
+def test_lazy_outputs_older_than_the_graph_raise():
+    candles = make_candles(301)
+    graph = IG.Indicator_Graph(INDICATORS)
+    graph.seed(candles[1:])
+
+    old_indicators = graph.get_indicators(lazy=True, result_format='columnar')
+    graph.update(candles)
+
+    with pytest.raises(RuntimeError):
+        old_indicators['macd']
+
+    new_indicators = graph.get_indicators(lazy=True, result_format='columnar')
+    assert new_indicators['macd']['time'][0] == candles[0][0]
+
+
+def test_lazy_outputs_follow_revisions_of_the_same_candle():
+    candles = make_candles(300)
+    graph = IG.Indicator_Graph(INDICATORS)
+    graph.seed(candles)
+
+    indicators = graph.get_indicators(lazy=True, result_format='columnar')
+    revised = candles.copy()
+    revised[0, 4] += 50
+    graph.update(revised)
+
+    expected = IG.Indicator_Graph(INDICATORS).compute(revised, result_format='columnar')
+    np.testing.assert_allclose(indicators['ema']['ema20']['value'][:50], expected['ema']['ema20']['value'][:50])
+
+
+## Values are rounded to 8 decimals, a 2-D batch can round the last decimal the other way.
+BATCH_TOLERANCE = {'rtol':0, 'atol':3e-8}
+
+
+def assert_outputs_equal(result, expected):
+    assert sorted(result) == sorted(expected)
+    for name in expected:
+        if 'time' in expected[name]:
+            np.testing.assert_array_equal(result[name]['time'], expected[name]['time'])
+            for key in expected[name]:
+                np.testing.assert_allclose(result[name][key], expected[name][key], **BATCH_TOLERANCE)
+        else:
+            assert_outputs_equal(result[name], expected[name])
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_batch_matches_per_symbol_compute(lazy):
+    candles_set = [make_candles(400, seed) for seed in range(4)]
+    graph = IG.Indicator_Graph(INDICATORS)
+
+    batch = graph.compute_batch(candles_set, lazy=lazy, result_format='columnar')
+    for candles, indicators in zip(candles_set, batch):
+        expected = IG.Indicator_Graph(INDICATORS).compute(candles, result_format='columnar')
+        assert_outputs_equal(indicators, expected)
+
+
+def test_trader_batch_matches_per_symbol():
+    import trader_configuration as TC
+
+    candles_by_symbol = {'AAA':make_candles(400, 1), 'BBB':make_candles(400, 2), 'CCC':make_candles(350, 3), 'DDD':[]}
+    batch = TC.technical_indicators_batch(candles_by_symbol)
+
+    assert sorted(batch) == ['AAA', 'BBB', 'CCC']
+    for symbol in batch:
+        assert_outputs_equal(batch[symbol], TC.technical_indicators(candles_by_symbol[symbol]))
+
+
+
+def test_indicator_cache_revises_the_forming_candle_and_advances_on_close():
+    import technical_indicators as TI
+
+    candles = make_candles(302)
+    forming = candles[2:].copy()
+    forming[0, 4] += 30
+    cache = TI.Indicator_Cache(lambda: IG.Indicator_Graph(INDICATORS))
+
+    ## Seeded, then the forming candle changes (hit), then two candles close (misses that advance the graph).
+    for history, hits, misses in ((candles[2:], 0, 1), (forming, 1, 1), (candles[1:], 1, 2), (candles, 1, 3)):
+        graph = cache.update('AAA', history)
+        assert (cache.get_stats()['hits'], cache.get_stats()['misses']) == (hits, misses)
+
+        result = graph.get_indicators(result_format='columnar')
+        expected = IG.Indicator_Graph(INDICATORS).compute(history, result_format='columnar')
+        np.testing.assert_allclose(result['macd']['hist'][:100], expected['macd']['hist'][:100], **BATCH_TOLERANCE)
+        np.testing.assert_allclose(result['ema']['ema20']['value'][:100], expected['ema']['ema20']['value'][:100], **BATCH_TOLERANCE)
+
+    assert cache.get_stats()['reused_points'] == graph.closed_points()
+    assert list(cache.entries) == [('AAA', 60000.0)]
+
+
+def test_shared_series_are_built_once():
+    graph = IG.Indicator_Graph({
+        'macd':('zeroLagMACD', 'close', {}),
+        'macd_open':('zeroLagMACD', 'open', {}),
+        'ema':{
+            'ema12':('EMA', 'close', {'maPeriod':12}),
+            'dema12':('DEMA', 'close', {'maPeriod':12})}})
+
+    ## The fast DEMA of the MACD and the declared DEMA share EMA(close,12) with the declared EMA.
+    report = graph.get_dedup_report()
+    assert report['EMA(close,12)'] == 3
+    assert report['DEMA(close,12)'] == 2
+    assert report['close'] == 3 and not 'open' in report
+    assert graph.outputs['ema']['dema12']['value'] is graph.outputs['macd']['macd'].terms[0][1]
+    assert len([name for name in graph.nodes if name.startswith('MACD(')]) == 2
+
+    ## Shared series give the same values as separately declared ones.
+    candles = make_candles(300)
+    result = graph.compute(candles, result_format='columnar')
+    expected = IG.Indicator_Graph({'dema12':('DEMA', 'close', {'maPeriod':12})}).compute(candles, result_format='columnar')
+    np.testing.assert_array_equal(result['ema']['dema12']['value'], expected['dema12']['value'])
+    assert_outputs_equal({'macd':result['macd']}, {'macd':IG.Indicator_Graph(INDICATORS).compute(candles, result_format='columnar')['macd']})
@@ -0,0 +1,187 @@
+import numpy as np
+import pytest
+
+import technical_indicators as TI
+
+## Window sums are built from block prefix/suffix sums, they agree with np.mean to float rounding only.
+TOLERANCE = {'rtol':1e-10, 'atol':1e-7}
+
+
+def make_prices(length, seed=1):
+    ## Newest first prices around a high price level (where summing errors show up first).
+    rng = np.random.default_rng(seed)
+    return(27000 + np.cumsum(rng.normal(0, 15, length))[::-1])
+
+
+def reference_SMA(prices, maPeriod):
+    return(np.array([np.mean(prices[i:i+maPeriod]) for i in range(len(prices) - maPeriod + 1)]))
+
+
+@pytest.mark.parametrize('length,maPeriod', [
+    (500, 1), (500, 7), (500, 20), (500, 64), (333, 50),
+    (200, 198), (200, 199), (200, 200)])
+def test_SMA_matches_sliding_mean(length, maPeriod):
+    prices = make_prices(length)
+    expected = reference_SMA(prices, maPeriod)
+
+    result = TI.get_SMA(prices, maPeriod, result_format='numpy')
+    assert result.shape == expected.shape
+    np.testing.assert_allclose(result, expected, **TOLERANCE)
+
+
+def test_SMA_window_longer_than_prices():
+    assert len(TI.get_SMA(make_prices(10), 11, result_format='numpy')) == 0
+
+
+def test_SMA_normal_format():
+    prices = make_prices(120)
+    result = TI.get_SMA(prices, 14)
+
+    assert isinstance(result, list)
+    np.testing.assert_allclose(result, reference_SMA(prices, 14), **TOLERANCE)
+
+
+def test_SMA_map_time():
+    prices = make_prices(120)
+    time_values = np.arange(120, dtype=np.int64)[::-1] * 60000
+    result = TI.get_SMA(prices, 14, time_values=time_values, map_time=True)
+
+    expected = reference_SMA(prices, 14)
+    assert len(result) == len(expected)
+    assert [row[0] for row in result] == time_values[:len(expected)].tolist()
+    np.testing.assert_allclose([row[1] for row in result], expected, **TOLERANCE)
+
+
+def test_SMA_columnar():
+    prices = make_prices(120)
+    time_values = np.arange(120, dtype=np.int64)[::-1] * 60000
+    result = TI.get_SMA(prices, 14, time_values=time_values, result_format='columnar')
+
+    expected = reference_SMA(prices, 14)
+    np.testing.assert_array_equal(result['time'], time_values[:len(expected)])
+    np.testing.assert_allclose(result['value'], expected, **TOLERANCE)
+
+
+def test_SMA_batch_rows():
+    prices = np.stack([make_prices(300, seed) for seed in range(4)])
+    result = TI.get_SMA(prices, 30, result_format='numpy')
+
+    for row in range(len(prices)):
+        np.testing.assert_allclose(result[row], reference_SMA(prices[row], 30), **TOLERANCE)
+
+
+def reference_EMA(prices, maPeriod):
+    ## Newest first EMA seeded with the mean of the oldest maPeriod prices, one step per price.
+    weight = 2 / (maPeriod + 1)
+    oldest_first = prices[::-1]
+    EMA = [np.mean(oldest_first[:maPeriod])]
+    for price in oldest_first[maPeriod:]:
+        EMA.append(EMA[-1] + weight * (price - EMA[-1]))
+    return(np.array(EMA[1:])[::-1])
+
+
+@pytest.mark.parametrize('length,maPeriod', [(500, 12), (500, 100), (130, 129), (64+26+1, 26)])
+def test_EMA_matches_recursion(length, maPeriod):
+    prices = make_prices(length)
+    np.testing.assert_allclose(TI.get_EMA(prices, maPeriod, result_format='numpy'), reference_EMA(prices, maPeriod), **TOLERANCE)
+
+
+def test_stream_EMA_matches_batch():
+    prices = make_prices(300)
+    time_values = np.arange(300, dtype=np.int64)[::-1]
+    stream = TI.Stream_EMA(20)
+    stream.update(prices[1:], time_values[1:])
+    stream.update(prices, time_values)
+
+    ## The stream keeps the length it was seeded with, the oldest point is dropped as a candle is added.
+    values = stream.values.view()
+    np.testing.assert_allclose(values, TI.get_EMA(prices, 20, result_format='numpy')[:len(values)], **TOLERANCE)
+
+
+def replay_stream(stream, prices, time_values, new_candles, revised_by=40.0):
+    ''' Seed without the newest candles, then add them one by one with a wrong forming price revised in between. '''
+    stream.update(prices[new_candles:], time_values[new_candles:])
+    for i in range(new_candles-1, -1, -1):
+        stream.revise(prices[i+1] + revised_by)
+        stream.update(prices[i:], time_values[i:])
+    return(stream)
+
+
+def test_stream_MACD_matches_batch():
+    prices = make_prices(400)
+    time_values = np.arange(400, dtype=np.int64)[::-1]
+    stream = replay_stream(TI.Stream_zeroLagMACD(), prices, time_values, 30)
+
+    expected = TI.get_zeroLagMACD(prices, time_values=time_values, result_format='columnar')
+    result = stream.get_values(result_format='columnar')
+    length = len(result['macd'])
+    for key in ('macd', 'signal', 'hist'):
+        np.testing.assert_allclose(result[key], expected[key][:length], **TOLERANCE)
+    np.testing.assert_array_equal(result['time'], expected['time'][:length])
+
+
+def test_stream_MACD_revision_matches_batch_of_the_revised_price():
+    prices = make_prices(400)
+    time_values = np.arange(400, dtype=np.int64)[::-1]
+    stream = TI.Stream_zeroLagMACD()
+    stream.update(prices, time_values)
+
+    revised_prices = prices.copy()
+    revised_prices[0] += 75
+    last = stream.revise(revised_prices[0])
+    expected = TI.get_zeroLagMACD(revised_prices, time_values=time_values, result_format='columnar')
+    np.testing.assert_allclose([last[key] for key in ('macd', 'signal', 'hist')], [expected[key][0] for key in ('macd', 'signal', 'hist')], **TOLERANCE)
+
+
+def reference_RSI(prices, rsiPeriod):
+    ## Wilder's RSI one change at a time, seeded with the mean gain/loss of the oldest rsiPeriod changes.
+    changes = np.diff(np.asarray(prices[::-1], dtype=float))
+    gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+    avg_gain, avg_loss = gains[:rsiPeriod].mean(), losses[:rsiPeriod].mean()
+    RSI = []
+    for gain, loss in zip(gains[rsiPeriod:], losses[rsiPeriod:]):
+        avg_gain += (gain - avg_gain) / rsiPeriod
+        avg_loss += (loss - avg_loss) / rsiPeriod
+        RSI.append(100 - 100 / (1 + avg_gain / avg_loss))
+    return(np.array(RSI)[::-1])
+
+
+def test_RSI_matches_wilder_recursion():
+    prices = make_prices(500)
+    np.testing.assert_allclose(TI.get_RSI(prices, 14, result_format='numpy'), reference_RSI(prices, 14), **TOLERANCE)
+
+
+def make_high_low_close(length):
+    closes = make_prices(length)
+    spread = np.abs(np.random.default_rng(2).normal(0, 4, length))
+    return(np.stack((closes + spread, closes - spread, closes), axis=1))
+
+
+STREAMS = {
+    'RMA':(lambda: TI.Stream_RMA(14), lambda prices: TI.get_RMA(prices, 14, result_format='numpy')),
+    'RSI':(lambda: TI.Stream_RSI(14), lambda prices: TI.get_RSI(prices, 14, result_format='numpy')),
+    'ATR':(lambda: TI.Stream_ATR(14), lambda prices: TI.get_ATR(prices[:, 0], prices[:, 1], prices[:, 2], 14, result_format='numpy')),
+    'STD':(lambda: TI.Stream_rolling_std(20), lambda prices: TI.get_rolling_std(prices, 20, result_format='numpy'))}
+
+
+@pytest.mark.parametrize('name', sorted(STREAMS))
+def test_streams_match_batch(name):
+    build_stream, get_batch = STREAMS[name]
+    prices = make_high_low_close(400) if name == 'ATR' else make_prices(400)
+    time_values = np.arange(400, dtype=np.int64)[::-1]
+    stream = replay_stream(build_stream(), prices, time_values, 30)
+
+    values = stream.values.view()
+    np.testing.assert_allclose(values, get_batch(prices)[:len(values)], **TOLERANCE)
+    np.testing.assert_array_equal(stream.times.view(), time_values[:len(values)])
+
+
+def test_stream_BB_matches_batch():
+    prices = make_prices(400)
+    time_values = np.arange(400, dtype=np.int64)[::-1]
+    stream = replay_stream(TI.Stream_BB(20, 2), prices, time_values, 30)
+
+    result = stream.get_values(result_format='columnar')
+    expected = TI.get_BB(prices, 20, 2, result_format='columnar')
+    for key in ('upper', 'middle', 'lower'):
+        np.testing.assert_allclose(result[key], expected[key][:len(result[key])], **TOLERANCE)
@@ -0,0 +1,293 @@
+import json
+import time
+import types
+import numpy as np
+
+from binance_api import api_master_socket_caller as socket_caller
+from binance_api import kline_downloader
+from binance_api import order_book
+
+
+def levels(*pairs):
+    return(np.array(pairs, dtype=float).reshape(-1, 2))
+
+
+def snapshot(last_update_id, asks=((101.0, 1.0), (102.0, 2.0)), bids=((100.0, 1.0), (99.0, 2.0))):
+    return({'lastUpdateId':last_update_id, 'a':levels(*asks), 'b':levels(*bids)})
+
+
+def diff(first_id, last_id, asks=(), bids=()):
+    return({'U':first_id, 'u':last_id, 'a':levels(*asks), 'b':levels(*bids)})
+
+
+def test_diffs_buffered_before_the_first_snapshot_are_replayed():
+    book = order_book.Order_Book(10)
+    assert book.apply_diff(diff(95, 99, asks=[(101.0, 9.0)]))
+    assert book.apply_diff(diff(100, 104, asks=[(101.0, 3.0)]))
+    assert book.get_snapshot()['synced'] == False
+
+    book.set_snapshot(snapshot(101))
+    assert book.apply_diff(diff(105, 106, bids=[(100.5, 4.0)]))
+
+    result = book.get_snapshot()
+    assert result['synced'] and result['lastUpdateId'] == 106
+    ## The event that ended before the snapshot was dropped, the one covering it was applied.
+    assert result['a'][0] == (101.0, 3.0)
+    assert result['b'][0] == (100.5, 4.0)
+
+
+def test_events_the_book_already_holds_are_dropped():
+    book = order_book.Order_Book(10)
+    book.reset(snapshot(100))
+
+    assert book.apply_diff(diff(90, 100, asks=[(101.0, 50.0)]))
+    assert book.get_snapshot()['a'][0] == (101.0, 1.0)
+    assert book.state == 'SNAPSHOT'
+
+
+def test_first_event_has_to_cover_the_snapshot():
+    book = order_book.Order_Book(10)
+    book.reset(snapshot(100))
+    assert not book.apply_diff(diff(102, 105))
+    assert book.state == 'RESYNC'
+
+    for first_id in (95, 101):
+        book = order_book.Order_Book(10)
+        book.reset(snapshot(100))
+        assert book.apply_diff(diff(first_id, 105, asks=[(101.0, 7.0)]))
+        assert book.state == 'LIVE' and book.get_snapshot()['a'][0] == (101.0, 7.0)
+
+
+def test_gap_in_the_live_stream_needs_a_resync():
+    book = order_book.Order_Book(10)
+    book.reset(snapshot(100))
+    assert book.apply_diff(diff(101, 103))
+    assert book.apply_diff(diff(104, 104))
+
+    assert not book.apply_diff(diff(106, 107, asks=[(101.0, 8.0)]))
+    result = book.get_snapshot()
+    assert result['synced'] == False
+    assert result['a'][0] == (101.0, 1.0)
+
+    ## Events keep being buffered until a snapshot is handed over.
+    assert book.apply_diff(diff(108, 110, asks=[(101.0, 6.0)]))
+    book.set_snapshot(snapshot(107))
+    assert book.apply_diff(diff(111, 111))
+    assert book.get_snapshot()['synced'] and book.get_snapshot()['a'][0] == (101.0, 6.0)
+
+
+class Fake_Limiter:
+
+    def __init__(self):
+        self.acquired = []
+        self.blocked = 0
+
+    def acquire(self, weight):
+        self.acquired.append(weight)
+
+    def report_used(self, used_weight):
+        pass
+
+    def block_minute(self):
+        self.blocked += 1
+
+
+class Fake_REST:
+
+    def __init__(self, responses):
+        self.weight_limiter = Fake_Limiter()
+        self.used_weight = None
+        self.responses = list(responses)
+        self.calls = []
+
+    def get_orderBook(self, symbol, limit):
+        self.calls.append((symbol, len(self.weight_limiter.acquired)))
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return(response)
+
+
+def make_socket(rest_api, symbols):
+    sock = socket_caller.Binance_SOCK()
+    sock.rest_api = rest_api
+    sock.socketRunning = True
+    for symbol in symbols:
+        sock._set_initial_depth(symbol)
+    return(sock)
+
+
+def rest_snapshot(last_update_id):
+    return({'lastUpdateId':last_update_id, 'asks':[['101.0', '1.0']], 'bids':[['100.0', '1.0']]})
+
+
+def depth_event(symbol, first_id, last_id):
+    return({'s':symbol, 'U':first_id, 'u':last_id, 'a':[['101.0', str(last_id)]], 'b':[]})
+
+
+def wait_for_resyncs(sock, timeout=5):
+    end_time = time.time() + timeout
+    while sock.resyncing_books and time.time() < end_time:
+        time.sleep(0.01)
+    assert not sock.resyncing_books
+
+
+def test_snapshots_are_fetched_once_events_are_buffered_and_take_weight():
+    rest_api = Fake_REST([{'code':-1003, 'msg':'Too many requests'}, rest_snapshot(105)])
+    sock = make_socket(rest_api, ['AAA'])
+    assert rest_api.calls == []
+
+    sock._update_depth(depth_event('AAA', 100, 102))
+    wait_for_resyncs(sock)
+
+    ## Every request took the weight of a depth snapshot first, the error response blocked the minute.
+    weight = socket_caller._get_depth_weight(sock.BASE_DEPTH_LIMIT)
+    assert rest_api.weight_limiter.acquired == [weight, weight]
+    assert [acquired for symbol, acquired in rest_api.calls] == [1, 2]
+    assert rest_api.weight_limiter.blocked == 1
+
+    sock._update_depth(depth_event('AAA', 103, 107))
+    result = sock.get_live_depths('AAA')
+    assert result['synced'] and result['lastUpdateId'] == 107
+    assert sock.get_depth_sync_stats()['resyncs'] == 0
+
+
+def test_gap_starts_one_resync():
+    rest_api = Fake_REST([rest_snapshot(100)])
+    sock = make_socket(rest_api, ['AAA'])
+    sock._update_depth(depth_event('AAA', 99, 100))
+    wait_for_resyncs(sock)
+    sock._update_depth(depth_event('AAA', 101, 101))
+    assert sock.get_live_depths('AAA')['synced']
+
+    rest_api.responses = [rest_snapshot(110)]
+    sock._update_depth(depth_event('AAA', 105, 106))
+    sock._update_depth(depth_event('AAA', 107, 108))
+    wait_for_resyncs(sock)
+    sock._update_depth(depth_event('AAA', 109, 111))
+
+    assert sock.get_depth_sync_stats()['markets'] == {'AAA':1}
+    assert len(rest_api.calls) == 2
+    assert sock.get_live_depths('AAA')['lastUpdateId'] == 111
+
+
+def test_resync_gives_up_when_the_socket_stops(monkeypatch):
+    ## Retries do not wait (only the socket module's clock is replaced).
+    monkeypatch.setattr(socket_caller, 'time', types.SimpleNamespace(time=time.time, sleep=lambda seconds: None))
+    rest_api = Fake_REST([ConnectionError('down')])
+    sock = make_socket(rest_api, ['AAA'])
+
+    sock._update_depth(depth_event('AAA', 100, 102))
+    time.sleep(0.05)
+    sock.socketRunning = False
+    wait_for_resyncs(sock)
+    assert sock.book_data['AAA'].pending_snapshot == None
+
+    ## After a restart the next event starts a new resync.
+    rest_api.responses = [rest_snapshot(101)]
+    sock.socketRunning = True
+    sock._update_depth(depth_event('AAA', 103, 104))
+    wait_for_resyncs(sock)
+    sock._update_depth(depth_event('AAA', 105, 105))
+    assert sock.get_live_depths('AAA')['synced']
+
+
+def test_weight_limiter_waits_for_the_next_minute(monkeypatch):
+    clock = [120.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(kline_downloader, 'time', types.SimpleNamespace(time=lambda: clock[0], sleep=sleep))
+
+    limiter = kline_downloader.Weight_Limiter(10)
+    limiter.acquire(5)
+    limiter.acquire(5)
+    assert waits == []
+
+    clock[0] += 15
+    limiter.acquire(5)
+    assert waits == [45.0]
+    assert limiter.used == 5
+
+
+def test_book_side_inserts_and_deletes_levels_in_order():
+    bids = order_book.Book_Side(True)
+    bids.reset([(99.0, 2.0), (100.0, 1.0), (98.0, 0.0)], 10)
+    assert bids.get_levels() == ((100.0, 1.0), (99.0, 2.0))
+
+    bids.update(99.5, 3.0, 11)
+    bids.update(101.0, 4.0, 11)
+    bids.update(97.0, 5.0, 11)
+    bids.update(100.0, 0.0, 11)
+    assert bids.get_levels() == ((101.0, 4.0), (99.5, 3.0), (99.0, 2.0), (97.0, 5.0))
+
+    ## Updates older than a level, and removals of levels that are not there, change nothing.
+    bids.update(99.5, 9.0, 10)
+    bids.update(96.0, 0.0, 12)
+    assert bids.get_levels(2) == ((101.0, 4.0), (99.5, 3.0))
+
+    bids.trim(3)
+    assert bids.get_prices() == [101.0, 99.5, 99.0]
+    assert bids.total == 9.0 and bids.total_quote == 101.0*4.0 + 99.5*3.0 + 99.0*2.0
+
+    asks = order_book.Book_Side(False)
+    asks.reset([(102.0, 2.0), (101.0, 1.0)], 10)
+    asks.update(101.5, 1.0, 11)
+    assert asks.get_prices() == [101.0, 101.5, 102.0]
+    for price in (101.0, 101.5, 102.0):
+        asks.update(price, 0.0, 12)
+    assert len(asks) == 0 and asks.total == 0.0 and asks.total_quote == 0.0
+
+
+def test_snapshots_are_versioned_and_never_change():
+    book = order_book.Order_Book(3)
+    book.reset(snapshot(100))
+    first = book.get_snapshot()
+    assert book.get_snapshot() is first
+
+    book.apply_diff(diff(101, 101, asks=[(101.0, 0.0), (100.5, 2.0)], bids=[(100.2, 1.0), (98.0, 1.0)]))
+    second = book.get_snapshot()
+    assert second['version'] > first['version'] and second is not first
+    assert first['a'] == ((101.0, 1.0), (102.0, 2.0)) and first['lastUpdateId'] == 100
+    assert second['a'] == ((100.5, 2.0), (102.0, 2.0))
+    assert second['b'] == ((100.2, 1.0), (100.0, 1.0), (99.0, 2.0))
+
+    ## The analytics agree with sums over the levels.
+    assert second['mid'] == (100.5 + 100.2) / 2
+    assert second['depth']['b'] == (1.0, 2.0, 4.0) and book.get_depth(2) == {'a':4.0, 'b':2.0}
+    assert book.get_depth() == {'a':4.0, 'b':4.0}
+    assert book.get_fill_price('BUY', 100.5) == 100.5
+    assert abs(book.get_fill_price('BUY', 100.5*2 + 102.0) - (100.5*2 + 102.0) / 3) < 1e-12
+    assert book.get_fill_price('BUY', 1000.0) == None
+    assert dict(second)['total_quote'] == second['total_quote']
+
+
+def book_ticker(symbol, update_id, bid, ask):
+    return({'u':update_id, 's':symbol, 'b':str(bid), 'B':'1.5', 'a':str(ask), 'A':'2.5'})
+
+
+def test_book_ticker_fast_path():
+    rest_api = Fake_REST([rest_snapshot(100)])
+    sock = make_socket(rest_api, ['AAA', 'BBB'])
+    sock._update_depth(depth_event('BBB', 99, 100))
+    wait_for_resyncs(sock)
+    sock._update_depth(depth_event('BBB', 101, 101))
+
+    ## Messages come in through the socket handler, combined streams wrap them in 'data'.
+    sock._on_Message(None, json.dumps(book_ticker('AAA', 5, 100.25, 100.5)))
+    held = sock.get_best_prices('AAA')
+    assert held == {'u':5, 'a':(100.5, 2.5), 'b':(100.25, 1.5)}
+
+    ## Older updates are ignored, a newer one replaces the whole entry so a held result never changes.
+    sock._on_Message(None, json.dumps({'stream':'aaa@bookTicker', 'data':book_ticker('AAA', 4, 99.0, 99.5)}))
+    assert sock.get_best_prices('AAA')['u'] == 5
+    sock._on_Message(None, json.dumps(book_ticker('AAA', 6, 100.3, 100.4)))
+    assert sock.get_best_prices('AAA')['b'] == (100.3, 1.5)
+    assert held['b'] == (100.25, 1.5)
+
+    ## Without a bookTicker stream the best levels come from the order book.
+    assert sock.get_best_prices('BBB') == {'a':(101.0, 101.0), 'b':(100.0, 1.0)}
+    assert sock.get_best_prices('CCC') == None
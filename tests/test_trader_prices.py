@@ -0,0 +1,22 @@
+import numpy as np
+
+from core import trader
+
+
+def test_prices_keep_the_float_formatting_rounding():
+    assert trader.format_order_price('1.015', 2) == '{0:.2f}'.format(1.015) == '1.01'
+    assert trader.format_order_price(0.1015, 3) == '0.102'
+    assert trader.format_order_price('27123.456', 2) == '27123.46'
+    assert trader.format_order_price(27123, 0) == '27123'
+
+
+def test_compact_prices_round_like_the_exchange_decimal():
+    ## float32(0.1015) is below 0.1015, widened it would round down to 0.101.
+    assert '{0:.3f}'.format(float(np.float32(0.1015))) == '0.101'
+    assert trader.format_order_price(np.float32(0.1015), 3) == trader.format_order_price(0.1015, 3) == '0.102'
+    assert trader.format_order_price(float(np.float32(0.1015)), 3) == '0.102'
+
+    compact_close = np.array([1.015, 0.1015, 27123.45], dtype=np.float32)
+    for compact_value, value in zip(compact_close, [1.015, 0.1015, 27123.45]):
+        for tick_size in (1, 2, 3):
+            assert trader.format_order_price(compact_value, tick_size) == trader.format_order_price(value, tick_size)
@@ -1,27 +1,73 @@
 import technical_indicators as TI
+import indicator_graph as IG
 
 ## Minimum fiyat yuvarlama.
 pRounding = 8
 
-def technical_indicators(candles):
-    indicators = {}
+## Stratejinin kullandığı göstergeler (tip, kaynak, parametreler), ortak alt seriler (ör. EMA(close,12)) yalnızca bir kez hesaplanır.
+INDICATORS = {
+    'macd':('zeroLagMACD', 'open', {}),
+    'hist':('zeroLagMACD', 'close', {}),
+    'ema':{
+        'ema200':('EMA', 'close', {'maPeriod':100})}}
 
-    time_values     = [candle[0] for candle in candles]
-    open_prices     = [candle[1] for candle in candles]
-    high_prices     = [candle[2] for candle in candles]
-    low_prices      = [candle[3] for candle in candles]
-    close_prices    = [candle[4] for candle in candles]
+## Göstergeler strateji onları ilk okuduğunda hesaplanır (okunmayan göstergeler hiç hesaplanmaz).
+LAZY_INDICATORS = True
 
-    
-    indicators.update({'macd':TI.get_zeroLagMACD(open_prices, time_values=time_values, map_time=True)})
-    
-    indicators.update({'hist':TI.get_zeroLagMACD(close_prices, time_values=time_values, map_time=True)})
-    
-    indicators.update({'ema':{}})
-    indicators['ema'].update({'ema200':TI.get_EMA(close_prices, 100, time_values=time_values, map_time=True)})
-    
+## Gösterge çıktı biçimi: 'columnar' sütunlar (macd['signal'][0], ema200[0]) veya 'normal' satırlar (macd[0]['signal']).
+## 'columnar' kopyasız dizi görünümleri döndürür, döngü başına maliyet MAX_CANDLES'a bağlı değildir ve [zaman, değer]
+## satırları yalnızca web arayüzü için JSON sınırında oluşturulur. 'normal' her okumada tüm geçmişin satırlarını oluşturur.
+RESULT_FORMAT = 'columnar'
+
+## Yalnızca son K noktayı döndür (ör. macd[0]/macd[1] karşılaştırmaları için 2), None tüm geçmiş.
+## UYARI: Tüm geçmiş hesaplamasında (symbol verilmeden ve toplu modda) yalnızca ısınma için gereken son mumlar kullanılır,
+## EMA/MACD gibi göstergelerin değerleri tüm geçmişle hesaplananlardan sessizce farklı olur ve sinyaller değişebilir.
+## Bu nedenle varsayılan olarak kapalıdır, yalnızca bu farkın strateji için önemsiz olduğu biliniyorsa açın.
+INDICATOR_TAIL = None
+
+## Strateji tam derinlik (emir defteri) verisi kullanıyorsa True, TOP_OF_BOOK açıkken derinlik akışı yalnızca o zaman açılır.
+DEPTH_REQUIRED = False
+
+def build_indicator_graph():
+    return(IG.Indicator_Graph(INDICATORS))
+
+## Sembol/aralık başına önbelleğe alınan gösterge grafiği (kapanmış mumlar yeniden hesaplanmaz).
+indicator_cache = TI.Indicator_Cache(build_indicator_graph)
+
+## Toplu hesaplama durumsuzdur, grafik bir kez kurulur ve her geçişte yeniden kullanılır.
+batch_graph = build_indicator_graph()
+
+def technical_indicators(candles, symbol=None):
+    if symbol:
+        ## Sembol verilirse kapanmış mumların değerleri önbellekten gelir, yalnızca oluşan mum hesaplanır.
+        return(indicator_cache.update(symbol, candles).get_indicators(LAZY_INDICATORS, INDICATOR_TAIL, RESULT_FORMAT))
+
+    return(build_indicator_graph().compute(candles, LAZY_INDICATORS, INDICATOR_TAIL, RESULT_FORMAT))
+
+
+def technical_indicators_batch(candles_by_symbol):
+    ## Aynı aralığı paylaşan (aynı uzunluk ve son açılış zamanı) piyasalar tek bir 2 boyutlu dizide birlikte hesaplanır.
+    groups = {}
+    for symbol in candles_by_symbol:
+        candles = candles_by_symbol[symbol]
+        if candles is None or len(candles) == 0:
+            ## Mumları henüz yüklenmemiş piyasalar atlanır.
+            continue
+        group_key = (len(candles), candles[0][0], candles[0][6])
+
+        if not group_key in groups:
+            groups.update({group_key:[]})
+        groups[group_key].append(symbol)
+
+    batch_indicators = {}
+    for symbols in groups.values():
+        candles_set = [candles_by_symbol[symbol] for symbol in symbols]
+
+        ## Her tüccar kendi satırını (kopyasız dilim) alır.
+        for symbol, indicators in zip(symbols, batch_graph.compute_batch(candles_set, LAZY_INDICATORS, INDICATOR_TAIL, RESULT_FORMAT)):
+            batch_indicators.update({symbol:indicators})
 
-    return(indicators)
+    return(batch_indicators)
 
 
 
@@ -44,10 +90,10 @@ def long_exit_conditions(custom_conditional_data, trade_information, indicators,
     macd = indicators['macd']
     
 
-    if macd[1]['signal'] < macd[1]['macd']:
-     if macd[0]['signal'] > macd[0]['macd']:
+    if macd['signal'][1] < macd['macd'][1]:
+     if macd['signal'][0] > macd['macd'][0]:
         order_point += 1
-        if macd[0]['hist'] < macd[1]['hist']:
+        if macd['hist'][0] < macd['hist'][1]:
             print("Satıyor...========================================================================================")
             return({'side':'SELL',
                 'description':'Sat Sinyali Verildi.', 
@@ -79,11 +125,11 @@ def long_entry_conditions(custom_conditional_data, trade_information, indicators
     ema200 = indicators['ema']['ema200']
     
     if candles[0][4] > ema200[0]:
-     if macd[1]['signal'] > macd[1]['macd']:
-      if macd[0]['signal'] < macd[0]['macd']:
+     if macd['signal'][1] > macd['macd'][1]:
+      if macd['signal'][0] < macd['macd'][0]:
         order_point += 1
-        if macd2[0]['hist'] > macd2[1]['hist']:
-         if macd[0]['hist'] > macd[1]['hist']:
+        if macd2['hist'][0] > macd2['hist'][1]:
+         if macd['hist'][0] > macd['hist'][1]:
             print("Alıyor==========================================================================================")
             return({'side':'BUY',
                     'description':'Alım Sinyali Verildi.', 